@@ -1,12 +1,16 @@
-from openai import OpenAI
 import os
 import streamlit as st
-from typing import Dict, Optional, Tuple
-import json
-from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+from datetime import datetime
 import pandas as pd
 import logging
-from sqlalchemy import create_engine, text
+import threading
+from sqlalchemy import text
+from db_engine import get_engine
+from ai_cache import SuggestionCache
+from query_cache import invalidate
+from instrumentation import instrument_methods, instrument_openai
+from manager_profile import PROMPT_TEMPLATES_SQL, SUGGESTION_HISTORY_SQL
 
 # ロギング設定の初期化
 logging.basicConfig(
@@ -14,80 +18,109 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+SYSTEM_PROMPT = "あなたは経験豊富なマネジメントコーチとして、実践的なアドバイスを提供します。"
+SUGGESTION_TEMPERATURE = 0.7
+SUGGESTION_MAX_TOKENS = 1000
+# the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+# do not change this unless explicitly requested by the user
+DEFAULT_AI_MODEL = 'gpt-3.5-turbo'
+
+API_LIMIT_MESSAGE = "API呼び出し回数の制限に達しました。しばらく時間をおいて再度お試しください。"
+GENERATION_ERROR_MESSAGE = "AI提案の生成中にエラーが発生しました。しばらく時間をおいて再度お試しください。"
+
+# マイグレーション（create_ai_prompt_templates）未適用の環境向けの AI 関連テーブルの定義
+AI_SCHEMA_DDL = """
+    CREATE TABLE IF NOT EXISTS ai_suggestion_history (
+        id SERIAL PRIMARY KEY,
+        manager_id INTEGER,
+        suggestion_text TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_implemented BOOLEAN DEFAULT FALSE,
+        implementation_date TIMESTAMP,
+        effectiveness_rating INTEGER CHECK (effectiveness_rating BETWEEN 1 AND 5),
+        feedback_text TEXT
+    );
+    CREATE TABLE IF NOT EXISTS ai_prompt_templates (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        description TEXT,
+        template_text TEXT NOT NULL,
+        is_active BOOLEAN NOT NULL DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+# AI 関連テーブルの存在を確認済みの接続先
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+def ensure_ai_schema(engine):
+    """AI 関連のテーブルがなければ作成（プロセス内で接続先ごとに一度だけ確認する）"""
+    url = str(engine.url)
+    if url in _schema_ready:
+        return
+    with _schema_lock:
+        if url in _schema_ready:
+            return
+        with engine.begin() as conn:
+            missing = conn.execute(text("""
+                SELECT to_regclass('ai_suggestion_history') IS NULL
+                    OR to_regclass('ai_prompt_templates') IS NULL;
+            """)).scalar()
+            if missing:
+                conn.execute(text(AI_SCHEMA_DDL))
+                logging.info("AI関連のテーブルを作成しました")
+        _schema_ready.add(url)
+
+@instrument_methods
 class AIAdvisor:
     def __init__(self):
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OpenAI APIキーが設定されていません")
-        
-        self.client = OpenAI(api_key=api_key)
+        self.api_key = api_key
+        self._client = None
+        # 直前の stream_improvement_suggestions で提案の全文を受信できたか
+        self.last_stream_completed = False
         self.debug_mode = os.getenv('DEBUG', '').lower() == 'true'
         
-        # データベース接続の初期化
-        from sqlalchemy import create_engine, text
-        import pandas as pd
-        import logging
-        
-        self.engine = create_engine(os.environ['DATABASE_URL'])
-        
-        # テーブルの作成
-        with self.engine.connect() as conn:
-            conn.execute(text('''
-                CREATE TABLE IF NOT EXISTS ai_suggestion_history (
-                    id SERIAL PRIMARY KEY,
-                    manager_id INTEGER NOT NULL,
-                    suggestion_text TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    is_implemented BOOLEAN DEFAULT FALSE,
-                    implementation_date TIMESTAMP,
-                    effectiveness_rating INTEGER CHECK (effectiveness_rating BETWEEN 1 AND 5),
-                    feedback_text TEXT
-                );
-            '''))
-            conn.commit()
+        # データベース接続の初期化（プロセス共有の接続プールを再利用）
+        self.engine = get_engine()
+        ensure_ai_schema(self.engine)
         
         # セッションステートの初期化
-        if 'ai_cache' not in st.session_state:
-            st.session_state.ai_cache = {}
         if 'api_calls_count' not in st.session_state:
             st.session_state.api_calls_count = 0
         if 'ai_model' not in st.session_state:
-            # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-            # do not change this unless explicitly requested by the user
-            st.session_state.ai_model = 'gpt-3.5-turbo'
+            st.session_state.ai_model = DEFAULT_AI_MODEL
         
-        # キャッシュ設定
-        self.cache_expiry = timedelta(hours=24)  # キャッシュの有効期限を24時間に設定
-
-    def _get_cache_key(self, scores: Dict[str, float]) -> str:
-        """スコアから一意のキャッシュキーを生成"""
-        sorted_scores = sorted(scores.items())
-        return json.dumps(sorted_scores)
-
-    def _clean_expired_cache(self):
-        """期限切れのキャッシュエントリを削除"""
-        now = datetime.now()
-        expired_keys = []
-        for key, (_, expires_at) in st.session_state.ai_cache.items():
-            if now > expires_at:
-                expired_keys.append(key)
-        for key in expired_keys:
-            del st.session_state.ai_cache[key]
+        # 全ユーザー共有のキャッシュ（有効期限・容量は cache_config に従う）
+        self.cache = SuggestionCache(self.engine)
+
+    @property
+    def client(self):
+        """応答時間とトークン使用量を計測する OpenAI クライアント
+
+        openai パッケージの読み込みには時間がかかるため、最初に使用する時点で読み込む。
+        """
+        if self._client is None:
+            from openai import OpenAI
+            self._client = instrument_openai(OpenAI(api_key=self.api_key))
+        return self._client
+
+    def _get_cache_key(self, scores: Dict[str, float], template: Optional[str] = None) -> str:
+        """スコアとテンプレート本文から一意のキャッシュキーを生成"""
+        return self.cache.make_key(scores, template, st.session_state.ai_model)
 
     @property
     def cache_stats(self):
         """キャッシュの統計情報を取得"""
-        return {
-            'total_entries': len(st.session_state.ai_cache),
-            'valid_entries': len([1 for _, (_, exp) in st.session_state.ai_cache.items() 
-                                if exp > datetime.now()]),
-            'expired_entries': len([1 for _, (_, exp) in st.session_state.ai_cache.items() 
-                                if exp <= datetime.now()])
-        }
+        return self.cache.stats()
 
     def clear_cache(self):
         """キャッシュをクリア"""
-        st.session_state.ai_cache = {}
+        self.cache.clear()
 
     def save_suggestion(self, manager_id: Optional[int], suggestion_text: str):
         """AIの提案を履歴として保存"""
@@ -105,8 +138,10 @@ class AIAdvisor:
                     'manager_id': manager_id,
                     'suggestion_text': suggestion_text.strip()
                 })
+                suggestion_id = result.scalar()
                 conn.commit()
-                return result.scalar()
+            invalidate('ai_suggestion_history')
+            return suggestion_id
         except Exception as e:
             logging.error(f"提案の保存中にエラーが発生: {str(e)}")
             raise ValueError(f"提案の保存に失敗しました: {str(e)}")
@@ -114,23 +149,7 @@ class AIAdvisor:
     def get_suggestion_history(self, manager_id: int) -> pd.DataFrame:
         """特定のマネージャーのAI提案履歴を取得"""
         try:
-            query = text('''
-                SELECT 
-                    id,
-                    suggestion_text,
-                    created_at AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Tokyo' as created_at,
-                    is_implemented,
-                    CASE 
-                        WHEN implementation_date IS NOT NULL 
-                        THEN implementation_date AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Tokyo'
-                        ELSE NULL 
-                    END as implementation_date,
-                    effectiveness_rating,
-                    feedback_text
-                FROM ai_suggestion_history
-                WHERE manager_id = :manager_id
-                ORDER BY created_at DESC;
-            ''')
+            query = text(SUGGESTION_HISTORY_SQL + ';')
             
             return pd.read_sql_query(
                 query,
@@ -172,6 +191,7 @@ class AIAdvisor:
                     update_dict['suggestion_id'] = suggestion_id
                     conn.execute(text(query), update_dict)
                     conn.commit()
+                    invalidate('ai_suggestion_history')
         except Exception as e:
             logging.error(f"提案状態の更新中にエラーが発生: {str(e)}")
             raise
@@ -195,13 +215,7 @@ class AIAdvisor:
     def get_prompt_templates(self) -> pd.DataFrame:
         """利用可能なプロンプトテンプレートを取得"""
         try:
-            query = """
-            SELECT id, name, description, template_text
-            FROM ai_prompt_templates
-            WHERE is_active = true
-            ORDER BY name;
-            """
-            return pd.read_sql_query(query, self.engine)
+            return pd.read_sql_query(text(PROMPT_TEMPLATES_SQL + ';'), self.engine)
         except Exception as e:
             logging.error(f"プロンプトテンプレート取得エラー: {str(e)}")
             return pd.DataFrame()
@@ -220,8 +234,10 @@ class AIAdvisor:
                     'description': description,
                     'template_text': template_text
                 })
+                template_id = result.scalar()
                 conn.commit()
-                return result.scalar()
+            invalidate('ai_prompt_templates')
+            return template_id
         except Exception as e:
             logging.error(f"プロンプトテンプレート追加エラー: {str(e)}")
             raise
@@ -245,44 +261,24 @@ class AIAdvisor:
                     'template_text': template_text
                 })
                 conn.commit()
+            invalidate('ai_prompt_templates')
         except Exception as e:
             logging.error(f"プロンプトテンプレート更新エラー: {str(e)}")
             raise
 
-    def generate_improvement_suggestions(self, scores: Dict[str, float], template_id: Optional[int] = None) -> str:
-        """改善提案を生成（キャッシュ、デバッグモード、API制限付き）"""
-        try:
-            # APIコール回数制限チェック
-            MAX_API_CALLS = 50  # 1セッションあたりの最大API呼び出し回数
-            if st.session_state.api_calls_count >= MAX_API_CALLS:
-                return "API呼び出し回数の制限に達しました。しばらく時間をおいて再度お試しください。"
-
-            # デバッグモードチェック
-            if self.debug_mode:
-                return self._get_debug_response(scores)
+    def _get_template_text(self, template_id: int) -> Optional[str]:
+        """プロンプトテンプレートの本文を取得"""
+        query = "SELECT template_text FROM ai_prompt_templates WHERE id = :template_id;"
+        with self.engine.connect() as conn:
+            result = conn.execute(text(query), {'template_id': template_id})
+            return result.scalar()
 
-            # キャッシュのクリーニングと確認
-            self._clean_expired_cache()
-            cache_key = f"{self._get_cache_key(scores)}_{template_id}"
-            if cache_key in st.session_state.ai_cache:
-                suggestion, expires_at = st.session_state.ai_cache[cache_key]
-                if datetime.now() <= expires_at:
-                    return suggestion
-
-            # テンプレートの取得
-            if template_id:
-                query = "SELECT template_text FROM ai_prompt_templates WHERE id = :template_id;"
-                with self.engine.connect() as conn:
-                    result = conn.execute(text(query), {'template_id': template_id})
-                    template = result.scalar()
-                if template:
-                    prompt = template.format(scores=scores)
-                else:
-                    template_id = None  # テンプレートが見つからない場合はデフォルトを使用
-
-            # デフォルトテンプレート
-            if not template_id:
-                prompt = f"""
+    @staticmethod
+    def _build_prompt(scores: Dict[str, float], template: Optional[str] = None) -> str:
+        """スコアからプロンプトを作成（テンプレート未指定時はデフォルト）"""
+        if template:
+            return template.format(scores=scores)
+        return f"""
 以下のマネージャーの評価スコアに基づいて改善提案を行ってください：
 - コミュニケーション・フィードバック: {scores.get('communication', 0)}/5
 - サポート・エンパワーメント: {scores.get('support', 0)}/5
@@ -296,28 +292,131 @@ class AIAdvisor:
 レスポンスは日本語でお願いします。
 """
 
+    @staticmethod
+    def _build_messages(prompt: str) -> list:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def generate_batch_suggestions(
+        self,
+        manager_ids: Optional[List[int]] = None,
+        department: Optional[str] = None,
+        template_id: Optional[int] = None,
+        **options
+    ) -> pd.DataFrame:
+        """複数マネージャーの改善提案を並列に生成し、履歴に一括保存
+
+        options は BatchSuggestionGenerator の設定（max_concurrency、requests_per_minute、
+        max_retries、progress_callback）に渡される。
+        """
+        from batch_suggestions import BatchSuggestionGenerator
+
+        generator = BatchSuggestionGenerator(self, model=st.session_state.ai_model, **options)
+        return generator.run(manager_ids=manager_ids, department=department, template_id=template_id)
+
+    def generate_improvement_suggestions(self, scores: Dict[str, float], template_id: Optional[int] = None) -> str:
+        """改善提案を生成（キャッシュ、デバッグモード、API制限付き）"""
+        try:
+            # APIコール回数制限チェック
+            MAX_API_CALLS = 50  # 1セッションあたりの最大API呼び出し回数
+            if st.session_state.api_calls_count >= MAX_API_CALLS:
+                return API_LIMIT_MESSAGE
+
+            # デバッグモードチェック
+            if self.debug_mode:
+                return self._get_debug_response(scores)
+
+            # テンプレートの取得（見つからない場合はデフォルトを使用）
+            template = self._get_template_text(template_id) if template_id else None
+
+            # キャッシュの確認
+            cache_key = self._get_cache_key(scores, template)
+            cached_suggestion = self.cache.get(cache_key)
+            if cached_suggestion is not None:
+                return cached_suggestion
+
+            prompt = self._build_prompt(scores, template)
+
             response = self.client.chat.completions.create(
                 model=st.session_state.ai_model,
-                messages=[
-                    {"role": "system", "content": "あなたは経験豊富なマネジメントコーチとして、実践的なアドバイスを提供します。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
+                messages=self._build_messages(prompt),
+                temperature=SUGGESTION_TEMPERATURE,
+                max_tokens=SUGGESTION_MAX_TOKENS
             )
             
             suggestion = response.choices[0].message.content
             if not suggestion:
                 raise ValueError("AIからの応答が空でした")
 
-            # キャッシュに保存（有効期限付き）
-            expires_at = datetime.now() + self.cache_expiry
-            st.session_state.ai_cache[cache_key] = (suggestion, expires_at)
+            # キャッシュに保存（有効期限・容量上限付き）
+            self.cache.set(cache_key, suggestion)
             # API呼び出し回数をインクリメント
             st.session_state.api_calls_count += 1
             
             return suggestion
         except Exception as e:
-            error_msg = f"AI提案生成エラー: {str(e)}"
-            print(error_msg)  # ログ用
-            return "AI提案の生成中にエラーが発生しました。しばらく時間をおいて再度お試しください。"
+            logging.error(f"AI提案生成エラー: {str(e)}")
+            return GENERATION_ERROR_MESSAGE
+
+    def stream_improvement_suggestions(self, scores: Dict[str, float], template_id: Optional[int] = None) -> Iterator[str]:
+        """改善提案をストリーミングで生成し、受信したトークンから順に返す
+
+        ストリーム完了後、組み立てた全文をキャッシュに保存する。
+        履歴への保存（save_suggestion）は呼び出し元で全文を受け取った後、
+        last_stream_completed が True（提案の全文を受信できた）の場合のみ行う。
+        呼び出し回数の制限・デバッグモード・エラー時に返すメッセージは提案ではないため False のまま。
+        """
+        self.last_stream_completed = False
+        chunks = []
+        try:
+            MAX_API_CALLS = 50  # 1セッションあたりの最大API呼び出し回数
+            if st.session_state.api_calls_count >= MAX_API_CALLS:
+                yield API_LIMIT_MESSAGE
+                return
+
+            if self.debug_mode:
+                yield self._get_debug_response(scores)
+                return
+
+            template = self._get_template_text(template_id) if template_id else None
+            cache_key = self._get_cache_key(scores, template)
+            cached_suggestion = self.cache.get(cache_key)
+            if cached_suggestion is not None:
+                self.last_stream_completed = True
+                yield cached_suggestion
+                return
+
+            prompt = self._build_prompt(scores, template)
+
+            stream = self.client.chat.completions.create(
+                model=st.session_state.ai_model,
+                messages=self._build_messages(prompt),
+                temperature=SUGGESTION_TEMPERATURE,
+                max_tokens=SUGGESTION_MAX_TOKENS,
+                stream=True,
+                # 最後のチャンクでトークン使用量を受け取る
+                stream_options={'include_usage': True}
+            )
+            st.session_state.api_calls_count += 1
+
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if not token:
+                    continue
+                chunks.append(token)
+                yield token
+
+            suggestion = ''.join(chunks)
+            if not suggestion:
+                raise ValueError("AIからの応答が空でした")
+            self.cache.set(cache_key, suggestion)
+            self.last_stream_completed = True
+        except Exception as e:
+            logging.error(f"AI提案生成エラー: {str(e)}")
+            # 途中まで表示した提案にエラーメッセージを連結しない（呼び出し元で last_stream_completed を確認する）
+            if not chunks:
+                yield GENERATION_ERROR_MESSAGE
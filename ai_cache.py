@@ -0,0 +1,237 @@
+"""AI提案のプロセス・ユーザー横断キャッシュ
+
+ai_suggestion_cache テーブルに提案を保存し、cache_config の設定
+（enabled / ttl_minutes / max_size_mb）に従って有効期限とLRU方式の容量制限を適用する。
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional
+from sqlalchemy import text
+
+# cache_config を再読込するまでの秒数
+CONFIG_REFRESH_SECONDS = 60
+
+# cache_config が未設定の場合の既定値（models.CacheConfig の既定値と同じ）
+DEFAULT_CONFIG = {
+    'enabled': True,
+    'ttl_minutes': 60,
+    'max_size_mb': 100
+}
+
+_counters = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+_config_cache = {'config': None, 'loaded_at': 0.0}
+_lock = threading.Lock()
+
+
+def _increment(name: str, amount: int = 1):
+    with _lock:
+        _counters[name] += amount
+
+
+def invalidate_config():
+    """cache_config の変更を次回アクセス時に反映させる"""
+    with _lock:
+        _config_cache['loaded_at'] = 0.0
+
+
+class SuggestionCache:
+    def __init__(self, engine):
+        self.engine = engine
+
+    @staticmethod
+    def make_key(scores: Dict[str, float], template: Optional[str], model: str) -> str:
+        """スコア・テンプレート本文・モデルから一意のキャッシュキーを生成（未入力の項目は含めない）
+
+        テンプレートは ID ではなく本文のハッシュをキーに含め、テンプレートの更新後に古い提案を返さない。
+        """
+        payload = json.dumps(
+            {
+                'scores': sorted(
+                    (k, round(float(v), 2)) for k, v in scores.items() if v is not None and v == v
+                ),
+                'template': hashlib.sha256(template.encode('utf-8')).hexdigest() if template else None,
+                'model': model
+            },
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_config(self) -> dict:
+        """cache_config の設定を取得（一定時間プロセス内で保持）"""
+        now = time.monotonic()
+        with _lock:
+            config = _config_cache['config']
+            if config is not None and now - _config_cache['loaded_at'] < CONFIG_REFRESH_SECONDS:
+                return config
+
+        config = dict(DEFAULT_CONFIG)
+        try:
+            with self.engine.connect() as conn:
+                row = conn.execute(text("""
+                    SELECT enabled, ttl_minutes, max_size_mb
+                    FROM cache_config
+                    ORDER BY id
+                    LIMIT 1;
+                """)).first()
+            if row:
+                config.update(row._mapping)
+        except Exception as e:
+            logging.error(f"キャッシュ設定の読み込み中にエラーが発生: {str(e)}")
+
+        with _lock:
+            _config_cache['config'] = config
+            _config_cache['loaded_at'] = now
+        return config
+
+    def get(self, key: str) -> Optional[str]:
+        """有効なキャッシュエントリを取得し、最終アクセス日時を更新"""
+        if not self.get_config()['enabled']:
+            return None
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execute(text("""
+                    UPDATE ai_suggestion_cache
+                    SET last_accessed_at = CURRENT_TIMESTAMP,
+                        hit_count = hit_count + 1
+                    WHERE cache_key = :cache_key
+                      AND expires_at > CURRENT_TIMESTAMP
+                    RETURNING suggestion_text;
+                """), {'cache_key': key})
+                suggestion = result.scalar()
+                conn.commit()
+        except Exception as e:
+            logging.error(f"キャッシュの取得中にエラーが発生: {str(e)}")
+            suggestion = None
+
+        _increment('hits' if suggestion is not None else 'misses')
+        return suggestion
+
+    def get_many(self, keys) -> Dict[str, str]:
+        """複数のキーの有効なエントリを1クエリで取得（キー → 提案テキスト）"""
+        keys = list(dict.fromkeys(keys))
+        if not keys or not self.get_config()['enabled']:
+            return {}
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execute(text("""
+                    UPDATE ai_suggestion_cache
+                    SET last_accessed_at = CURRENT_TIMESTAMP,
+                        hit_count = hit_count + 1
+                    WHERE cache_key = ANY(:cache_keys)
+                      AND expires_at > CURRENT_TIMESTAMP
+                    RETURNING cache_key, suggestion_text;
+                """), {'cache_keys': keys})
+                suggestions = {row.cache_key: row.suggestion_text for row in result}
+                conn.commit()
+        except Exception as e:
+            logging.error(f"キャッシュの取得中にエラーが発生: {str(e)}")
+            suggestions = {}
+
+        _increment('hits', len(suggestions))
+        _increment('misses', len(keys) - len(suggestions))
+        return suggestions
+
+    def set(self, key: str, suggestion: str):
+        """エントリを保存し、期限切れと容量超過分を削除"""
+        config = self.get_config()
+        if not config['enabled']:
+            return
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("""
+                    INSERT INTO ai_suggestion_cache (
+                        cache_key, suggestion_text, size_bytes, expires_at
+                    ) VALUES (
+                        :cache_key, :suggestion_text, :size_bytes,
+                        CURRENT_TIMESTAMP + make_interval(mins => :ttl_minutes)
+                    )
+                    ON CONFLICT (cache_key) DO UPDATE SET
+                        suggestion_text = EXCLUDED.suggestion_text,
+                        size_bytes = EXCLUDED.size_bytes,
+                        expires_at = EXCLUDED.expires_at,
+                        created_at = CURRENT_TIMESTAMP,
+                        last_accessed_at = CURRENT_TIMESTAMP;
+                """), {
+                    'cache_key': key,
+                    'suggestion_text': suggestion,
+                    'size_bytes': len(suggestion.encode('utf-8')),
+                    'ttl_minutes': int(config['ttl_minutes'])
+                })
+                evicted = self._evict(conn, int(config['max_size_mb']) * 1024 * 1024)
+                conn.commit()
+            _increment('writes')
+            if evicted:
+                _increment('evictions', evicted)
+        except Exception as e:
+            logging.error(f"キャッシュの保存中にエラーが発生: {str(e)}")
+
+    def _evict(self, conn, max_bytes: int) -> int:
+        """期限切れのエントリと、最近使われていない順に容量上限を超える分を削除
+
+        期限切れの削除は expires_at のインデックスで行い、LRU の削除（全エントリの累積サイズの計算）は
+        合計サイズが上限を超えている場合のみ実行する。
+        """
+        evicted = conn.execute(text("""
+            DELETE FROM ai_suggestion_cache
+            WHERE expires_at <= CURRENT_TIMESTAMP;
+        """)).rowcount
+
+        total_bytes = conn.execute(text("""
+            SELECT COALESCE(SUM(size_bytes), 0) FROM ai_suggestion_cache;
+        """)).scalar()
+        if total_bytes <= max_bytes:
+            return evicted
+
+        result = conn.execute(text("""
+            DELETE FROM ai_suggestion_cache
+            WHERE cache_key IN (
+                SELECT cache_key
+                FROM (
+                    SELECT
+                        cache_key,
+                        SUM(size_bytes) OVER (
+                            ORDER BY last_accessed_at DESC, cache_key
+                        ) as cumulative_bytes
+                    FROM ai_suggestion_cache
+                ) ranked
+                WHERE cumulative_bytes > :max_bytes
+            );
+        """), {'max_bytes': max_bytes})
+        return evicted + result.rowcount
+
+    def clear(self):
+        """キャッシュを全て削除"""
+        with self.engine.connect() as conn:
+            conn.execute(text("DELETE FROM ai_suggestion_cache;"))
+            conn.commit()
+
+    def stats(self) -> dict:
+        """キャッシュの統計情報（件数・サイズ・ヒット率など）を取得"""
+        with _lock:
+            counters = dict(_counters)
+        lookups = counters['hits'] + counters['misses']
+        stats = {
+            **counters,
+            'hit_rate': counters['hits'] / lookups if lookups else 0.0,
+            'total_entries': 0,
+            'valid_entries': 0,
+            'expired_entries': 0,
+            'size_bytes': 0
+        }
+        try:
+            with self.engine.connect() as conn:
+                row = conn.execute(text("""
+                    SELECT
+                        COUNT(*) as total_entries,
+                        COUNT(*) FILTER (WHERE expires_at > CURRENT_TIMESTAMP) as valid_entries,
+                        COUNT(*) FILTER (WHERE expires_at <= CURRENT_TIMESTAMP) as expired_entries,
+                        COALESCE(SUM(size_bytes), 0) as size_bytes
+                    FROM ai_suggestion_cache;
+                """)).first()
+            stats.update(row._mapping)
+        except Exception as e:
+            logging.error(f"キャッシュ統計の取得中にエラーが発生: {str(e)}")
+        return stats
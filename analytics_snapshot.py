@@ -0,0 +1,441 @@
+"""分析用の Parquet スナップショットと DuckDB による集計
+
+managers・evaluations・ai_suggestion_history を定期的に Parquet に書き出し（evaluations は
+評価月ごとのパーティション）、全社・部門横断の重い集計を書き込みを受けるデータベースではなく
+組み込みの DuckDB で行う。DatabaseManager の analytics_backend が 'snapshot' の場合に使用される。
+
+スナップショットの構成:
+    ANALYTICS_SNAPSHOT_DIR/
+        LATEST                              最新のスナップショットのディレクトリ名
+        20261017T031500/
+            manifest.json                   作成日時と件数
+            managers.parquet
+            ai_suggestion_history.parquet
+            evaluations/month=2026-10-01/*.parquet
+
+DuckDB は任意の依存関係で、インストールされていない場合は
+スナップショットを使用できない（DatabaseManager はライブのデータベースで集計する）。
+"""
+import glob
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+from datetime import date, datetime
+from typing import Optional
+import pandas as pd
+from sqlalchemy import text
+from query_cache import cached_query
+from rollups import SCORE_DIMENSIONS
+from scoring import score_columns_sql
+
+# 集計系の読み取りの参照先（'live' はデータベース、'snapshot' は Parquet スナップショット）
+ANALYTICS_BACKENDS = ('live', 'snapshot')
+ANALYTICS_BACKEND = os.getenv('ANALYTICS_BACKEND', 'live')
+
+SNAPSHOT_DIR = os.getenv('ANALYTICS_SNAPSHOT_DIR', 'analytics_snapshots')
+# 保持するスナップショットの数（切り替え直後に古いスナップショットを読んでいる処理のため2以上にする）
+SNAPSHOT_KEEP = int(os.getenv('ANALYTICS_SNAPSHOT_KEEP', '2'))
+
+# スコア分布のパーセンタイル
+SCORE_PERCENTILES = (10, 25, 50, 75, 90)
+
+# スナップショットに含める evaluations の列と DuckDB での型
+EVALUATION_COLUMNS = {
+    'id': 'INTEGER',
+    'manager_id': 'INTEGER',
+    'evaluation_date': 'DATE',
+    **{column: 'DOUBLE' for column in SCORE_DIMENSIONS.values()}
+}
+
+_LATEST_FILE = 'LATEST'
+_MANIFEST_FILE = 'manifest.json'
+
+# 「組織分析」ページからのスナップショット作成を許可するか（既定では cron などの CLI からのみ作成する）
+ANALYTICS_SNAPSHOT_UI_EXPORT = os.getenv('ANALYTICS_SNAPSHOT_UI_EXPORT', '').lower() == 'true'
+
+# スナップショットのディレクトリごとの DuckDB 接続と実行中のクエリ数
+# （プロセス内で共有し、クエリごとに cursor を使う）
+_connections = {}
+_lock = threading.Lock()
+
+
+def duckdb_available() -> bool:
+    """DuckDB がインストールされているか"""
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def percentile_columns_sql(expression: str) -> str:
+    """SCORE_PERCENTILES の各パーセンタイル（p10 など）の列（PostgreSQL・DuckDB 共通）"""
+    return ',\n'.join(
+        f"PERCENTILE_CONT({p / 100}) WITHIN GROUP (ORDER BY {expression}) as p{p}"
+        for p in SCORE_PERCENTILES
+    )
+
+
+def metric_cube_frame(wide: pd.DataFrame) -> pd.DataFrame:
+    """部門 × 月の項目ごとの合計値・件数（*_sum / *_count）を部門 × 月 × 項目の行に変換
+
+    戻り値の列: department, month, dimension, mean_score, evaluation_count
+    """
+    columns = ['department', 'month', 'dimension', 'mean_score', 'evaluation_count']
+    if wide.empty:
+        return pd.DataFrame(columns=columns)
+    frames = []
+    for dim in SCORE_DIMENSIONS:
+        counts = wide[f'{dim}_count'].astype(float)
+        frames.append(pd.DataFrame({
+            'department': wide['department'],
+            'month': pd.to_datetime(wide['month']),
+            'dimension': dim,
+            'mean_score': (wide[f'{dim}_sum'].astype(float) / counts.where(counts > 0)),
+            'evaluation_count': counts.astype('int64')
+        }))
+    cube = pd.concat(frames, ignore_index=True)
+    return cube[cube['evaluation_count'] > 0].sort_values(['department', 'month', 'dimension']).reset_index(drop=True)
+
+
+def first_month_of_window(months: int) -> date:
+    """当月を含む直近 months ヶ月の最初の月"""
+    return (pd.Timestamp.today().normalize().replace(day=1) - pd.DateOffset(months=months - 1)).date()
+
+
+def latest_snapshot(directory: str = SNAPSHOT_DIR) -> Optional[str]:
+    """最新のスナップショットのパス（まだ作成されていない場合は None）"""
+    try:
+        with open(os.path.join(directory, _LATEST_FILE), encoding='utf-8') as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(directory, name)
+    return path if name and os.path.isdir(path) else None
+
+
+def _prune_snapshots(directory: str, keep: int):
+    names = sorted(
+        name for name in os.listdir(directory)
+        if os.path.isdir(os.path.join(directory, name)) and not name.endswith('.tmp')
+    )
+    for name in names[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def export_snapshot(engine, directory: str = SNAPSHOT_DIR, keep: int = SNAPSHOT_KEEP) -> dict:
+    """3つのテーブルを同一時点のスナップショットとして書き出し、LATEST を切り替える
+
+    evaluations は COPY でCSVの一時ファイルに書き出し、DuckDB で評価月ごとの Parquet に変換する。
+    戻り値はマニフェスト（snapshot, created_at, 各テーブルの件数）。
+    """
+    import duckdb
+
+    created_at = datetime.now()
+    name = created_at.strftime('%Y%m%dT%H%M%S')
+    os.makedirs(directory, exist_ok=True)
+    work_path = os.path.join(directory, f"{name}.tmp")
+    shutil.rmtree(work_path, ignore_errors=True)
+    os.makedirs(work_path)
+
+    try:
+        csv_path = os.path.join(work_path, 'evaluations.csv')
+        # 3つのテーブルを同じ時点のデータで書き出す
+        with engine.connect().execution_options(isolation_level='REPEATABLE READ') as conn:
+            managers = pd.read_sql_query(text("SELECT id, name, department FROM managers;"), conn)
+            suggestions = pd.read_sql_query(text("""
+                SELECT id, manager_id, created_at, is_implemented, implementation_date, effectiveness_rating
+                FROM ai_suggestion_history;
+            """), conn)
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                with open(csv_path, 'w', encoding='utf-8') as f:
+                    cursor.copy_expert(
+                        f"COPY (SELECT {', '.join(EVALUATION_COLUMNS)} FROM evaluations) TO STDOUT WITH (FORMAT csv)", f
+                    )
+            finally:
+                cursor.close()
+
+        duck = duckdb.connect()
+        try:
+            duck.register('managers_df', managers)
+            duck.register('suggestions_df', suggestions)
+            duck.execute(f"COPY managers_df TO '{os.path.join(work_path, 'managers.parquet')}' (FORMAT parquet);")
+            duck.execute(
+                f"COPY suggestions_df TO '{os.path.join(work_path, 'ai_suggestion_history.parquet')}' (FORMAT parquet);"
+            )
+            column_types = ', '.join(f"'{column}': '{type_}'" for column, type_ in EVALUATION_COLUMNS.items())
+            duck.execute(f"""
+                CREATE TEMP TABLE evaluations_export AS
+                SELECT * FROM read_csv('{csv_path}', header = false, columns = {{{column_types}}});
+            """)
+            evaluation_count = duck.execute("SELECT COUNT(*) FROM evaluations_export;").fetchone()[0]
+            if evaluation_count:
+                # マネージャー順に並べ、1人分の読み取りで行グループの最小・最大値による絞り込みが効くようにする
+                duck.execute(f"""
+                    COPY (
+                        SELECT *, CAST(DATE_TRUNC('month', evaluation_date) AS DATE) as month
+                        FROM evaluations_export
+                        ORDER BY month, manager_id, evaluation_date
+                    ) TO '{os.path.join(work_path, 'evaluations')}' (FORMAT parquet, PARTITION_BY (month));
+                """)
+        finally:
+            duck.close()
+        os.remove(csv_path)
+
+        manifest = {
+            'snapshot': name,
+            'created_at': created_at.isoformat(timespec='seconds'),
+            'managers': len(managers),
+            'evaluations': int(evaluation_count),
+            'ai_suggestion_history': len(suggestions)
+        }
+        with open(os.path.join(work_path, _MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        final_path = os.path.join(directory, name)
+        shutil.rmtree(final_path, ignore_errors=True)
+        os.rename(work_path, final_path)
+    except Exception:
+        shutil.rmtree(work_path, ignore_errors=True)
+        raise
+
+    # 読み取り側が途中の状態を読まないよう、書き出しの完了後に LATEST を置き換える
+    latest_tmp = os.path.join(directory, f"{_LATEST_FILE}.tmp")
+    with open(latest_tmp, 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(latest_tmp, os.path.join(directory, _LATEST_FILE))
+    _prune_snapshots(directory, max(keep, 1))
+    logging.info(f"分析用スナップショット {name} を作成しました（評価 {evaluation_count}件）")
+    return manifest
+
+
+def _open_snapshot(path: str):
+    """スナップショットの各テーブルをビューとして参照する DuckDB 接続"""
+    import duckdb
+
+    conn = duckdb.connect()
+    conn.execute(f"CREATE VIEW managers AS SELECT * FROM read_parquet('{os.path.join(path, 'managers.parquet')}');")
+    conn.execute(f"""
+        CREATE VIEW ai_suggestion_history AS
+        SELECT * FROM read_parquet('{os.path.join(path, 'ai_suggestion_history.parquet')}');
+    """)
+    evaluations_glob = os.path.join(path, 'evaluations', '*', '*.parquet')
+    if glob.glob(evaluations_glob):
+        conn.execute(f"""
+            CREATE VIEW evaluations AS
+            SELECT * FROM read_parquet('{evaluations_glob}', hive_partitioning = true, hive_types = {{'month': DATE}});
+        """)
+    else:
+        columns = ', '.join(f"CAST(NULL AS {type_}) as {column}" for column, type_ in EVALUATION_COLUMNS.items())
+        conn.execute(f"CREATE VIEW evaluations AS SELECT {columns}, CAST(NULL AS DATE) as month WHERE false;")
+    return conn
+
+
+def _close_stale_connections():
+    # 削除済みのスナップショットの接続を、実行中のクエリがなくなった時点で閉じる（_lock を取得して呼ぶ）
+    for path in [p for p, entry in _connections.items() if entry['readers'] == 0 and not os.path.isdir(p)]:
+        _connections.pop(path)['conn'].close()
+
+
+def _snapshot_cursor(path: str):
+    """スナップショットの cursor を取得（使い終わったら _release_cursor を呼ぶ）"""
+    with _lock:
+        entry = _connections.get(path)
+        if entry is None:
+            entry = _connections[path] = {'conn': _open_snapshot(path), 'readers': 0}
+        entry['readers'] += 1
+        try:
+            return entry['conn'].cursor()
+        except Exception:
+            entry['readers'] -= 1
+            raise
+
+
+def _release_cursor(path: str, cursor):
+    cursor.close()
+    with _lock:
+        _connections[path]['readers'] -= 1
+        _close_stale_connections()
+
+
+class SnapshotStore:
+    """最新のスナップショットに対する集計（結果はスナップショットごとにクエリキャッシュに保持）"""
+
+    def __init__(self, scoring, directory: str = SNAPSHOT_DIR):
+        # 総合スコアの評価指標の重み（ScoringEngine）
+        self.scoring = scoring
+        self.directory = directory
+
+    @property
+    def cache_scope(self) -> str:
+        # 新しいスナップショットに切り替わった時点で別のキャッシュエントリになる
+        return f"snapshot:{os.path.abspath(self.directory)}:{latest_snapshot(self.directory)}"
+
+    def available(self) -> bool:
+        """スナップショットを使用できるか（DuckDB がインストールされ、スナップショットが作成済み）"""
+        return duckdb_available() and latest_snapshot(self.directory) is not None
+
+    def info(self) -> Optional[dict]:
+        """最新のスナップショットのマニフェスト"""
+        path = latest_snapshot(self.directory)
+        if path is None:
+            return None
+        with open(os.path.join(path, _MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+
+    def query(self, sql: str, params: Optional[dict] = None) -> pd.DataFrame:
+        """最新のスナップショットに対してクエリを実行（パラメータは $name で参照）"""
+        path = latest_snapshot(self.directory)
+        if path is None:
+            raise RuntimeError("分析用スナップショットが作成されていません")
+        cursor = _snapshot_cursor(path)
+        try:
+            return cursor.execute(sql, params or {}).df()
+        finally:
+            _release_cursor(path, cursor)
+
+    @cached_query(tags=['analytics_snapshot', 'evaluation_metrics'])
+    def department_statistics(self) -> pd.DataFrame:
+        """get_department_statistics と同じ列の部門別統計（直近3ヶ月）"""
+        overall_avg = self.scoring.weighted_average_sql({
+            'communication': 'avg_communication',
+            'support': 'avg_support',
+            'goal_management': 'avg_goal',
+            'leadership': 'avg_leadership',
+            'problem_solving': 'avg_problem',
+            'strategy': 'avg_strategy'
+        })
+        since = (pd.Timestamp.now() - pd.DateOffset(months=3)).to_pydatetime()
+        return self.query(f"""
+            WITH recent_evals AS (
+                SELECT
+                    m.department,
+                    AVG(e.communication_score) as avg_communication,
+                    AVG(e.support_score) as avg_support,
+                    AVG(e.goal_management_score) as avg_goal,
+                    AVG(e.leadership_score) as avg_leadership,
+                    AVG(e.problem_solving_score) as avg_problem,
+                    AVG(e.strategy_score) as avg_strategy,
+                    COUNT(DISTINCT e.manager_id) as manager_count
+                FROM evaluations e
+                JOIN managers m ON m.id = e.manager_id
+                WHERE e.month >= CAST(DATE_TRUNC('month', $since) AS DATE)
+                  AND e.evaluation_date >= $since
+                GROUP BY m.department
+            )
+            SELECT *,
+                {overall_avg} as overall_avg
+            FROM recent_evals
+            ORDER BY overall_avg DESC;
+        """, {'since': since})
+
+    @cached_query(tags=['analytics_snapshot', 'evaluation_metrics'])
+    def manager_growth(self, manager_id: int) -> pd.DataFrame:
+        """analyze_growth と同じ列の月次成長率"""
+        return self.query(f"""
+            WITH monthly_scores AS (
+                SELECT
+                    CAST(e.month AS TIMESTAMP) as month,
+                    AVG({self.scoring.weighted_average_sql(score_columns_sql('e'))}) as avg_score
+                FROM evaluations e
+                WHERE e.manager_id = $manager_id
+                GROUP BY e.month
+            ),
+            score_changes AS (
+                SELECT
+                    month,
+                    avg_score,
+                    LAG(avg_score) OVER (ORDER BY month) as prev_score
+                FROM monthly_scores
+            )
+            SELECT
+                month,
+                avg_score,
+                CASE
+                    WHEN prev_score IS NOT NULL AND prev_score != 0
+                    THEN ((avg_score - prev_score) / prev_score * 100)
+                    ELSE 0
+                END as growth_rate
+            FROM score_changes
+            ORDER BY month DESC;
+        """, {'manager_id': manager_id})
+
+    @cached_query(tags=['analytics_snapshot'])
+    def managers(self) -> pd.DataFrame:
+        """マネージャーの一覧（manager_id, name, department）"""
+        return self.query("SELECT id as manager_id, name, department FROM managers;")
+
+    @cached_query(tags=['analytics_snapshot'])
+    def manager_rollups(self, months: int) -> pd.DataFrame:
+        """manager_score_rollups と同じ列のマネージャー × 月の合計値・件数（直近 months ヶ月）"""
+        columns = ',\n'.join(
+            f"SUM(e.{column}) as {dim}_sum, COUNT(e.{column}) as {dim}_count"
+            for dim, column in SCORE_DIMENSIONS.items()
+        )
+        return self.query(f"""
+            SELECT e.manager_id, CAST(e.month AS TIMESTAMP) as month, {columns}
+            FROM evaluations e
+            WHERE e.month >= $first_month
+            GROUP BY e.manager_id, e.month
+            ORDER BY e.manager_id, e.month;
+        """, {'first_month': first_month_of_window(months)})
+
+    @cached_query(tags=['analytics_snapshot'])
+    def department_metric_cube(self, months: int) -> pd.DataFrame:
+        """部門 × 月 × 評価項目の平均スコアと評価件数（metric_cube_frame の列）"""
+        columns = ',\n'.join(
+            f"SUM(e.{column}) as {dim}_sum, COUNT(e.{column}) as {dim}_count"
+            for dim, column in SCORE_DIMENSIONS.items()
+        )
+        wide = self.query(f"""
+            SELECT m.department, e.month, {columns}
+            FROM evaluations e
+            JOIN managers m ON m.id = e.manager_id
+            WHERE e.month >= $first_month
+            GROUP BY m.department, e.month;
+        """, {'first_month': first_month_of_window(months)})
+        return metric_cube_frame(wide)
+
+    @cached_query(tags=['analytics_snapshot', 'evaluation_metrics'])
+    def score_percentiles(self, months: int) -> pd.DataFrame:
+        """部門ごとのマネージャーの総合スコア（直近 months ヶ月の平均）の分布"""
+        overall = self.scoring.weighted_average_sql({
+            dim: f"AVG(e.{column})" for dim, column in SCORE_DIMENSIONS.items()
+        })
+        return self.query(f"""
+            WITH manager_scores AS (
+                SELECT e.manager_id, {overall} as overall_score
+                FROM evaluations e
+                WHERE e.month >= $first_month
+                GROUP BY e.manager_id
+            )
+            SELECT
+                m.department,
+                COUNT(*) as manager_count,
+                AVG(s.overall_score) as mean_score,
+                {percentile_columns_sql('s.overall_score')}
+            FROM manager_scores s
+            JOIN managers m ON m.id = s.manager_id
+            WHERE s.overall_score IS NOT NULL
+            GROUP BY m.department
+            ORDER BY p50 DESC;
+        """, {'first_month': first_month_of_window(months)})
+
+
+if __name__ == '__main__':
+    # 使い方: python analytics_snapshot.py export（cron などで定期実行）
+    from db_engine import get_engine
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != 'export':
+        print("使い方: python analytics_snapshot.py export")
+        sys.exit(1)
+    if not duckdb_available():
+        print("スナップショットの作成には duckdb が必要です")
+        sys.exit(1)
+
+    export_snapshot(get_engine())
@@ -0,0 +1,276 @@
+"""全マネージャーの評価レポートの一括生成
+
+最新スコアと成長率を集合クエリでまとめて取得し、レポート本文をプロセスプールで並列に
+組み立てて、そのまま ZIP に書き込む。ZIP は一定サイズまではメモリ上に保持され、
+超えた分は名前のない一時ファイルに退避されるため、作業ディレクトリにファイルは残らない。
+"""
+import logging
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+import pandas as pd
+from sqlalchemy import text
+from ai_advisor import DEFAULT_AI_MODEL
+from report_generator import (
+    AI_SUGGESTION_ERROR, REPORT_FORMATS, export_report, render_manager_report, sanitize_filename
+)
+from rollups import SCORE_DIMENSIONS
+from scoring import ScoringEngine, score_columns_sql, weighted_average_sql
+
+# AI提案の扱い: none=含めない, cached=キャッシュ済みのもののみ, generate=未キャッシュ分も生成
+AI_MODES = ('none', 'cached', 'generate')
+
+# メモリ上に保持する ZIP の最大サイズ（超えると一時ファイルに退避）
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+
+# これより少ない件数はプロセスを起動せずに生成する
+PARALLEL_THRESHOLD = 200
+DEFAULT_CHUNKSIZE = 32
+
+# 生成に失敗したレポートの一覧（ZIP 内のファイル名）
+FAILURES_FILENAME = 'errors.txt'
+
+SCORE_COLUMNS = ', '.join(f'e.{col}' for col in SCORE_DIMENSIONS.values())
+
+
+def _render_report(payload: Tuple) -> Tuple[str, Optional[bytes], Optional[str]]:
+    """プロセスプールで実行するレポート生成（引数・戻り値はpickle可能な値のみ）
+
+    失敗した場合は内容の代わりにエラーメッセージを返し、他のマネージャーの生成は続ける。
+    """
+    filename, latest_scores, growth_rates, ai_suggestions, generated_at, fmt, weights = payload
+    try:
+        report = render_manager_report(latest_scores, growth_rates, ai_suggestions, generated_at, weights)
+        return filename, export_report(report, fmt, latest_scores, growth_rates, weights), None
+    except Exception as e:
+        return filename, None, str(e)
+
+
+def _report_filename(name: str, manager_id: int, fmt: str) -> str:
+    # 同名のマネージャーはIDで区別する
+    return f"manager_report_{sanitize_filename(name)}_{manager_id}.{REPORT_FORMATS[fmt][0]}"
+
+
+class BatchReportGenerator:
+    def __init__(
+        self,
+        engine,
+        ai_mode: str = 'none',
+        ai_advisor=None,
+        model: Optional[str] = None,
+        fmt: str = 'markdown',
+        max_workers: Optional[int] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ):
+        if ai_mode not in AI_MODES:
+            raise ValueError(f"無効なAI提案モードです: {ai_mode}")
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f"未対応のレポート形式です: {fmt}")
+        if ai_mode == 'generate' and ai_advisor is None:
+            raise ValueError("AI提案を生成するには ai_advisor が必要です")
+        self.engine = engine
+        self.ai_mode = ai_mode
+        self.ai_advisor = ai_advisor
+        self.model = model or DEFAULT_AI_MODEL
+        self.fmt = fmt
+        self.max_workers = max_workers
+        self.progress_callback = progress_callback
+        # 直前の write_zip で生成に失敗したレポート（filename, error）
+        self.failures: List[Dict[str, str]] = []
+
+    def load_report_data(
+        self,
+        manager_ids: Optional[List[int]] = None,
+        department: Optional[str] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> Tuple[pd.DataFrame, Dict[int, list]]:
+        """対象マネージャーの最新スコアと月次成長率（新しい月から順、重み付き平均）をまとめて取得"""
+        conditions = []
+        params = {}
+        if manager_ids is not None:
+            conditions.append("m.id = ANY(:manager_ids)")
+            params['manager_ids'] = [int(manager_id) for manager_id in manager_ids]
+        if department is not None:
+            conditions.append("m.department = :department")
+            params['department'] = department
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        latest_query = f"""
+            SELECT DISTINCT ON (m.id)
+                m.id as manager_id,
+                m.name,
+                m.department,
+                e.evaluation_date,
+                {SCORE_COLUMNS}
+            FROM managers m
+            JOIN evaluations e ON e.manager_id = m.id
+            {where}
+            ORDER BY m.id, e.evaluation_date DESC, e.id DESC;
+        """
+        # analyze_growth と同じ計算を全マネージャー分まとめて行う
+        growth_query = f"""
+            WITH monthly_scores AS (
+                SELECT
+                    e.manager_id,
+                    DATE_TRUNC('month', e.evaluation_date) as month,
+                    AVG({weighted_average_sql(score_columns_sql('e'), weights)}) as avg_score
+                FROM evaluations e
+                JOIN managers m ON m.id = e.manager_id
+                {where}
+                GROUP BY e.manager_id, DATE_TRUNC('month', e.evaluation_date)
+            ),
+            score_changes AS (
+                SELECT
+                    manager_id,
+                    month,
+                    avg_score,
+                    LAG(avg_score) OVER (PARTITION BY manager_id ORDER BY month) as prev_score
+                FROM monthly_scores
+            )
+            SELECT
+                manager_id,
+                CASE
+                    WHEN prev_score IS NOT NULL AND prev_score != 0
+                    THEN ((avg_score - prev_score) / prev_score * 100)
+                    ELSE 0
+                END as growth_rate
+            FROM score_changes
+            ORDER BY manager_id, month DESC;
+        """
+        with self.engine.connect() as conn:
+            # スコアは詳細ページと同じ丸めになるよう Decimal のまま扱う
+            latest_df = pd.read_sql_query(text(latest_query), conn, params=params, coerce_float=False)
+            growth_df = pd.read_sql_query(text(growth_query), conn, params=params)
+
+        growth_df['growth_rate'] = growth_df['growth_rate'].astype(float)
+        growth_rates = growth_df.groupby('manager_id', sort=False)['growth_rate'].agg(list).to_dict()
+        return latest_df, growth_rates
+
+    def _load_ai_suggestions(self, latest_df: pd.DataFrame) -> Dict[int, str]:
+        """AI提案をマネージャーIDごとに取得（設定に応じてキャッシュのみ、または生成）"""
+        if self.ai_mode == 'none' or latest_df.empty:
+            return {}
+
+        if self.ai_mode == 'generate':
+            from batch_suggestions import BatchSuggestionGenerator
+
+            generator = BatchSuggestionGenerator(self.ai_advisor, model=self.model)
+            results = generator.generate(latest_df)
+            suggestions = results['suggestion_text'].where(results['status'] != 'error', AI_SUGGESTION_ERROR)
+            return dict(zip(results['manager_id'], suggestions))
+
+        # キャッシュのみ：同一スコアのキーはまとめて1クエリで照会する
+        from ai_cache import SuggestionCache
+
+        cache = self.ai_advisor.cache if self.ai_advisor else SuggestionCache(self.engine)
+        score_columns = list(SCORE_DIMENSIONS.values())
+        keys = {
+            int(row[0]): cache.make_key(
+                dict(zip(
+                    SCORE_DIMENSIONS.keys(),
+                    (None if v is None or v != v else round(float(v), 1) for v in row[1:])
+                )),
+                None,
+                self.model
+            )
+            for row in latest_df[['manager_id'] + score_columns].itertuples(index=False)
+        }
+        cached = cache.get_many(keys.values())
+        return {manager_id: cached[key] for manager_id, key in keys.items() if key in cached}
+
+    def _payloads(
+        self,
+        latest_df: pd.DataFrame,
+        growth_rates: Dict[int, list],
+        ai_suggestions: Dict[int, str],
+        weights: Dict[str, float]
+    ):
+        generated_at = datetime.now()
+        for record in latest_df.to_dict('records'):
+            manager_id = int(record['manager_id'])
+            yield (
+                _report_filename(record['name'], manager_id, self.fmt),
+                record,
+                growth_rates.get(manager_id, []),
+                ai_suggestions.get(manager_id),
+                generated_at,
+                self.fmt,
+                weights
+            )
+
+    def write_zip(
+        self,
+        fileobj,
+        manager_ids: Optional[List[int]] = None,
+        department: Optional[str] = None
+    ) -> int:
+        """対象マネージャーのレポートを ZIP として fileobj に書き込み、レポート数を返す"""
+        weights = ScoringEngine(self.engine).weights()
+        latest_df, growth_rates = self.load_report_data(manager_ids, department, weights)
+        ai_suggestions = self._load_ai_suggestions(latest_df)
+        total = len(latest_df)
+        payloads = self._payloads(latest_df, growth_rates, ai_suggestions, weights)
+        self.failures = []
+
+        with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            if total < PARALLEL_THRESHOLD or self.max_workers == 1:
+                self._write_reports(archive, map(_render_report, payloads), total)
+            else:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                    reports = executor.map(_render_report, payloads, chunksize=DEFAULT_CHUNKSIZE)
+                    self._write_reports(archive, reports, total)
+
+            if self.failures:
+                # 失敗したレポートの一覧を ZIP にも含める
+                archive.writestr(
+                    FAILURES_FILENAME,
+                    '\n'.join(f"{failure['filename']}\t{failure['error']}" for failure in self.failures) + '\n'
+                )
+
+        written = total - len(self.failures)
+        logging.info(f"{written}件のレポートをZIPに出力しました")
+        if self.failures:
+            logging.warning(f"{len(self.failures)}件のレポートの生成に失敗しました（{FAILURES_FILENAME} を参照）")
+        return written
+
+    def _write_reports(self, archive: zipfile.ZipFile, reports, total: int):
+        for done, (filename, content, error) in enumerate(reports, start=1):
+            if error is None:
+                archive.writestr(filename, content)
+            else:
+                logging.error(f"レポート生成エラー（{filename}）: {error}")
+                self.failures.append({'filename': filename, 'error': error})
+            if self.progress_callback:
+                self.progress_callback(done, total)
+
+    def build_zip(
+        self,
+        manager_ids: Optional[List[int]] = None,
+        department: Optional[str] = None
+    ):
+        """レポートの ZIP を生成し、先頭に巻き戻したファイルオブジェクトを返す"""
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        try:
+            self.write_zip(spooled, manager_ids, department)
+        except Exception:
+            spooled.close()
+            raise
+        spooled.seek(0)
+        return spooled
+
+
+if __name__ == '__main__':
+    # 使い方: python batch_reports.py <出力ZIPファイル> [部門名]
+    from db_engine import get_engine
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2:
+        print("使い方: python batch_reports.py <出力ZIPファイル> [部門名]")
+        sys.exit(1)
+
+    generator = BatchReportGenerator(get_engine(), ai_mode='cached')
+    with open(sys.argv[1], 'wb') as f:
+        generator.write_zip(f, department=sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,224 @@
+"""複数マネージャーのAI改善提案の一括生成
+
+スコアが同一のマネージャーは1回のAPI呼び出しにまとめ、スレッドプールで
+同時実行数とリクエストレートを制限しながら生成し、結果を履歴に一括保存する。
+OpenAI互換のエンドポイントであれば OPENAI_BASE_URL で接続先を切り替えられる。
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+import openai
+import pandas as pd
+from sqlalchemy import text
+from ai_advisor import SUGGESTION_MAX_TOKENS, SUGGESTION_TEMPERATURE
+from instrumentation import instrument_openai
+from query_cache import invalidate
+from rollups import SCORE_DIMENSIONS
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+
+class TokenBucket:
+    """トークンバケット方式のレート制限（スレッドセーフ）"""
+
+    def __init__(self, rate_per_second: float, capacity: Optional[float] = None):
+        self.rate = rate_per_second
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_second)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取得できるまで待機"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class BatchSuggestionGenerator:
+    def __init__(
+        self,
+        advisor,
+        model: str,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ):
+        self.advisor = advisor
+        self.engine = advisor.engine
+        self.model = model
+        # リトライはこのクラスで制御するため、クライアント側のリトライは無効化
+        self.client = instrument_openai(advisor.client.with_options(max_retries=0))
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = TokenBucket(requests_per_minute / 60.0)
+        self.max_retries = max_retries
+        self.progress_callback = progress_callback
+
+    def load_latest_scores(self, manager_ids: Optional[List[int]] = None, department: Optional[str] = None) -> pd.DataFrame:
+        """対象マネージャーの最新の評価スコアを1クエリで取得"""
+        conditions = []
+        params = {}
+        if manager_ids is not None:
+            conditions.append("m.id = ANY(:manager_ids)")
+            params['manager_ids'] = [int(manager_id) for manager_id in manager_ids]
+        if department is not None:
+            conditions.append("m.department = :department")
+            params['department'] = department
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        query = f"""
+            SELECT DISTINCT ON (e.manager_id)
+                e.manager_id,
+                {', '.join(f'e.{col}' for col in SCORE_DIMENSIONS.values())}
+            FROM evaluations e
+            JOIN managers m ON m.id = e.manager_id
+            {where}
+            ORDER BY e.manager_id, e.evaluation_date DESC, e.id DESC;
+        """
+        return pd.read_sql_query(text(query), self.engine, params=params)
+
+    def _complete(self, prompt: str) -> str:
+        """レート制限とバックオフ付きリトライでAPIを呼び出す"""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self.advisor._build_messages(prompt),
+                    temperature=SUGGESTION_TEMPERATURE,
+                    max_tokens=SUGGESTION_MAX_TOKENS
+                )
+                suggestion = response.choices[0].message.content
+                if not suggestion:
+                    raise ValueError("AIからの応答が空でした")
+                return suggestion
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_after_seconds(e)
+                if delay is None:
+                    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+                    delay *= random.uniform(0.5, 1.0)
+                logging.warning(f"AI提案生成をリトライします（{attempt + 1}回目, {delay:.1f}秒後）: {str(e)}")
+                time.sleep(delay)
+
+    def _generate(self, scores: Dict[str, float], template: Optional[str]) -> tuple:
+        """1つのスコアパターンの提案を生成（キャッシュ優先）"""
+        if self.advisor.debug_mode:
+            return self.advisor._get_debug_response(scores), 'debug'
+
+        cache_key = self.advisor.cache.make_key(scores, template, self.model)
+        cached_suggestion = self.advisor.cache.get(cache_key)
+        if cached_suggestion is not None:
+            return cached_suggestion, 'cached'
+
+        suggestion = self._complete(self.advisor._build_prompt(scores, template))
+        self.advisor.cache.set(cache_key, suggestion)
+        return suggestion, 'generated'
+
+    def save_suggestions(self, results: pd.DataFrame) -> int:
+        """生成に成功した提案を ai_suggestion_history に一括保存"""
+        succeeded = results[results['suggestion_text'].notna()]
+        if succeeded.empty:
+            return 0
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("""
+                    INSERT INTO ai_suggestion_history (manager_id, suggestion_text)
+                    VALUES (:manager_id, :suggestion_text);
+                """),
+                [
+                    {'manager_id': int(row.manager_id), 'suggestion_text': row.suggestion_text.strip()}
+                    for row in succeeded.itertuples()
+                ]
+            )
+        invalidate('ai_suggestion_history')
+        return len(succeeded)
+
+    def run(
+        self,
+        manager_ids: Optional[List[int]] = None,
+        department: Optional[str] = None,
+        template_id: Optional[int] = None
+    ) -> pd.DataFrame:
+        """対象マネージャーの提案を生成して保存し、マネージャーごとの結果を返す"""
+        scores_df = self.load_latest_scores(manager_ids, department)
+        results_df = self.generate(scores_df, template_id)
+        saved = self.save_suggestions(results_df)
+        logging.info(f"{saved}件のAI提案を一括保存しました")
+        return results_df
+
+    def generate(self, scores_df: pd.DataFrame, template_id: Optional[int] = None) -> pd.DataFrame:
+        """マネージャーごとのスコア（manager_id と各スコア列）から提案を生成（保存はしない）"""
+        columns = ['manager_id', 'status', 'suggestion_text', 'error']
+        if scores_df.empty:
+            return pd.DataFrame(columns=columns)
+
+        template = self.advisor._get_template_text(template_id) if template_id else None
+
+        # 同一のスコアベクトルはまとめて1回だけ生成する
+        score_columns = list(SCORE_DIMENSIONS.values())
+        scores_df = scores_df[['manager_id'] + score_columns].copy()
+        scores_df[score_columns] = scores_df[score_columns].astype(float).round(1)
+        groups = scores_df.groupby(score_columns, dropna=False)['manager_id'].apply(list)
+
+        results = []
+        total = len(groups)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = {}
+            for score_values, group_manager_ids in groups.items():
+                scores = dict(zip(SCORE_DIMENSIONS.keys(), score_values))
+                future = executor.submit(self._generate, scores, template)
+                futures[future] = group_manager_ids
+
+            for done, future in enumerate(as_completed(futures), start=1):
+                group_manager_ids = futures[future]
+                try:
+                    suggestion, status = future.result()
+                    error = None
+                except Exception as e:
+                    logging.error(f"AI提案生成エラー: {str(e)}")
+                    suggestion, status, error = None, 'error', str(e)
+                for manager_id in group_manager_ids:
+                    results.append({
+                        'manager_id': int(manager_id),
+                        'status': status,
+                        'suggestion_text': suggestion,
+                        'error': error
+                    })
+                if self.progress_callback:
+                    self.progress_callback(done, total)
+
+        logging.info(f"{len(results)}件のAI提案を生成しました（API呼び出し対象: {total}パターン）")
+        return pd.DataFrame(results, columns=columns)
@@ -0,0 +1,161 @@
+"""ベンチマークの計測対象
+
+DatabaseManager の読み取りメソッドはクエリキャッシュを空にしてから、グラフは図のキャッシュを空にしてから計測する。
+マネージャー一覧の表示は Streamlit の AppTest でスクリプトの実行全体を計測する。
+"""
+import inspect
+from datetime import date, timedelta
+from typing import List, Optional
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+import visualization
+from analytics_snapshot import duckdb_available
+from benchmarks.harness import BenchmarkCase
+from database import DatabaseManager
+from query_cache import query_cache
+from report_generator import generate_manager_report
+from utils import calculate_company_average
+
+# 読み取りメソッドとして計測対象に含めるべきメソッドの接頭辞
+READ_METHOD_PREFIXES = ('get_', 'analyze_')
+
+# 計測対象外の読み取りメソッド（DBにアクセスしない統計情報の取得）
+EXCLUDED_READ_METHODS = {'get_pool_stats', 'get_query_cache_stats', 'get_snapshot_info'}
+
+APP_TIMEOUT_SECONDS = 300
+
+# 詳細ページなどで計測に使用するマネージャー
+SAMPLE_MANAGER_ID = 1
+
+
+def _manager_list_app():
+    from components import display_manager_list
+    from database import DatabaseManager
+    display_manager_list(DatabaseManager().get_all_managers())
+
+
+def _paginated_manager_list_app():
+    from components import display_paginated_manager_list
+    from database import DatabaseManager
+    display_paginated_manager_list(DatabaseManager())
+
+
+def _run_app(script) -> AppTest:
+    app = AppTest.from_function(script, default_timeout=APP_TIMEOUT_SECONDS).run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    return app
+
+
+def uncovered_read_methods(cases: List[BenchmarkCase]) -> List[str]:
+    """計測対象に含まれていない DatabaseManager の読み取りメソッド"""
+    covered = {case.name.split('[')[0].removeprefix('db.') for case in cases}
+    return [
+        name for name, _ in inspect.getmembers(DatabaseManager, inspect.isfunction)
+        if name.startswith(READ_METHOD_PREFIXES) and name not in EXCLUDED_READ_METHODS and name not in covered
+    ]
+
+
+def build_cases(db: DatabaseManager, advisor, snapshot_dir: Optional[str] = None) -> List[BenchmarkCase]:
+    """データセットを読み込んだデータベースに対する計測対象の一覧
+
+    snapshot_dir を指定し DuckDB がインストールされている場合は、分析用スナップショットを作成し、
+    集計系のメソッドを snapshot バックエンドでも計測する（ケース名の末尾に [snapshot]）。
+    """
+    manager_id = SAMPLE_MANAGER_ID
+    one_year_ago = date.today() - timedelta(days=365)
+    departments = db.get_departments()
+
+    db_cases = {
+        'db.get_all_managers': lambda: db.get_all_managers(),
+        'db.get_managers_page': lambda: db.get_managers_page(),
+        'db.get_managers_page[filtered]': lambda: db.get_managers_page(
+            name_filter='マネージャー0001', department=departments[0], sort_column='avg_communication', ascending=False
+        ),
+        'db.get_departments': lambda: db.get_departments(),
+        'db.get_manager_details': lambda: db.get_manager_details(manager_id),
+        'db.get_manager_details[latest]': lambda: db.get_manager_details(manager_id, limit=1),
+        'db.get_department_statistics': lambda: db.get_department_statistics(),
+        'db.get_suggestion_statistics': lambda: db.get_suggestion_statistics(),
+        'db.get_recent_suggestions': lambda: db.get_recent_suggestions(),
+        'db.get_evaluation_metrics': lambda: db.get_evaluation_metrics(),
+        'db.get_custom_metric_columns': lambda: db.get_custom_metric_columns(),
+        'db.get_metric_statistics': lambda: db.get_metric_statistics(),
+        'db.get_metric_statistics[1y]': lambda: db.get_metric_statistics(one_year_ago),
+        'db.get_manager_trend': lambda: db.get_manager_trend(manager_id),
+        'db.get_manager_trend[week]': lambda: db.get_manager_trend(manager_id, 'week'),
+        'db.analyze_growth': lambda: db.analyze_growth(manager_id),
+        'db.get_manager_profile': lambda: db.get_manager_profile(manager_id),
+        'db.get_department_metric_cube': lambda: db.get_department_metric_cube(),
+        'db.get_score_percentiles': lambda: db.get_score_percentiles(),
+        'growth_analytics.growth_summary': lambda: db.growth_analytics().growth_summary(),
+    }
+    if snapshot_dir is not None and duckdb_available():
+        snapshot_db = DatabaseManager(analytics_backend='snapshot', snapshot_dir=snapshot_dir)
+        snapshot_db.export_analytics_snapshot()
+        db_cases.update({
+            'db.get_department_statistics[snapshot]': lambda: snapshot_db.get_department_statistics(),
+            'db.analyze_growth[snapshot]': lambda: snapshot_db.analyze_growth(manager_id),
+            'db.get_department_metric_cube[snapshot]': lambda: snapshot_db.get_department_metric_cube(),
+            'db.get_score_percentiles[snapshot]': lambda: snapshot_db.get_score_percentiles(),
+            'growth_analytics.growth_summary[snapshot]': lambda: snapshot_db.growth_analytics().growth_summary(),
+        })
+    cases = [
+        BenchmarkCase(name, func, setup=query_cache.clear)
+        for name, func in db_cases.items()
+    ]
+
+    # 描画・集計の入力（キャッシュの影響を受けないよう事前に取得しておく）
+    managers_df = db.get_all_managers()
+    details = db.get_manager_details(manager_id)
+    trend = db.get_manager_trend(manager_id)
+    growth = db.analyze_growth(manager_id)
+    profile = db.get_manager_profile(manager_id)
+    department_stats = db.get_department_statistics()
+    metric_cube = db.get_department_metric_cube()
+    score_percentiles = db.get_score_percentiles()
+    latest = details.iloc[0]
+    radar_scores = [
+        latest['communication_score'], latest['support_score'], latest['goal_management_score'],
+        latest['leadership_score'], latest['problem_solving_score'], latest['strategy_score']
+    ]
+
+    def reset_advisor():
+        advisor.clear_cache()
+        st.session_state.api_calls_count = 0
+
+    figure_cases = {
+        'visualization.create_radar_chart': lambda: visualization.create_radar_chart(radar_scores),
+        'visualization.create_trend_chart': lambda: visualization.create_trend_chart(details),
+        'visualization.create_score_trend_chart': lambda: visualization.create_score_trend_chart(trend),
+        'visualization.create_growth_chart': lambda: visualization.create_growth_chart(growth),
+        'visualization.create_department_comparison_chart': (
+            lambda: visualization.create_department_comparison_chart(department_stats)
+        ),
+        'visualization.create_department_metrics_chart': (
+            lambda: visualization.create_department_metrics_chart(department_stats)
+        ),
+        'visualization.create_department_heatmap': (
+            lambda: visualization.create_department_heatmap(metric_cube, 'communication')
+        ),
+        'visualization.create_score_distribution_chart': (
+            lambda: visualization.create_score_distribution_chart(score_percentiles)
+        ),
+    }
+    cases += [
+        BenchmarkCase(name, func, setup=visualization.figure_cache.clear)
+        for name, func in figure_cases.items()
+    ]
+    cases += [
+        BenchmarkCase('utils.calculate_company_average', lambda: calculate_company_average(managers_df)),
+        BenchmarkCase(
+            'report_generator.generate_manager_report',
+            lambda: generate_manager_report(profile, advisor),
+            setup=reset_advisor
+        ),
+        BenchmarkCase('components.display_manager_list', lambda: _run_app(_manager_list_app), repeat=3),
+        BenchmarkCase(
+            'components.display_paginated_manager_list', lambda: _run_app(_paginated_manager_list_app), repeat=3
+        ),
+    ]
+    return cases
@@ -0,0 +1,143 @@
+"""ベンチマーク用の合成データセット
+
+シードから決定的に生成したマネージャーと複数年分の月次評価を、使い捨てのデータベースに読み込む。
+同じ規模・シードのデータセットが読み込み済みの場合は再利用する（managers テーブルのコメントで判定）。
+"""
+import logging
+from datetime import date
+from typing import Dict
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from partitions import _add_months, ensure_month_partitions
+from rollups import SCORE_DIMENSIONS
+
+# 規模ごとのマネージャー数
+SCALES = {
+    '1k': 1_000,
+    '10k': 10_000,
+    '100k': 100_000,
+}
+
+DEFAULT_SEED = 42
+
+# 評価履歴の月数と、各月に評価がある確率
+HISTORY_MONTHS = 36
+EVALUATION_RATE = 0.85
+
+DEPARTMENTS = [
+    '営業', '開発', '人事', '経営企画', 'カスタマーサクセス', 'マーケティング',
+    '財務', '法務', '品質保証', 'インフラ', 'デザイン', 'データ分析'
+]
+
+# 読み込み済みのデータセットを識別する managers テーブルのコメント
+_DATASET_COMMENT = "benchmark:{scale}:seed={seed}:months={months}"
+
+
+def generate_managers(n_managers: int, rng: np.random.Generator) -> pd.DataFrame:
+    """マネージャー（id は 1 から連番）"""
+    ids = np.arange(1, n_managers + 1)
+    return pd.DataFrame({
+        'id': ids,
+        'name': [f"ベンチマークマネージャー{i:06d}" for i in ids],
+        'department': np.array(DEPARTMENTS, dtype=object)[rng.integers(0, len(DEPARTMENTS), n_managers)]
+    })
+
+
+def generate_evaluations(
+    n_managers: int,
+    rng: np.random.Generator,
+    months: int = HISTORY_MONTHS,
+    end_month: date = None
+) -> pd.DataFrame:
+    """end_month（既定は当月）までの months ヶ月分の評価
+
+    スコアはマネージャーごとの基準値・項目ごとの差・月ごとの傾向に評価ごとのばらつきを加え、
+    1〜5の範囲で小数点1桁に丸める。
+    """
+    end_month = end_month or date.today().replace(day=1)
+    first_month = _add_months(end_month, -(months - 1))
+
+    present = rng.random((n_managers, months)) < EVALUATION_RATE
+    manager_pos, month_pos = np.nonzero(present)
+    n_evaluations = len(manager_pos)
+
+    base = rng.normal(3.4, 0.4, n_managers)
+    trend = rng.normal(0.0, 0.015, n_managers)
+    offsets = rng.normal(0.0, 0.3, (n_managers, len(SCORE_DIMENSIONS)))
+    noise = rng.normal(0.0, 0.35, (n_evaluations, len(SCORE_DIMENSIONS)))
+    scores = (
+        base[manager_pos, None]
+        + offsets[manager_pos]
+        + (trend[manager_pos] * month_pos)[:, None]
+        + noise
+    )
+    scores = np.round(np.clip(scores, 1.0, 5.0), 1)
+
+    months_since = np.datetime64(first_month, 'M') + month_pos
+    evaluation_dates = months_since.astype('datetime64[D]') + rng.integers(0, 28, n_evaluations)
+
+    evaluations = pd.DataFrame(scores, columns=list(SCORE_DIMENSIONS.values()))
+    evaluations.insert(0, 'manager_id', manager_pos + 1)
+    evaluations.insert(1, 'evaluation_date', evaluation_dates)
+    return evaluations
+
+
+def load_dataset(db, scale: str, seed: int = DEFAULT_SEED, months: int = HISTORY_MONTHS) -> Dict[str, int]:
+    """データセットを読み込み、件数を返す（同じデータセットが読み込み済みの場合はそのまま使用）
+
+    managers・evaluations・ロールアップ・AI提案の履歴とキャッシュは全て削除される。
+    """
+    comment = _DATASET_COMMENT.format(scale=scale, seed=seed, months=months)
+    with db.engine.connect() as conn:
+        current = conn.execute(text("SELECT obj_description('managers'::regclass, 'pg_class');")).scalar()
+
+    if current != comment:
+        rng = np.random.default_rng(seed)
+        managers = generate_managers(SCALES[scale], rng)
+        evaluations = generate_evaluations(len(managers), rng, months)
+        logging.info(f"データセット {scale} を読み込みます（評価 {len(evaluations)}件）")
+
+        with db.engine.begin() as conn:
+            conn.execute(text("""
+                TRUNCATE managers, evaluations, evaluation_scores,
+                    manager_score_rollups, department_score_rollups,
+                    ai_suggestion_history, ai_suggestion_cache
+                RESTART IDENTITY;
+            """))
+            current_month = date.today().replace(day=1)
+            ensure_month_partitions(conn, _add_months(current_month, -(months - 1)), current_month)
+            conn.execute(
+                text("""
+                    INSERT INTO managers (id, name, department)
+                    SELECT * FROM UNNEST(CAST(:ids AS INTEGER[]), CAST(:names AS VARCHAR[]), CAST(:departments AS VARCHAR[]));
+                """),
+                {
+                    'ids': managers['id'].tolist(),
+                    'names': managers['name'].tolist(),
+                    'departments': managers['department'].tolist()
+                }
+            )
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('managers', 'id'), :max_id);"), {'max_id': len(managers)})
+            db._load_evaluations(conn, db._prepare_evaluations_frame(evaluations), batch_size=50_000)
+
+            # 提案履歴の集計用に1割のマネージャーに提案を追加
+            conn.execute(text("""
+                INSERT INTO ai_suggestion_history (manager_id, suggestion_text, is_implemented, effectiveness_rating)
+                SELECT id, 'ベンチマーク用の改善提案', id % 3 = 0, 1 + id % 5
+                FROM managers
+                WHERE id % 10 = 0;
+            """))
+            conn.execute(text(f"COMMENT ON TABLE managers IS '{comment}';"))
+
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text("VACUUM ANALYZE;"))
+
+    with db.engine.connect() as conn:
+        counts = conn.execute(text("""
+            SELECT
+                (SELECT COUNT(*) FROM managers) as managers,
+                (SELECT COUNT(*) FROM evaluations) as evaluations,
+                (SELECT COUNT(*) FROM evaluation_scores) as evaluation_scores
+        """)).mappings().one()
+    return dict(counts)
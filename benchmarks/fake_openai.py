@@ -0,0 +1,98 @@
+"""ベンチマーク用の OpenAI 互換のフェイクエンドポイント
+
+/v1/chat/completions に対し、一定の遅延の後に決定的な提案文とトークン使用量を返す（ストリーミングにも対応）。
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 応答までの遅延（秒）とストリーミングのチャンク数
+DEFAULT_LATENCY_SECONDS = 0.05
+STREAM_CHUNKS = 20
+
+SUGGESTION_TEXT = (
+    "1. 週次の1on1でメンバーの課題を確認し、具体的なフィードバックを行う。\n"
+    "2. 四半期ごとにチームの目標と進捗を共有する。\n"
+    "3. 意思決定の背景を言語化してチームに説明する。\n"
+)
+
+
+def _completion(model: str) -> dict:
+    return {
+        'id': 'chatcmpl-benchmark',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': SUGGESTION_TEXT},
+            'finish_reason': 'stop'
+        }],
+        'usage': {'prompt_tokens': 200, 'completion_tokens': 120, 'total_tokens': 320}
+    }
+
+
+def _chunk(model: str, delta: dict, finish_reason=None, usage=None) -> bytes:
+    chunk = {
+        'id': 'chatcmpl-benchmark',
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [] if usage else [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+    }
+    if usage:
+        chunk['usage'] = usage
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+class FakeOpenAIServer:
+    """デーモンスレッドで動作するフェイクエンドポイント（base_url を OPENAI_BASE_URL に設定して使用）"""
+
+    def __init__(self, latency_seconds: float = DEFAULT_LATENCY_SECONDS, port: int = 0):
+        latency = latency_seconds
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                model = body.get('model', 'gpt-3.5-turbo')
+                time.sleep(latency)
+                if not body.get('stream'):
+                    payload = json.dumps(_completion(model), ensure_ascii=False).encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                step = -(-len(SUGGESTION_TEXT) // STREAM_CHUNKS)
+                for start in range(0, len(SUGGESTION_TEXT), step):
+                    self.wfile.write(_chunk(model, {'content': SUGGESTION_TEXT[start:start + step]}))
+                self.wfile.write(_chunk(model, {}, finish_reason='stop'))
+                if (body.get('stream_options') or {}).get('include_usage'):
+                    usage = _completion(model)['usage']
+                    self.wfile.write(_chunk(model, {}, usage=usage))
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'FakeOpenAIServer':
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
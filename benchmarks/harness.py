@@ -0,0 +1,79 @@
+"""ベンチマークの計測とベースラインとの比較"""
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_REPEAT = 5
+DEFAULT_WARMUP = 1
+
+# ベースラインの中央値からこの割合を超えて遅くなり、かつ差が NOISE_FLOOR_MS 以上の場合を劣化とみなす
+DEFAULT_THRESHOLD = 0.2
+NOISE_FLOOR_MS = 1.0
+
+
+@dataclass
+class BenchmarkCase:
+    """計測対象（setup は各回の計測の直前に実行され、計測時間には含めない）"""
+    name: str
+    func: Callable[[], object]
+    setup: Optional[Callable[[], None]] = None
+    repeat: Optional[int] = None
+
+
+def measure(case: BenchmarkCase, repeat: int = DEFAULT_REPEAT, warmup: int = DEFAULT_WARMUP) -> dict:
+    """ウォームアップの後に repeat 回計測し、ミリ秒単位の統計を返す"""
+    samples = []
+    for i in range(warmup + (case.repeat or repeat)):
+        if case.setup:
+            case.setup()
+        started = time.perf_counter()
+        case.func()
+        elapsed = (time.perf_counter() - started) * 1000
+        if i >= warmup:
+            samples.append(elapsed)
+    return {
+        'samples': len(samples),
+        'min_ms': min(samples),
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.fmean(samples),
+        'max_ms': max(samples),
+        'stdev_ms': statistics.stdev(samples) if len(samples) > 1 else 0.0
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+    """ケースごとの中央値をベースラインと比較（status は regression / improvement / ok / new）"""
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append({'case': name, 'median_ms': result['median_ms'], 'baseline_ms': None, 'ratio': None, 'status': 'new'})
+            continue
+        ratio = result['median_ms'] / base['median_ms'] if base['median_ms'] > 0 else float('inf')
+        difference = result['median_ms'] - base['median_ms']
+        if ratio > 1 + threshold and difference >= NOISE_FLOOR_MS:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold) and -difference >= NOISE_FLOOR_MS:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append({
+            'case': name,
+            'median_ms': result['median_ms'],
+            'baseline_ms': base['median_ms'],
+            'ratio': ratio,
+            'status': status
+        })
+    return rows
+
+
+def format_comparison(rows: List[dict]) -> str:
+    """比較結果の表（テキスト）"""
+    width = max([len(row['case']) for row in rows] + [4])
+    lines = [f"{'case':<{width}}  {'median':>10}  {'baseline':>10}  {'ratio':>6}  status"]
+    for row in rows:
+        baseline = f"{row['baseline_ms']:10.2f}" if row['baseline_ms'] is not None else f"{'-':>10}"
+        ratio = f"{row['ratio']:6.2f}" if row['ratio'] is not None else f"{'-':>6}"
+        lines.append(f"{row['case']:<{width}}  {row['median_ms']:10.2f}  {baseline}  {ratio}  {row['status']}")
+    return '\n'.join(lines)
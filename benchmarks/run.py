@@ -0,0 +1,148 @@
+"""ベンチマークの実行
+
+使い方:
+    BENCHMARK_DATABASE_URL=postgresql://.../managerscore_bench \\
+        python -m benchmarks.run --scale 1k --output bench_output.json --baseline benchmarks/baseline.json
+
+BENCHMARK_DATABASE_URL のデータベースはマイグレーションの適用後、データが全て置き換えられるため、
+使い捨てのデータベースを指定すること。OpenAI API はプロセス内のフェイクエンドポイントに接続する。
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from sqlalchemy import text
+
+BENCHMARK_DATABASE_URL = os.getenv('BENCHMARK_DATABASE_URL')
+
+
+def _prepare_environment():
+    # アプリケーションのモジュールは読み込み時に DATABASE_URL などを参照するため、読み込む前に設定する
+    if not BENCHMARK_DATABASE_URL:
+        sys.exit("BENCHMARK_DATABASE_URL に使い捨てのデータベースを指定してください")
+    if BENCHMARK_DATABASE_URL == os.getenv('DATABASE_URL'):
+        sys.exit("BENCHMARK_DATABASE_URL には DATABASE_URL と異なるデータベースを指定してください")
+    os.environ['DATABASE_URL'] = BENCHMARK_DATABASE_URL
+    os.environ['OPENAI_API_KEY'] = 'benchmark'
+    os.environ.setdefault('SLOW_QUERY_THRESHOLD_MS', '1000000')
+
+
+def _migrate():
+    from alembic import command
+    from alembic.config import Config
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    config = Config(os.path.join(root, 'alembic.ini'))
+    config.set_main_option('script_location', os.path.join(root, 'migrations'))
+    command.upgrade(config, 'head')
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def main(argv=None) -> int:
+    from benchmarks.datasets import DEFAULT_SEED, HISTORY_MONTHS, SCALES
+    from benchmarks.harness import DEFAULT_REPEAT, DEFAULT_THRESHOLD, compare, format_comparison
+
+    parser = argparse.ArgumentParser(description="データ取得・描画の主要な処理のベンチマーク")
+    parser.add_argument('--scale', action='append', choices=list(SCALES), help="データセットの規模（複数指定可、既定は 1k）")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--months', type=int, default=HISTORY_MONTHS, help="評価履歴の月数")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--only', help="名前にこの文字列を含むケースのみ実行")
+    parser.add_argument('--output', help="結果のJSONの出力先（省略時は標準出力）")
+    parser.add_argument('--baseline', help="比較するベースラインのJSON")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="劣化とみなす中央値の増加率")
+    parser.add_argument('--fail-on-regression', action='store_true', help="劣化がある場合は終了コード1で終了")
+    args = parser.parse_args(argv)
+    scales = args.scale or ['1k']
+
+    _prepare_environment()
+    logging.basicConfig(level=logging.WARNING)
+    _migrate()
+
+    from benchmarks.fake_openai import FakeOpenAIServer
+    fake_openai = FakeOpenAIServer().start()
+    os.environ['OPENAI_BASE_URL'] = fake_openai.base_url
+
+    from ai_advisor import AIAdvisor
+    from benchmarks.cases import build_cases, uncovered_read_methods
+    from benchmarks.datasets import load_dataset
+    from benchmarks.harness import measure
+    from database import DatabaseManager
+
+    db = DatabaseManager()
+    advisor = AIAdvisor()
+
+    output = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'months': args.months,
+            'repeat': args.repeat
+        },
+        'scales': {}
+    }
+    with db.engine.connect() as conn:
+        output['meta']['postgres'] = conn.execute(text("SHOW server_version;")).scalar()
+
+    snapshot_dir = tempfile.TemporaryDirectory(prefix='benchmark_snapshot_')
+    for scale in scales:
+        dataset = load_dataset(db, scale, args.seed, args.months)
+        cases = build_cases(db, advisor, snapshot_dir.name)
+        missing = uncovered_read_methods(cases)
+        if missing:
+            logging.warning(f"計測対象に含まれていない読み取りメソッド: {', '.join(missing)}")
+        if args.only:
+            cases = [case for case in cases if args.only in case.name]
+
+        results = {}
+        for case in cases:
+            results[case.name] = measure(case, args.repeat)
+            print(f"[{scale}] {case.name}: {results[case.name]['median_ms']:.2f} ms", file=sys.stderr)
+        output['scales'][scale] = {'dataset': dataset, 'results': results}
+
+    fake_openai.stop()
+    snapshot_dir.cleanup()
+
+    text_output = json.dumps(output, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text_output + '\n')
+    else:
+        print(text_output)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = 0
+    for scale, scale_output in output['scales'].items():
+        baseline_results = baseline.get('scales', {}).get(scale, {}).get('results')
+        if baseline_results is None:
+            print(f"\n[{scale}] ベースラインに該当する規模の結果がありません", file=sys.stderr)
+            continue
+        rows = compare(scale_output['results'], baseline_results, args.threshold)
+        regressions += sum(row['status'] == 'regression' for row in rows)
+        print(f"\n[{scale}] ベースライン（{baseline['meta'].get('git_revision')}）との比較", file=sys.stderr)
+        print(format_comparison(rows), file=sys.stderr)
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
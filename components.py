@@ -1,23 +1,49 @@
+import html
+import numpy as np
+import pandas as pd
 import streamlit as st
 from sqlalchemy import text
+from utils import summarize_scores
+
+# スコアの下限値とカラーコード（上から順に判定）
+SCORE_COLOR_THRESHOLDS = [
+    (4.0, "#28a745"),  # 緑（優秀）
+    (3.0, "#17a2b8"),  # 青（良好）
+    (2.0, "#ffc107"),  # 黄（要改善）
+]
+SCORE_COLOR_DEFAULT = "#dc3545"  # 赤（要注意）
+SCORE_COLOR_MISSING = "#6c757d"  # 灰（未入力）
+
+# 一覧に表示するスコア列と見出し
+SCORE_COLUMN_LABELS = {
+    'avg_communication': '🗣️ コミュニケーション',
+    'avg_support': '🤝 サポート',
+    'avg_goal': '🎯 目標管理',
+    'avg_leadership': '👥 リーダーシップ',
+    'avg_problem': '💡 問題解決力',
+    'avg_strategy': '📈 戦略'
+}
 
 def get_score_color(score):
     """スコアに応じたカラーコードを返す"""
-    if score >= 4.0:
-        return "#28a745"  # 緑（優秀）
-    elif score >= 3.0:
-        return "#17a2b8"  # 青（良好）
-    elif score >= 2.0:
-        return "#ffc107"  # 黄（要改善）
-    else:
-        return "#dc3545"  # 赤（要注意）
+    if pd.isna(score):
+        return SCORE_COLOR_MISSING
+    for threshold, color in SCORE_COLOR_THRESHOLDS:
+        if score >= threshold:
+            return color
+    return SCORE_COLOR_DEFAULT
 
-def display_manager_list(managers_df):
-    """マネージャー一覧を構造化されたリストで表示（フィルタリング機能付き）"""
-    if managers_df.empty:
-        st.warning("マネージャーデータが見つかりません")
-        return
+def get_score_levels(scores):
+    """スコアの列をまとめて色の段階（SCORE_COLOR_THRESHOLDS の添字、該当なしは末尾）に変換"""
+    scores = np.asarray(scores, dtype=float)
+    return np.select(
+        [scores >= threshold for threshold, _ in SCORE_COLOR_THRESHOLDS],
+        np.arange(len(SCORE_COLOR_THRESHOLDS)),
+        len(SCORE_COLOR_THRESHOLDS)
+    )
 
+def _render_filter_controls(departments):
+    """フィルター・ソートの入力欄を表示し、選択値を返す"""
     # フィルターとソート設定
     st.subheader("🔍 フィルター & ソート設定")
     
@@ -33,7 +59,7 @@ def display_manager_list(managers_df):
     with filter_col2:
         department_filter = st.selectbox(
             "🏢 部門でフィルター",
-            options=["全て"] + sorted(managers_df["department"].unique().tolist()),
+            options=["全て"] + list(departments),
             key="department_filter",
             help="特定の部門のマネージャーのみを表示"
         )
@@ -53,12 +79,7 @@ def display_manager_list(managers_df):
         sort_options = {
             'name': '👤 名前',
             'department': '🏢 部門',
-            'avg_communication': '🗣️ コミュニケーション',
-            'avg_support': '🤝 サポート',
-            'avg_goal': '🎯 目標管理',
-            'avg_leadership': '👥 リーダーシップ',
-            'avg_problem': '💡 問題解決力',
-            'avg_strategy': '📈 戦略'
+            **SCORE_COLUMN_LABELS
         }
         
         sort_column = st.selectbox(
@@ -78,34 +99,13 @@ def display_manager_list(managers_df):
             help="昇順/降順を選択"
         )
 
-    # フィルタリングとソートの適用
-    filtered_df = managers_df.copy()
+    return name_filter, department_filter, sort_column, sort_order
 
-    # 名前フィルター
-    if name_filter:
-        filtered_df = filtered_df[filtered_df["name"].str.contains(name_filter, case=False, na=False)]
+def _format_average(score):
+    return "-" if np.isnan(score) else f"{score:.1f}/5.0"
 
-    # 部門フィルター
-    if department_filter != "全て":
-        filtered_df = filtered_df[filtered_df["department"] == department_filter]
-
-    # ソート
-    try:
-        filtered_df = filtered_df.sort_values(by=sort_column, ascending=sort_order)
-    except Exception as e:
-        st.error(f"ソート処理中にエラーが発生しました: {str(e)}")
-        filtered_df = filtered_df.sort_values(by='name', ascending=True)
-
-    # フィルター後のデータ件数表示
-    st.markdown(f"**表示件数**: {len(filtered_df)}件")
-    
-    if filtered_df.empty:
-        st.info("条件に一致するマネージャーが見つかりません")
-        return
-
-    # 部門ごとにグループ化
-    departments = sorted(filtered_df['department'].unique())
-    department_groups = {dept: filtered_df[filtered_df['department'] == dept] for dept in departments}
+def _render_manager_rows(filtered_df, stats_label="", weights=None):
+    """マネージャーを部門ごとにまとめて表示"""
 
     # カスタムCSS
     st.markdown("""
@@ -173,9 +173,11 @@ def display_manager_list(managers_df):
         st.markdown("### ⚡ アクション")
     st.markdown("<hr style='margin: 0.5rem 0'>", unsafe_allow_html=True)
 
-    # 部門ごとのマネージャーリスト表示
-    for department in departments:
-        dept_df = department_groups[department]
+    # 部門ヘッダーの統計（評価のないマネージャーを除いて一括集計）
+    summary = summarize_scores(filtered_df, weights)
+
+    # 部門ごとのマネージャーリスト表示（並び順は部門内で維持）
+    for department, dept_df in filtered_df.groupby('department', sort=True):
         
         # 部門ヘッダーと統計情報
         st.markdown(
@@ -183,9 +185,8 @@ def display_manager_list(managers_df):
             <div class="department-header">
                 🏢 {department}
                 <div class="department-stats">
-                    マネージャー数: {len(dept_df)}名 | 
-                    平均評価: {dept_df[['avg_communication', 'avg_support', 'avg_goal', 
-                                    'avg_leadership', 'avg_problem', 'avg_strategy']].mean().mean():.1f}/5.0
+                    {stats_label}マネージャー数: {len(dept_df)}名（評価あり: {summary.evaluated_count(department)}名） | 
+                    平均評価: {_format_average(summary.get('mean', 'overall', department))}
                 </div>
             </div>
             """,
@@ -235,8 +236,248 @@ def display_manager_list(managers_df):
                 
                 st.markdown('</div>', unsafe_allow_html=True)
 
-def display_score_details(scores):
-    """スコアの詳細表示（カラーコード付き）"""
+def _render_view_mode():
+    """一覧の表示形式（カード / テーブル）を選択"""
+    return st.radio(
+        "表示形式",
+        options=["card", "table"],
+        format_func=lambda x: "🗂️ カード" if x == "card" else "📋 テーブル（高密度）",
+        key="manager_view_mode",
+        horizontal=True,
+        help="多数のマネージャーを一度に確認する場合はテーブル表示が高速です"
+    )
+
+def _build_manager_table_html(filtered_df):
+    """マネージャー一覧を1つのHTMLテーブルとして組み立てる（列単位で一括処理）"""
+    colors = [color for _, color in SCORE_COLOR_THRESHOLDS] + [SCORE_COLOR_DEFAULT]
+    level_styles = "\n".join(
+        f".manager-table td.score-{level} {{ background-color: {color}; }}"
+        for level, color in enumerate(colors)
+    )
+
+    rows = (
+        '<tr><td>' + filtered_df['name'].astype(str).map(html.escape)
+        + '</td><td>' + filtered_df['department'].astype(str).map(html.escape) + '</td>'
+    )
+    for column in SCORE_COLUMN_LABELS:
+        scores = filtered_df[column].astype(float)
+        levels = pd.Series(get_score_levels(scores), index=filtered_df.index).astype(str)
+        rows = rows + '<td class="score-' + levels + '">' + scores.map('{:.1f}'.format) + '</td>'
+    rows = rows + '</tr>'
+
+    header = ''.join(
+        f'<th>{label}</th>'
+        for label in ['👤 名前', '🏢 部門'] + list(SCORE_COLUMN_LABELS.values())
+    )
+    return f"""
+    <style>
+    .manager-table-wrapper {{
+        max-height: 600px;
+        overflow-y: auto;
+        border: 1px solid #e6e6e6;
+        border-radius: 0.5rem;
+    }}
+    .manager-table {{
+        width: 100%;
+        border-collapse: collapse;
+        font-size: 0.85rem;
+    }}
+    .manager-table th {{
+        position: sticky;
+        top: 0;
+        background-color: #f0f2f6;
+        padding: 0.4rem;
+        text-align: left;
+    }}
+    .manager-table td {{
+        padding: 0.3rem 0.4rem;
+        border-bottom: 1px solid #e6e6e6;
+    }}
+    .manager-table td[class^="score-"] {{
+        color: white;
+        font-weight: bold;
+        text-align: center;
+        text-shadow: 1px 1px 1px rgba(0,0,0,0.2);
+    }}
+    {level_styles}
+    </style>
+    <div class="manager-table-wrapper">
+        <table class="manager-table">
+            <thead><tr>{header}</tr></thead>
+            <tbody>{''.join(rows.tolist())}</tbody>
+        </table>
+    </div>
+    """
+
+def _open_selected_manager():
+    """テーブル表示で選択されたマネージャーの詳細ページへの遷移を予約"""
+    manager_id = st.session_state.get("manager_table_selection")
+    if manager_id is not None:
+        st.session_state.selected_manager = manager_id
+        st.session_state.open_manager_detail = True
+        st.session_state.manager_table_selection = None
+
+def _render_manager_table(filtered_df, stats_label="", weights=None):
+    """マネージャー一覧を高密度のテーブルで表示"""
+    # 部門別の統計（評価のないマネージャーを除いて一括集計）
+    departments = (
+        summarize_scores(filtered_df, weights)
+        .department_frame(include_unevaluated=True)
+        .set_index('department')
+        .sort_index()
+    )
+    department_stats = pd.DataFrame({
+        f'{stats_label}マネージャー数': departments['total_managers'],
+        '評価あり': departments['manager_count'],
+        '平均評価': departments['overall_avg'],
+        '中央値': departments['overall_median'],
+        '25パーセンタイル': departments['overall_p25'],
+        '75パーセンタイル': departments['overall_p75']
+    })
+    score_format = st.column_config.NumberColumn(format="%.1f/5.0")
+    st.dataframe(
+        department_stats,
+        use_container_width=True,
+        column_config={
+            column: score_format
+            for column in ['平均評価', '中央値', '25パーセンタイル', '75パーセンタイル']
+        }
+    )
+
+    st.html(_build_manager_table_html(filtered_df))
+
+    # 詳細ページへの移動
+    labels = dict(zip(filtered_df['id'], filtered_df['name'] + '（' + filtered_df['department'] + '）'))
+    st.selectbox(
+        "👉 詳細を表示するマネージャー",
+        options=list(labels),
+        format_func=labels.get,
+        index=None,
+        placeholder="マネージャーを選択してください",
+        key="manager_table_selection",
+        on_change=_open_selected_manager
+    )
+    if st.session_state.pop("open_manager_detail", False):
+        st.switch_page("pages/3_Manager_Detail.py")
+
+def display_manager_list(managers_df):
+    """マネージャー一覧を構造化されたリストで表示（フィルタリング機能付き）"""
+    if managers_df.empty:
+        st.warning("マネージャーデータが見つかりません")
+        return
+
+    name_filter, department_filter, sort_column, sort_order = _render_filter_controls(
+        sorted(managers_df["department"].unique().tolist())
+    )
+    view_mode = _render_view_mode()
+
+    # フィルタリングとソートの適用
+    filtered_df = managers_df.copy()
+
+    # 名前フィルター
+    if name_filter:
+        filtered_df = filtered_df[filtered_df["name"].str.contains(name_filter, case=False, na=False)]
+
+    # 部門フィルター
+    if department_filter != "全て":
+        filtered_df = filtered_df[filtered_df["department"] == department_filter]
+
+    # ソート
+    try:
+        filtered_df = filtered_df.sort_values(by=sort_column, ascending=sort_order)
+    except Exception as e:
+        st.error(f"ソート処理中にエラーが発生しました: {str(e)}")
+        filtered_df = filtered_df.sort_values(by='name', ascending=True)
+
+    # フィルター後のデータ件数表示
+    st.markdown(f"**表示件数**: {len(filtered_df)}件")
+    
+    if filtered_df.empty:
+        st.info("条件に一致するマネージャーが見つかりません")
+        return
+
+    if view_mode == "table":
+        _render_manager_table(filtered_df)
+    else:
+        _render_manager_rows(filtered_df)
+
+def display_paginated_manager_list(db, page_size=50, table_page_size=1000):
+    """マネージャー一覧をページ単位で表示（絞り込み・並び替え・ページングはDB側で実行）"""
+    name_filter, department_filter, sort_column, sort_order = _render_filter_controls(
+        db.get_departments()
+    )
+    view_mode = _render_view_mode()
+    if view_mode == "table":
+        page_size = table_page_size
+
+    # 条件が変わったら1ページ目に戻す
+    # cursor_stack には表示中までの各ページの開始カーソルを保持する（1ページ目は None）
+    signature = (name_filter, department_filter, sort_column, sort_order, page_size)
+    if st.session_state.get('manager_page_signature') != signature:
+        st.session_state.manager_page_signature = signature
+        st.session_state.manager_cursor_stack = [None]
+    cursor_stack = st.session_state.manager_cursor_stack
+
+    try:
+        page = db.get_managers_page(
+            name_filter=name_filter.strip() or None,
+            department=None if department_filter == "全て" else department_filter,
+            sort_column=sort_column,
+            ascending=sort_order,
+            page_size=page_size,
+            after=cursor_stack[-1]
+        )
+    except Exception as e:
+        st.error(f"マネージャー一覧の取得中にエラーが発生しました: {str(e)}")
+        return
+
+    managers_df = page['managers']
+    page_number = len(cursor_stack)
+    start = (page_number - 1) * page_size
+    st.markdown(
+        f"**表示件数**: {page['total']}件中 {start + 1 if len(managers_df) else 0}〜{start + len(managers_df)}件"
+    )
+
+    if managers_df.empty:
+        st.info("条件に一致するマネージャーが見つかりません")
+        return
+
+    if view_mode == "table":
+        _render_manager_table(managers_df, stats_label="このページの", weights=db.scoring.weights())
+    else:
+        _render_manager_rows(managers_df, stats_label="このページの", weights=db.scoring.weights())
+
+    # ページ移動
+    nav_col1, nav_col2, nav_col3 = st.columns([1, 2, 1])
+    with nav_col1:
+        st.button(
+            "⬅️ 前へ",
+            disabled=page_number == 1,
+            use_container_width=True,
+            key="manager_page_prev",
+            on_click=cursor_stack.pop
+        )
+    with nav_col2:
+        total_pages = max(1, -(-page['total'] // page_size))
+        st.markdown(
+            f"<div style='text-align: center'>{page_number} / {total_pages} ページ</div>",
+            unsafe_allow_html=True
+        )
+    with nav_col3:
+        st.button(
+            "次へ ➡️",
+            disabled=page['next_cursor'] is None,
+            use_container_width=True,
+            key="manager_page_next",
+            on_click=cursor_stack.append,
+            args=(page['next_cursor'],)
+        )
+
+def display_score_details(scores, custom_metrics: dict = None):
+    """スコアの詳細表示（カラーコード付き）
+
+    custom_metrics にはカスタム指標の列名と指標名の対応を指定する（スコアがある指標のみ表示）。
+    """
     metrics = {
         'コミュニケーション・フィードバック': scores['communication_score'],
         'サポート・エンパワーメント': scores['support_score'],
@@ -245,6 +486,9 @@ def display_score_details(scores):
         '問題解決力': scores['problem_solving_score'],
         '戦略・成長支援': scores['strategy_score']
     }
+    for column, name in (custom_metrics or {}).items():
+        if column in scores and pd.notna(scores[column]):
+            metrics[name] = scores[column]
     
     for metric, score in metrics.items():
         color = get_score_color(score)
@@ -259,7 +503,7 @@ def display_score_details(scores):
                 text-shadow: 1px 1px 1px rgba(0,0,0,0.2);
             ">
                 <div style="font-size: 0.9rem;">{metric}</div>
-                <div style="font-size: 1.2rem; font-weight: bold;">{score:.1f}/5.0</div>
+                <div style="font-size: 1.2rem; font-weight: bold;">{"-" if pd.isna(score) else f"{score:.1f}/5.0"}</div>
             </div>
             """,
             unsafe_allow_html=True
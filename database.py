@@ -1,30 +1,172 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool
+from db_engine import get_engine, get_pool_stats
+from rollups import SCORE_DIMENSIONS, apply_evaluation_rollups, apply_rollups, rebuild_rollups
 from models import Base, AIModelConfig, CacheConfig
+from query_cache import cached_query, invalidate, query_cache
+from scoring import ScoringEngine, score_columns_sql
+from score_store import ScoreStore, core_scores_insert_sql, insert_metric_scores
+from trends import DEFAULT_RESOLUTION, TREND_MAX_POINTS, TrendStore
+from instrumentation import instrument_methods
+from analytics_snapshot import (
+    ANALYTICS_BACKEND, ANALYTICS_BACKENDS, SNAPSHOT_DIR, SnapshotStore, export_snapshot, first_month_of_window,
+    metric_cube_frame, percentile_columns_sql
+)
+from growth_analytics import GrowthAnalytics
+from manager_profile import manager_growth_sql, manager_profile_sql, profile_frames
+from partitions import ensure_month_partitions
+from sample_data import SampleDataConfig, generate_sample_dataset
 import pandas as pd
+import io
 import logging
 import os
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Union
 
+# 一括取り込みの既定バッチサイズ（行数）
+IMPORT_BATCH_SIZE = 5000
+
+# 一括取り込みで使用する evaluations の列（この順でCOPYする）
+IMPORT_COLUMNS = ['manager_id', 'evaluation_date'] + list(SCORE_DIMENSIONS.values())
+
+# 直近6ヶ月の平均スコア付きのマネージャー一覧
+# 期間のうち完全に含まれる月は月次ロールアップから、期間の開始月のみ評価明細から集計する
+MANAGER_SCORES_QUERY = """
+    WITH score_buckets AS (
+        SELECT 
+            r.manager_id,
+            r.communication_sum, r.communication_count,
+            r.support_sum, r.support_count,
+            r.goal_management_sum, r.goal_management_count,
+            r.leadership_sum, r.leadership_count,
+            r.problem_solving_sum, r.problem_solving_count,
+            r.strategy_sum, r.strategy_count
+        FROM manager_score_rollups r
+        WHERE r.month > DATE_TRUNC('month', NOW() - INTERVAL '6 months')
+        UNION ALL
+        SELECT 
+            e.manager_id,
+            COALESCE(SUM(e.communication_score), 0), COUNT(e.communication_score),
+            COALESCE(SUM(e.support_score), 0), COUNT(e.support_score),
+            COALESCE(SUM(e.goal_management_score), 0), COUNT(e.goal_management_score),
+            COALESCE(SUM(e.leadership_score), 0), COUNT(e.leadership_score),
+            COALESCE(SUM(e.problem_solving_score), 0), COUNT(e.problem_solving_score),
+            COALESCE(SUM(e.strategy_score), 0), COUNT(e.strategy_score)
+        FROM evaluations e
+        WHERE e.evaluation_date >= NOW() - INTERVAL '6 months'
+          AND e.evaluation_date < DATE_TRUNC('month', NOW() - INTERVAL '6 months') + INTERVAL '1 month'
+        GROUP BY e.manager_id
+    ),
+    latest_scores AS (
+        SELECT 
+            manager_id,
+            SUM(communication_sum) / NULLIF(SUM(communication_count), 0) as avg_communication,
+            SUM(support_sum) / NULLIF(SUM(support_count), 0) as avg_support,
+            SUM(goal_management_sum) / NULLIF(SUM(goal_management_count), 0) as avg_goal,
+            SUM(leadership_sum) / NULLIF(SUM(leadership_count), 0) as avg_leadership,
+            SUM(problem_solving_sum) / NULLIF(SUM(problem_solving_count), 0) as avg_problem,
+            SUM(strategy_sum) / NULLIF(SUM(strategy_count), 0) as avg_strategy
+        FROM score_buckets
+        GROUP BY manager_id
+    )
+    SELECT 
+        m.id,
+        m.name,
+        m.department,
+        COALESCE(ls.avg_communication, 0) as avg_communication,
+        COALESCE(ls.avg_support, 0) as avg_support,
+        COALESCE(ls.avg_goal, 0) as avg_goal,
+        COALESCE(ls.avg_leadership, 0) as avg_leadership,
+        COALESCE(ls.avg_problem, 0) as avg_problem,
+        COALESCE(ls.avg_strategy, 0) as avg_strategy
+    FROM managers m
+    LEFT JOIN latest_scores ls ON m.id = ls.manager_id
+    {where}
+"""
+
+# サーバー側での並び替えに使用できる列
+MANAGER_SORT_COLUMNS = [
+    'name', 'department', 'avg_communication', 'avg_support', 'avg_goal',
+    'avg_leadership', 'avg_problem', 'avg_strategy'
+]
+
+# マネージャー一覧の1ページあたりの既定件数
+MANAGER_PAGE_SIZE = 50
+
+def _csv_buffer(df: pd.DataFrame) -> io.IOBase:
+    """COPY に渡すヘッダーなしのCSV（pyarrow があれば pyarrow で書き出す）"""
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        buffer = io.StringIO()
+        df.to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+        return buffer
+
+    # 大量の行では to_csv の数値の書式化が取り込み時間の大半を占める
+    sink = pa.BufferOutputStream()
+    pa_csv.write_csv(
+        pa.Table.from_pandas(df, preserve_index=False),
+        sink,
+        pa_csv.WriteOptions(include_header=False, quoting_style='needed')
+    )
+    return io.BytesIO(sink.getvalue().to_pybytes())
+
+
+@instrument_methods
 class DatabaseManager:
-    def __init__(self):
-        """データベース接続の初期化"""
+    def __init__(self, analytics_backend: Optional[str] = None, snapshot_dir: Optional[str] = None):
+        """データベース接続の初期化
+
+        analytics_backend は部門統計・成長分析などの集計系の読み取りの参照先（'live' または 'snapshot'）。
+        省略時は環境変数 ANALYTICS_BACKEND の値。
+        """
+        self.analytics_backend = analytics_backend or ANALYTICS_BACKEND
+        if self.analytics_backend not in ANALYTICS_BACKENDS:
+            raise ValueError(f"無効な分析バックエンドです: {self.analytics_backend}")
         try:
-            self.engine = create_engine(
-                os.environ['DATABASE_URL'],
-                poolclass=QueuePool,
-                pool_size=5,
-                max_overflow=10
-            )
+            # プロセス共有の接続プールを再利用
+            self.engine = get_engine()
             Session = sessionmaker(bind=self.engine)
             self.Session = Session
-            logging.info("データベース接続プールを初期化しました")
+            # 総合スコアの計算に使用する評価指標の重み
+            self.scoring = ScoringEngine(self.engine)
+            # 全評価指標のスコア（evaluation_scores）の読み書き
+            self.scores = ScoreStore(self.engine)
+            # 評価推移の期間別集計
+            self.trends = TrendStore(self.engine, self.scores)
+            # 分析用の Parquet スナップショット（DuckDB）
+            self.snapshots = SnapshotStore(self.scoring, snapshot_dir or SNAPSHOT_DIR)
         except Exception as e:
             logging.error(f"データベース接続エラー: {str(e)}")
             raise
 
+    def get_pool_stats(self) -> dict:
+        """接続プールの統計情報を取得"""
+        return get_pool_stats()
+
+    def get_query_cache_stats(self) -> dict:
+        """クエリ結果キャッシュのヒット率などを取得"""
+        return query_cache.stats()
+
+    def get_snapshot_info(self) -> Optional[dict]:
+        """最新の分析用スナップショットの作成日時と件数（未作成の場合は None）"""
+        return self.snapshots.info()
+
+    def _analytics_snapshot(self) -> Optional[SnapshotStore]:
+        """集計系の読み取りに使用するスナップショット（ライブのデータベースで集計する場合は None）"""
+        if self.analytics_backend != 'snapshot':
+            return None
+        if not self.snapshots.available():
+            logging.warning("分析用スナップショットが利用できないため、ライブのデータベースで集計します")
+            return None
+        return self.snapshots
+
+    def growth_analytics(self) -> GrowthAnalytics:
+        """全マネージャーの成長分析（分析バックエンドに応じてスナップショットを参照）"""
+        return GrowthAnalytics(self.engine, snapshot=self._analytics_snapshot())
+
     def execute_query(self, query: str, params: dict = None) -> list:
         """SQLクエリを実行し、結果を辞書のリストとして返す"""
         try:
@@ -40,44 +182,108 @@ class DatabaseManager:
             logging.error(f"クエリ実行エラー: {str(e)}")
             raise
 
+    @cached_query(tags=['managers', 'evaluations'])
     def get_all_managers(self):
         """全マネージャーの情報を取得"""
         try:
-            query = """
-            WITH latest_scores AS (
-                SELECT 
-                    e.manager_id,
-                    AVG(e.communication_score) as avg_communication,
-                    AVG(e.support_score) as avg_support,
-                    AVG(e.goal_management_score) as avg_goal,
-                    AVG(e.leadership_score) as avg_leadership,
-                    AVG(e.problem_solving_score) as avg_problem,
-                    AVG(e.strategy_score) as avg_strategy
-                FROM evaluations e
-                WHERE e.evaluation_date >= NOW() - INTERVAL '6 months'
-                GROUP BY e.manager_id
-            )
-            SELECT 
-                m.id,
-                m.name,
-                m.department,
-                COALESCE(ls.avg_communication, 0) as avg_communication,
-                COALESCE(ls.avg_support, 0) as avg_support,
-                COALESCE(ls.avg_goal, 0) as avg_goal,
-                COALESCE(ls.avg_leadership, 0) as avg_leadership,
-                COALESCE(ls.avg_problem, 0) as avg_problem,
-                COALESCE(ls.avg_strategy, 0) as avg_strategy
-            FROM managers m
-            LEFT JOIN latest_scores ls ON m.id = ls.manager_id
-            ORDER BY m.name;
-            """
+            query = MANAGER_SCORES_QUERY.format(where="") + "ORDER BY m.name;"
             return pd.read_sql_query(query, self.engine)
         except Exception as e:
             logging.error(f"マネージャー情報の取得中にエラーが発生: {str(e)}")
             return pd.DataFrame()
 
-    def get_manager_details(self, manager_id: int):
-        """特定のマネージャーの詳細情報を取得"""
+    @cached_query(tags=['managers', 'evaluations'])
+    def get_managers_page(
+        self,
+        name_filter: str = None,
+        department: str = None,
+        sort_column: str = 'name',
+        ascending: bool = True,
+        page_size: int = MANAGER_PAGE_SIZE,
+        after: tuple = None
+    ) -> dict:
+        """絞り込み・並び替え済みのマネージャー一覧を1ページ分取得（キーセットページング）
+
+        after には前のページの next_cursor を指定する。
+        戻り値: {'managers': DataFrame, 'total': 条件に一致する件数, 'next_cursor': 次ページのカーソルまたはNone}
+        """
+        if sort_column not in MANAGER_SORT_COLUMNS:
+            raise ValueError(f"並び替えできない列です: {sort_column}")
+
+        conditions = []
+        params = {'limit': page_size + 1}
+        if name_filter:
+            # 部分一致検索（pg_trgm のインデックスを使用）
+            escaped = name_filter.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append("m.name ILIKE :name_pattern")
+            params['name_pattern'] = f"%{escaped}%"
+        if department:
+            conditions.append("m.department = :department")
+            params['department'] = department
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        keyset = ""
+        if after is not None:
+            comparison = '>' if ascending else '<'
+            value_type = 'TEXT' if sort_column in ('name', 'department') else 'NUMERIC'
+            keyset = f"WHERE (t.{sort_column}, t.id) {comparison} (CAST(:after_value AS {value_type}), :after_id)"
+            params['after_value'] = after[0]
+            params['after_id'] = int(after[1])
+        direction = 'ASC' if ascending else 'DESC'
+
+        # カーソル値を正確に比較できるよう、スコアは小数6桁に丸めて返す
+        query = f"""
+            SELECT * FROM (
+                SELECT
+                    s.id,
+                    s.name,
+                    s.department,
+                    ROUND(s.avg_communication::numeric, 6) as avg_communication,
+                    ROUND(s.avg_support::numeric, 6) as avg_support,
+                    ROUND(s.avg_goal::numeric, 6) as avg_goal,
+                    ROUND(s.avg_leadership::numeric, 6) as avg_leadership,
+                    ROUND(s.avg_problem::numeric, 6) as avg_problem,
+                    ROUND(s.avg_strategy::numeric, 6) as avg_strategy
+                FROM ({MANAGER_SCORES_QUERY.format(where=where)}) s
+            ) t
+            {keyset}
+            ORDER BY t.{sort_column} {direction}, t.id {direction}
+            LIMIT :limit;
+        """
+        count_query = f"SELECT COUNT(*) FROM managers m {where};"
+
+        try:
+            with self.engine.connect() as conn:
+                total = conn.execute(text(count_query), params).scalar()
+                result = conn.execute(text(query), params)
+                df = pd.DataFrame(result.fetchall(), columns=result.keys())
+            score_columns = [col for col in MANAGER_SORT_COLUMNS if col.startswith('avg_')]
+            df[score_columns] = df[score_columns].astype(float)
+
+            next_cursor = None
+            if len(df) > page_size:
+                df = df.iloc[:page_size]
+                last = df.iloc[-1]
+                next_cursor = (str(last[sort_column]), int(last['id']))
+            return {'managers': df, 'total': total, 'next_cursor': next_cursor}
+        except Exception as e:
+            logging.error(f"マネージャー一覧の取得中にエラーが発生: {str(e)}")
+            raise
+
+    @cached_query(tags=['managers'])
+    def get_departments(self) -> list:
+        """部門名の一覧を取得"""
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execute(text("SELECT DISTINCT department FROM managers ORDER BY department;"))
+                return [row[0] for row in result]
+        except Exception as e:
+            logging.error(f"部門一覧の取得中にエラーが発生: {str(e)}")
+            return []
+
+    @cached_query(tags=lambda manager_id, *args, **kwargs: [f'manager:{manager_id}', 'evaluation_metrics'])
+    def get_manager_details(self, manager_id: int, limit: Optional[int] = None):
+        """特定のマネージャーの詳細情報を取得（limit を指定した場合は新しい評価から limit 件）"""
         if not isinstance(manager_id, int):
             logging.error("無効なmanager_id形式です")
             return pd.DataFrame()
@@ -91,26 +297,22 @@ class DatabaseManager:
                     logging.error(f"指定されたID {manager_id} のマネージャーが見つかりません")
                     return pd.DataFrame()
 
-                # メインクエリの実行
-                query = """
+                # メインクエリの実行（evaluation_scores を横持ちにピボットし、カスタム指標の列も含める）
+                query = f"""
                 SELECT 
                     m.id,
                     m.name,
                     m.department,
-                    e.evaluation_date,
-                    e.communication_score,
-                    e.support_score,
-                    e.goal_management_score,
-                    e.leadership_score,
-                    e.problem_solving_score,
-                    e.strategy_score
+                    e.*
                 FROM managers m
-                LEFT JOIN evaluations e ON m.id = e.manager_id
+                LEFT JOIN ({self.scores.manager_scores_sql()}) e ON m.id = e.manager_id
                 WHERE m.id = :manager_id
-                ORDER BY e.evaluation_date DESC;
+                ORDER BY e.evaluation_date DESC, e.evaluation_id DESC
+                LIMIT :limit;
                 """
-                result = conn.execute(text(query), {'manager_id': manager_id})
+                result = conn.execute(text(query), {'manager_id': manager_id, 'limit': limit})
                 df = pd.DataFrame(result.fetchall(), columns=result.keys())
+                df = df.drop(columns=['evaluation_id', 'manager_id'])
                 
                 if df.empty:
                     logging.warning(f"マネージャー (ID: {manager_id}) の評価データが存在しません")
@@ -130,26 +332,87 @@ class DatabaseManager:
 
     def get_department_statistics(self):
         """部門別の統計情報を取得"""
+        snapshot = self._analytics_snapshot()
+        if snapshot is not None:
+            try:
+                return snapshot.department_statistics()
+            except Exception as e:
+                logging.error(f"スナップショットからの部門統計の取得中にエラーが発生: {str(e)}")
+                return pd.DataFrame()
+        return self._department_statistics()
+
+    @cached_query(tags=['evaluations', 'evaluation_metrics'])
+    def _department_statistics(self):
         try:
-            query = """
-            WITH recent_evals AS (
-                SELECT 
-                    m.department,
-                    AVG(e.communication_score) as avg_communication,
-                    AVG(e.support_score) as avg_support,
-                    AVG(e.goal_management_score) as avg_goal,
-                    AVG(e.leadership_score) as avg_leadership,
-                    AVG(e.problem_solving_score) as avg_problem,
-                    AVG(e.strategy_score) as avg_strategy,
-                    COUNT(DISTINCT m.id) as manager_count
-                FROM managers m
-                LEFT JOIN evaluations e ON m.id = e.manager_id
+            # 3ヶ月の期間のうち、完全に含まれる月は月次ロールアップから、
+            # 期間の開始月のみ評価明細から集計する
+            overall_avg = self.scoring.weighted_average_sql({
+                'communication': 'avg_communication',
+                'support': 'avg_support',
+                'goal_management': 'avg_goal',
+                'leadership': 'avg_leadership',
+                'problem_solving': 'avg_problem',
+                'strategy': 'avg_strategy'
+            })
+            query = f"""
+            WITH boundary_evals AS (
+                SELECT e.*, m.department
+                FROM evaluations e
+                JOIN managers m ON m.id = e.manager_id
                 WHERE e.evaluation_date >= NOW() - INTERVAL '3 months'
+                  AND e.evaluation_date < DATE_TRUNC('month', NOW() - INTERVAL '3 months') + INTERVAL '1 month'
+            ),
+            score_buckets AS (
+                SELECT 
+                    d.department,
+                    d.communication_sum, d.communication_count,
+                    d.support_sum, d.support_count,
+                    d.goal_management_sum, d.goal_management_count,
+                    d.leadership_sum, d.leadership_count,
+                    d.problem_solving_sum, d.problem_solving_count,
+                    d.strategy_sum, d.strategy_count
+                FROM department_score_rollups d
+                WHERE d.month > DATE_TRUNC('month', NOW() - INTERVAL '3 months')
+                UNION ALL
+                SELECT 
+                    department,
+                    COALESCE(SUM(communication_score), 0), COUNT(communication_score),
+                    COALESCE(SUM(support_score), 0), COUNT(support_score),
+                    COALESCE(SUM(goal_management_score), 0), COUNT(goal_management_score),
+                    COALESCE(SUM(leadership_score), 0), COUNT(leadership_score),
+                    COALESCE(SUM(problem_solving_score), 0), COUNT(problem_solving_score),
+                    COALESCE(SUM(strategy_score), 0), COUNT(strategy_score)
+                FROM boundary_evals
+                GROUP BY department
+            ),
+            active_managers AS (
+                SELECT m.department, COUNT(DISTINCT a.manager_id) as manager_count
+                FROM (
+                    SELECT r.manager_id
+                    FROM manager_score_rollups r
+                    WHERE r.month > DATE_TRUNC('month', NOW() - INTERVAL '3 months')
+                    UNION
+                    SELECT manager_id FROM boundary_evals
+                ) a
+                JOIN managers m ON m.id = a.manager_id
                 GROUP BY m.department
+            ),
+            recent_evals AS (
+                SELECT 
+                    sb.department,
+                    SUM(sb.communication_sum) / NULLIF(SUM(sb.communication_count), 0) as avg_communication,
+                    SUM(sb.support_sum) / NULLIF(SUM(sb.support_count), 0) as avg_support,
+                    SUM(sb.goal_management_sum) / NULLIF(SUM(sb.goal_management_count), 0) as avg_goal,
+                    SUM(sb.leadership_sum) / NULLIF(SUM(sb.leadership_count), 0) as avg_leadership,
+                    SUM(sb.problem_solving_sum) / NULLIF(SUM(sb.problem_solving_count), 0) as avg_problem,
+                    SUM(sb.strategy_sum) / NULLIF(SUM(sb.strategy_count), 0) as avg_strategy,
+                    am.manager_count
+                FROM score_buckets sb
+                JOIN active_managers am ON am.department = sb.department
+                GROUP BY sb.department, am.manager_count
             )
             SELECT *,
-                (avg_communication + avg_support + avg_goal + 
-                 avg_leadership + avg_problem + avg_strategy) / 6 as overall_avg
+                {overall_avg} as overall_avg
             FROM recent_evals
             ORDER BY overall_avg DESC;
             """
@@ -158,6 +421,116 @@ class DatabaseManager:
             logging.error(f"部門統計の取得中にエラーが発生: {str(e)}")
             return pd.DataFrame()
 
+    def get_department_metric_cube(self, months: int = 12) -> pd.DataFrame:
+        """部門 × 月 × 評価項目の平均スコアと評価件数（直近 months ヶ月、当月を含む）
+
+        戻り値の列: department, month, dimension, mean_score, evaluation_count
+        """
+        snapshot = self._analytics_snapshot()
+        try:
+            if snapshot is not None:
+                return snapshot.department_metric_cube(months)
+            return self._department_metric_cube(months)
+        except Exception as e:
+            logging.error(f"部門別の月次スコアの取得中にエラーが発生: {str(e)}")
+            return pd.DataFrame()
+
+    @cached_query(tags=['evaluations'])
+    def _department_metric_cube(self, months: int) -> pd.DataFrame:
+        columns = ', '.join(f"d.{dim}_sum, d.{dim}_count" for dim in SCORE_DIMENSIONS)
+        wide = pd.read_sql_query(
+            text(f"""
+                SELECT d.department, d.month, {columns}
+                FROM department_score_rollups d
+                WHERE d.month >= :first_month;
+            """),
+            self.engine,
+            params={'first_month': first_month_of_window(months)}
+        )
+        return metric_cube_frame(wide)
+
+    def get_score_percentiles(self, months: int = 3) -> pd.DataFrame:
+        """部門ごとのマネージャーの総合スコア（直近 months ヶ月の平均）の分布
+
+        戻り値の列: department, manager_count, mean_score, p10, p25, p50, p75, p90
+        """
+        snapshot = self._analytics_snapshot()
+        try:
+            if snapshot is not None:
+                return snapshot.score_percentiles(months)
+            return self._score_percentiles(months)
+        except Exception as e:
+            logging.error(f"スコア分布の取得中にエラーが発生: {str(e)}")
+            return pd.DataFrame()
+
+    @cached_query(tags=['managers', 'evaluations', 'evaluation_metrics'])
+    def _score_percentiles(self, months: int) -> pd.DataFrame:
+        # マネージャーごとの項目平均は月次ロールアップの合計値・件数から求める
+        overall = self.scoring.weighted_average_sql({
+            dim: f"SUM(r.{dim}_sum) / NULLIF(SUM(r.{dim}_count), 0)" for dim in SCORE_DIMENSIONS
+        })
+        query = f"""
+            WITH manager_scores AS (
+                SELECT r.manager_id, {overall}::float as overall_score
+                FROM manager_score_rollups r
+                WHERE r.month >= :first_month
+                GROUP BY r.manager_id
+            )
+            SELECT
+                m.department,
+                COUNT(*) as manager_count,
+                AVG(s.overall_score) as mean_score,
+                {percentile_columns_sql('s.overall_score')}
+            FROM manager_scores s
+            JOIN managers m ON m.id = s.manager_id
+            WHERE s.overall_score IS NOT NULL
+            GROUP BY m.department
+            ORDER BY p50 DESC;
+        """
+        return pd.read_sql_query(text(query), self.engine, params={'first_month': first_month_of_window(months)})
+
+    def export_analytics_snapshot(self) -> dict:
+        """managers・evaluations・ai_suggestion_history の分析用スナップショットを作成"""
+        try:
+            manifest = export_snapshot(self.engine, self.snapshots.directory)
+            invalidate('analytics_snapshot')
+            return manifest
+        except Exception as e:
+            logging.error(f"分析用スナップショットの作成エラー: {str(e)}")
+            raise
+
+    @cached_query(tags=['ai_suggestion_history'])
+    def get_suggestion_statistics(self) -> list:
+        """企業全体のAI提案の実装状況の統計を取得"""
+        return self.execute_query("""
+            SELECT 
+                COUNT(*) as total_suggestions,
+                SUM(CASE WHEN is_implemented THEN 1 ELSE 0 END) as implemented_count,
+                ROUND(AVG(CASE WHEN effectiveness_rating IS NOT NULL 
+                    THEN effectiveness_rating ELSE NULL END), 1) as avg_effectiveness
+            FROM ai_suggestion_history
+            WHERE manager_id IS NULL;
+        """)
+
+    @cached_query(tags=['ai_suggestion_history', 'managers'])
+    def get_recent_suggestions(self, limit: int = 5) -> list:
+        """最近のAI提案履歴を取得"""
+        return self.execute_query("""
+            SELECT 
+                sh.id,
+                COALESCE(m.name, '企業全体') as manager_name,
+                COALESCE(m.department, '-') as department,
+                sh.suggestion_text,
+                sh.created_at AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Tokyo' as created_at,
+                sh.is_implemented,
+                sh.effectiveness_rating
+            FROM ai_suggestion_history sh
+            LEFT JOIN managers m ON sh.manager_id = m.id
+            ORDER BY sh.created_at DESC
+            LIMIT :limit;
+        """, {'limit': limit})
+
+    @cached_query(tags=['evaluation_metrics'])
     def get_evaluation_metrics(self):
         """評価指標の一覧を取得"""
         try:
@@ -171,6 +544,25 @@ class DatabaseManager:
             logging.error(f"評価指標の取得中にエラーが発生: {str(e)}")
             return pd.DataFrame()
 
+    def get_custom_metric_columns(self) -> dict:
+        """get_manager_details に含まれるカスタム指標の列名と指標名の対応を取得"""
+        return self.scores.custom_metric_columns()
+
+    def get_metric_statistics(self, start_date=None):
+        """評価指標ごとの評価件数・平均スコアを取得"""
+        return self.scores.metric_statistics(start_date)
+
+    def get_manager_trend(
+        self,
+        manager_id: int,
+        resolution: str = DEFAULT_RESOLUTION,
+        start_date=None,
+        end_date=None,
+        max_points: Optional[int] = TREND_MAX_POINTS
+    ):
+        """評価指標ごとの期間別（週・月・四半期）の平均・最小・最大スコアを取得"""
+        return self.trends.manager_trend(manager_id, resolution, start_date, end_date, max_points)
+
     def add_manager(self, name: str, department: str) -> int:
         """新しいマネージャーを追加"""
         try:
@@ -185,16 +577,36 @@ class DatabaseManager:
                 )
                 manager_id = result.scalar()
                 conn.commit()
-                return manager_id
+            invalidate('managers')
+            return manager_id
         except Exception as e:
             logging.error(f"マネージャー追加エラー: {str(e)}")
             raise
 
-    def add_evaluation(self, manager_id: int, evaluation_date: datetime, scores: dict):
-        """評価スコアを追加"""
+    def add_evaluation(
+        self,
+        manager_id: int,
+        evaluation_date: datetime,
+        scores: dict,
+        metric_scores: Optional[Dict[int, float]] = None
+    ):
+        """評価スコアを追加（月次ロールアップも同一トランザクションで更新）
+
+        metric_scores には基本6項目以外の評価指標のスコアを指標IDをキーに指定する。
+        """
+        params = {
+            'manager_id': manager_id,
+            'evaluation_date': evaluation_date,
+            'communication': scores['communication'],
+            'support': scores['support'],
+            'goal_management': scores['goal_management'],
+            'leadership': scores['leadership'],
+            'problem_solving': scores['problem_solving'],
+            'strategy': scores['strategy']
+        }
         try:
             with self.engine.connect() as conn:
-                conn.execute(
+                evaluation_id = conn.execute(
                     text("""
                         INSERT INTO evaluations (
                             manager_id,
@@ -214,24 +626,153 @@ class DatabaseManager:
                             :leadership,
                             :problem_solving,
                             :strategy
-                        );
+                        )
+                        RETURNING id;
                     """),
-                    {
-                        'manager_id': manager_id,
-                        'evaluation_date': evaluation_date,
-                        'communication': scores['communication'],
-                        'support': scores['support'],
-                        'goal_management': scores['goal_management'],
-                        'leadership': scores['leadership'],
-                        'problem_solving': scores['problem_solving'],
-                        'strategy': scores['strategy']
-                    }
+                    params
+                ).scalar()
+                # 基本6項目とカスタム指標のスコアを evaluation_scores にも保存
+                conn.execute(
+                    text(core_scores_insert_sql("""
+                        SELECT * FROM evaluations
+                        WHERE id = :evaluation_id AND evaluation_date = CAST(:evaluation_date AS DATE)
+                    """)),
+                    {'evaluation_id': evaluation_id, 'evaluation_date': evaluation_date}
                 )
+                if metric_scores:
+                    insert_metric_scores(conn, evaluation_id, manager_id, evaluation_date, metric_scores)
+                apply_evaluation_rollups(conn, params)
                 conn.commit()
+            invalidate('evaluations', f'manager:{manager_id}')
         except Exception as e:
             logging.error(f"評価スコア追加エラー: {str(e)}")
             raise
 
+    def _prepare_evaluations_frame(self, evaluations) -> pd.DataFrame:
+        """一括取り込みの入力をDataFrameに変換し、ベクトル化して検証"""
+        if isinstance(evaluations, (str, os.PathLike)):
+            path = os.fspath(evaluations)
+            if path.lower().endswith('.parquet'):
+                df = pd.read_parquet(path)
+            else:
+                df = pd.read_csv(path)
+        elif isinstance(evaluations, pd.DataFrame):
+            df = evaluations
+        else:
+            df = pd.DataFrame(list(evaluations))
+
+        # add_evaluation と同じスコアキー（communication など）も受け付ける
+        df = df.rename(columns=SCORE_DIMENSIONS)
+        missing = [col for col in IMPORT_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"必須列が不足しています: {', '.join(missing)}")
+
+        df = df[IMPORT_COLUMNS].copy()
+        if df['manager_id'].isna().any():
+            raise ValueError("manager_id が空の行があります")
+        df['manager_id'] = df['manager_id'].astype('int64')
+        df['evaluation_date'] = pd.to_datetime(df['evaluation_date']).dt.date
+
+        score_columns = list(SCORE_DIMENSIONS.values())
+        scores = df[score_columns].apply(pd.to_numeric, errors='coerce')
+        invalid = (scores.isna() & df[score_columns].notna()) | (scores < 1) | (scores > 5)
+        invalid_rows = invalid.any(axis=1)
+        if invalid_rows.any():
+            sample = ', '.join(str(idx) for idx in df.index[invalid_rows][:10])
+            raise ValueError(
+                f"スコアが1〜5の範囲外の行が{int(invalid_rows.sum())}件あります（行: {sample}）"
+            )
+        df[score_columns] = scores
+        return df
+
+    def _load_evaluations(
+        self,
+        conn,
+        df: pd.DataFrame,
+        batch_size: int = IMPORT_BATCH_SIZE,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> int:
+        """検証済みの評価データを一時テーブル経由で取り込み、ロールアップを更新"""
+        score_columns = ',\n                '.join(
+            f"{col} NUMERIC(3,1)" for col in SCORE_DIMENSIONS.values()
+        )
+        conn.execute(text(f"""
+            CREATE TEMP TABLE evaluations_import (
+                manager_id INTEGER NOT NULL,
+                evaluation_date DATE NOT NULL,
+                {score_columns}
+            ) ON COMMIT DROP;
+        """))
+
+        total = len(df)
+        cursor = conn.connection.dbapi_connection.cursor()
+        use_copy = hasattr(cursor, 'copy_expert')
+        copy_sql = f"COPY evaluations_import ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+        insert_sql = text(f"""
+            INSERT INTO evaluations_import ({', '.join(IMPORT_COLUMNS)})
+            VALUES ({', '.join(':' + col for col in IMPORT_COLUMNS)});
+        """)
+
+        try:
+            for start in range(0, total, batch_size):
+                batch = df.iloc[start:start + batch_size]
+                if use_copy:
+                    cursor.copy_expert(copy_sql, _csv_buffer(batch))
+                else:
+                    # COPY非対応のドライバではバッチ単位のexecutemanyで取り込む
+                    records = batch.astype(object).where(batch.notna(), None).to_dict('records')
+                    conn.execute(insert_sql, records)
+                if progress_callback:
+                    progress_callback(min(start + batch_size, total), total)
+        finally:
+            cursor.close()
+
+        # 追加した評価の基本6項目を evaluation_scores にも同じ文で保存
+        conn.execute(text(f"""
+            WITH inserted AS (
+                INSERT INTO evaluations ({', '.join(IMPORT_COLUMNS)})
+                SELECT {', '.join(IMPORT_COLUMNS)} FROM evaluations_import
+                RETURNING *
+            )
+            {core_scores_insert_sql("SELECT * FROM inserted")};
+        """))
+        apply_rollups(conn, "SELECT * FROM evaluations_import")
+        return total
+
+    def add_evaluations_bulk(
+        self,
+        evaluations: Union[pd.DataFrame, Iterable[dict], str, os.PathLike],
+        batch_size: int = IMPORT_BATCH_SIZE,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> int:
+        """評価スコアを単一トランザクションで一括追加し、追加件数を返す
+
+        evaluations には DataFrame、辞書のイテラブル、CSV/Parquetファイルのパスを指定できる。
+        progress_callback は (取り込み済み件数, 総件数) で呼び出される。
+        """
+        df = self._prepare_evaluations_frame(evaluations)
+        if df.empty:
+            return 0
+
+        try:
+            with self.engine.begin() as conn:
+                count = self._load_evaluations(conn, df, batch_size, progress_callback)
+            invalidate('evaluations', *(f'manager:{manager_id}' for manager_id in df['manager_id'].unique()))
+            logging.info(f"{count}件の評価スコアを一括追加しました")
+            return count
+        except Exception as e:
+            logging.error(f"評価スコア一括追加エラー: {str(e)}")
+            raise
+
+    def import_evaluations(
+        self,
+        path: Union[str, os.PathLike],
+        batch_size: int = IMPORT_BATCH_SIZE,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> int:
+        """CSV/Parquetファイルから評価スコアを取り込む"""
+        return self.add_evaluations_bulk(path, batch_size, progress_callback)
+
     def add_evaluation_metric(self, name: str, description: str, category: str, weight: float):
         """評価指標を追加"""
         try:
@@ -249,44 +790,39 @@ class DatabaseManager:
                     }
                 )
                 conn.commit()
+            invalidate('evaluation_metrics')
         except Exception as e:
             logging.error(f"評価指標追加エラー: {str(e)}")
             raise
 
+    def rebuild_score_rollups(self):
+        """評価データから月次ロールアップを再構築"""
+        try:
+            with self.engine.begin() as conn:
+                rebuild_rollups(conn)
+            invalidate('evaluations')
+            logging.info("スコアロールアップを再構築しました")
+        except Exception as e:
+            logging.error(f"ロールアップ再構築エラー: {str(e)}")
+            raise
+
     def analyze_growth(self, manager_id: int):
-        """マネージャーの成長率を分析"""
+        """マネージャーの成長率を分析（月平均は評価指標の重みによる加重平均）"""
+        snapshot = self._analytics_snapshot()
+        if snapshot is not None:
+            try:
+                return snapshot.manager_growth(manager_id)
+            except Exception as e:
+                logging.error(f"スナップショットからの成長分析エラー: {str(e)}")
+                return pd.DataFrame()
+        return self._analyze_growth(manager_id)
+
+    @cached_query(tags=lambda manager_id: [f'manager:{manager_id}', 'evaluation_metrics'])
+    def _analyze_growth(self, manager_id: int):
         try:
-            query = """
-            WITH monthly_scores AS (
-                SELECT 
-                    DATE_TRUNC('month', evaluation_date) as month,
-                    AVG((communication_score + support_score + goal_management_score + 
-                         leadership_score + problem_solving_score + strategy_score) / 6) as avg_score
-                FROM evaluations
-                WHERE manager_id = :manager_id
-                GROUP BY DATE_TRUNC('month', evaluation_date)
-                ORDER BY month
-            ),
-            score_changes AS (
-                SELECT 
-                    month,
-                    avg_score,
-                    LAG(avg_score) OVER (ORDER BY month) as prev_score
-                FROM monthly_scores
-            )
-            SELECT 
-                month,
-                avg_score,
-                CASE 
-                    WHEN prev_score IS NOT NULL AND prev_score != 0
-                    THEN ((avg_score - prev_score) / prev_score * 100)
-                    ELSE 0 
-                END as growth_rate
-            FROM score_changes
-            ORDER BY month DESC;
-            """
+            query = manager_growth_sql(self.scoring.weighted_average_sql(score_columns_sql('e'))) + ";"
             return pd.read_sql_query(
-                query,
+                text(query),
                 self.engine,
                 params={'manager_id': manager_id}
             )
@@ -294,52 +830,76 @@ class DatabaseManager:
             logging.error(f"成長分析エラー: {str(e)}")
             return pd.DataFrame()
 
-    def generate_sample_data(self):
-        """サンプルデータを生成"""
+    @cached_query(tags=lambda manager_id: [
+        f'manager:{manager_id}', 'evaluation_metrics', 'ai_suggestion_history', 'ai_prompt_templates'
+    ])
+    def get_manager_profile(self, manager_id: int) -> dict:
+        """マネージャー詳細ページ・評価レポート用のデータ一式を1回のクエリで取得
+
+        戻り値のキー:
+            details: 最新の評価（get_manager_details(manager_id, limit=1) と同じ列）
+            growth: 月次の成長率（analyze_growth と同じ列、常にライブのデータベースで集計）
+            suggestions / prompt_templates: AI提案履歴 / 有効なプロンプトテンプレート
+            custom_metrics: details に含まれるカスタム指標の列名と指標名の対応
+        マネージャーが存在しない場合やエラー時は空の辞書を返す。
+        """
+        if not isinstance(manager_id, int):
+            logging.error("無効なmanager_id形式です")
+            return {}
+
         try:
-            # 会社規模の設定（100-500人）
-            company_size = random.randint(100, 500)
-            manager_count = int(company_size * random.uniform(0.1, 0.2))  # 10-20%をマネージャーに
-            
-            # 部門の設定
-            departments = ['営業', '開発', '人事', '経営企画', 'カスタマーサクセス', 'マーケティング']
-            
-            # マネージャーデータの生成
-            for i in range(manager_count):
-                # マネージャー基本情報
-                manager_name = f"サンプルマネージャー{i+1}"
-                department = random.choice(departments)
-                
-                # マネージャーの追加
-                manager_id = self.add_manager(manager_name, department)
-                
-                # 過去6ヶ月分の評価データを生成
-                for months_ago in range(6):
-                    eval_date = datetime.now() - timedelta(days=30*months_ago)
-                    
-                    # 基本スコアを設定（3.0-4.5の範囲）
-                    base_score = random.uniform(3.0, 4.5)
-                    
-                    # 各項目のスコアを生成（基本スコアの±0.5の範囲）
-                    self.add_evaluation(
-                        manager_id=manager_id,
-                        evaluation_date=eval_date,
-                        scores={
-                            'communication': max(1, min(5, base_score + random.uniform(-0.5, 0.5))),
-                            'support': max(1, min(5, base_score + random.uniform(-0.5, 0.5))),
-                            'goal_management': max(1, min(5, base_score + random.uniform(-0.5, 0.5))),
-                            'leadership': max(1, min(5, base_score + random.uniform(-0.5, 0.5))),
-                            'problem_solving': max(1, min(5, base_score + random.uniform(-0.5, 0.5))),
-                            'strategy': max(1, min(5, base_score + random.uniform(-0.5, 0.5)))
-                        }
-                    )
-            
+            # ai_advisor は streamlit を読み込むため、使用時に読み込む
+            from ai_advisor import ensure_ai_schema
+            ensure_ai_schema(self.engine)
+            query = manager_profile_sql(
+                self.scores.manager_scores_sql(),
+                self.scoring.weighted_average_sql(score_columns_sql('e'))
+            )
+            with self.engine.connect() as conn:
+                row = conn.execute(text(query), {'manager_id': manager_id}).one()
+            if row.details is None:
+                logging.error(f"指定されたID {manager_id} のマネージャーが見つかりません")
+                return {}
+            return {
+                **profile_frames(row),
+                'custom_metrics': self.scores.custom_metric_columns()
+            }
+        except Exception as e:
+            logging.error(f"マネージャー詳細の取得中にエラーが発生: {str(e)}")
+            return {}
+
+    def generate_sample_data(self, config: Optional[SampleDataConfig] = None) -> bool:
+        """サンプルデータを生成（config を省略した場合は50人・6ヶ月分）
+
+        マネージャーは既存のデータに追加され、評価は COPY 経由で一括で取り込まれる。
+        """
+        config = config or SampleDataConfig()
+        try:
+            managers, evaluations = generate_sample_dataset(config)
+            if evaluations.empty:
+                raise ValueError("評価期間に評価がありません")
+
+            with self.engine.begin() as conn:
+                # マネージャーを一括追加し、生成時の id を採番された id に置き換える
+                result = conn.execute(
+                    text("""
+                        INSERT INTO managers (name, department)
+                        SELECT * FROM UNNEST(CAST(:names AS VARCHAR[]), CAST(:departments AS VARCHAR[]))
+                        RETURNING id, name;
+                    """),
+                    {'names': managers['name'].tolist(), 'departments': managers['department'].tolist()}
+                )
+                inserted_ids = {name: manager_id for manager_id, name in result}
+                manager_ids = pd.Series(managers['name'].map(inserted_ids).to_numpy(), index=managers['id'])
+                evaluations['manager_id'] = manager_ids.reindex(evaluations['manager_id']).to_numpy()
+
+                # 過去の月は DEFAULT パーティションに入らないよう、先にパーティションを作成する
+                dates = evaluations['evaluation_date']
+                ensure_month_partitions(conn, dates.min().date(), dates.max().date())
+                self._load_evaluations(conn, self._prepare_evaluations_frame(evaluations), batch_size=50_000)
+            invalidate('managers', 'evaluations')
+            logging.info(f"サンプルデータを生成しました（マネージャー{len(managers)}人、評価{len(evaluations)}件）")
             return True
         except Exception as e:
             logging.error(f"サンプルデータ生成エラー: {str(e)}")
             return False
-
-    def __del__(self):
-        """デストラクタ：エンジンの破棄"""
-        if hasattr(self, 'engine'):
-            self.engine.dispose()
\ No newline at end of file
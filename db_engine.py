@@ -0,0 +1,143 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+from instrumentation import instrument_engine, metrics, start_metrics_server
+
+# プール設定（環境変数で上書き可能）
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+_engines = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """チェックアウト待ち時間を計測するQueuePool"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            stats = getattr(self, '_wait_stats', None)
+            if stats is not None:
+                elapsed = time.perf_counter() - start
+                metrics.observe('db_pool_wait_seconds', elapsed)
+                with _lock:
+                    stats['wait_count'] += 1
+                    stats['wait_total_seconds'] += elapsed
+                    stats['wait_max_seconds'] = max(stats['wait_max_seconds'], elapsed)
+
+
+def _new_stats() -> dict:
+    return {
+        'checkouts': 0,
+        'checkins': 0,
+        'connects': 0,
+        'invalidations': 0,
+        'wait_count': 0,
+        'wait_total_seconds': 0.0,
+        'wait_max_seconds': 0.0,
+    }
+
+
+def _attach_listeners(engine, stats: dict):
+    """プールイベントから統計情報を収集"""
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_conn, conn_record):
+        with _lock:
+            stats['connects'] += 1
+
+    @event.listens_for(engine, 'checkout')
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+        with _lock:
+            stats['checkouts'] += 1
+
+    @event.listens_for(engine, 'checkin')
+    def _on_checkin(dbapi_conn, conn_record):
+        with _lock:
+            stats['checkins'] += 1
+
+    @event.listens_for(engine, 'invalidate')
+    def _on_invalidate(dbapi_conn, conn_record, exception):
+        with _lock:
+            stats['invalidations'] += 1
+
+
+def get_engine(url: str = None):
+    """DATABASE_URLごとにプロセス共有のエンジンを返す"""
+    url = url or os.environ['DATABASE_URL']
+    engine = _engines.get(url)
+    if engine is not None:
+        return engine
+
+    with _lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = create_engine(
+                url,
+                poolclass=InstrumentedQueuePool,
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+                pool_timeout=POOL_TIMEOUT,
+                pool_recycle=POOL_RECYCLE,
+                pool_pre_ping=POOL_PRE_PING
+            )
+            stats = _new_stats()
+            engine.pool._wait_stats = stats
+            _attach_listeners(engine, stats)
+            # クエリの実行時間・行数の計測とスロークエリログ
+            instrument_engine(engine)
+            start_metrics_server()
+            _engines[url] = engine
+            _stats[url] = stats
+            logging.info("共有データベース接続プールを初期化しました")
+    return engine
+
+
+def get_pool_stats() -> dict:
+    """全エンジンのプール統計情報を取得（監視用）"""
+    result = {}
+    for url, engine in list(_engines.items()):
+        pool = engine.pool
+        with _lock:
+            stats = dict(_stats[url])
+        stats.update({
+            'pool_size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow(),
+            'max_overflow': MAX_OVERFLOW,
+            'wait_avg_seconds': (
+                stats['wait_total_seconds'] / stats['wait_count']
+                if stats['wait_count'] else 0.0
+            ),
+        })
+        result[engine.url.render_as_string(hide_password=True)] = stats
+    return result
+
+
+def dispose_engines():
+    """全エンジンの接続プールを破棄（シャットダウン用）"""
+    with _lock:
+        engines = list(_engines.values())
+        _engines.clear()
+        _stats.clear()
+    for engine in engines:
+        try:
+            engine.dispose()
+        except Exception as e:
+            logging.error(f"接続プールの破棄中にエラーが発生: {str(e)}")
+    if engines:
+        logging.info("共有データベース接続プールを破棄しました")
+
+
+atexit.register(dispose_engines)
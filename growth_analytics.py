@@ -0,0 +1,196 @@
+"""全マネージャーの成長分析
+
+月次スコアロールアップを1回のクエリで読み込み、マネージャー × 評価項目 × 月の
+行列として NumPy で一括計算する（月平均、前月比、移動平均の成長率、回帰による傾き）。
+結果はクエリキャッシュに保持し、評価の追加時に無効化される。
+"""
+from typing import Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from instrumentation import instrument_methods
+from query_cache import cached_query
+from rollups import SCORE_DIMENSIONS
+from scoring import ScoringEngine, weighted_overall
+
+# 評価項目（'overall' は6項目の評価指標の重みによる加重平均）
+GROWTH_DIMENSIONS = list(SCORE_DIMENSIONS) + ['overall']
+
+# ランキングに使用できる指標
+GROWTH_METRICS = ['slope', 'rolling_growth', 'mom_growth', 'latest_score']
+
+DEFAULT_MONTHS = 12
+DEFAULT_WINDOW = 3
+
+
+def _month_index(months: pd.Series) -> np.ndarray:
+    months = pd.to_datetime(months)
+    return (months.dt.year * 12 + months.dt.month - 1).to_numpy()
+
+
+def _percent_change(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (current - previous) / previous * 100
+    return np.where(previous > 0, change, np.nan)
+
+
+def compute_growth(rollups: pd.DataFrame, window: int = DEFAULT_WINDOW, weights: Optional[dict] = None) -> tuple:
+    """月次ロールアップ（manager_id, month, 各項目の *_sum / *_count）から成長指標を計算
+
+    戻り値: (月次の指標 DataFrame, マネージャー × 項目ごとの集計 DataFrame)
+    評価のない月は NaN とし、前月比・移動平均はその月をまたいで計算しない。
+    """
+    if rollups.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    manager_ids, manager_pos = np.unique(rollups['manager_id'].to_numpy(), return_inverse=True)
+    month_idx = _month_index(rollups['month'])
+    first_month = month_idx.min()
+    month_pos = month_idx - first_month
+    n_months = month_pos.max() + 1
+
+    # (項目, マネージャー, 月) の合計値と件数の行列（総合の行は後で計算）
+    n_dims = len(GROWTH_DIMENSIONS)
+    sums = np.zeros((n_dims, len(manager_ids), n_months))
+    counts = np.zeros((n_dims, len(manager_ids), n_months))
+    for d, dim in enumerate(SCORE_DIMENSIONS):
+        sums[d, manager_pos, month_pos] = rollups[f'{dim}_sum'].astype(float).to_numpy()
+        counts[d, manager_pos, month_pos] = rollups[f'{dim}_count'].astype(float).to_numpy()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    # 総合は各項目の月平均の加重平均
+    means[-1] = weighted_overall(np.moveaxis(means[:-1], 0, -1), weights)
+
+    # 前月比（%）
+    mom_growth = np.full_like(means, np.nan)
+    mom_growth[..., 1:] = _percent_change(means[..., 1:], means[..., :-1])
+
+    # 直近 window ヶ月の月平均の移動平均と、window ヶ月前の移動平均からの成長率（%）
+    valid = ~np.isnan(means)
+    filled = np.where(valid, means, 0.0)
+    csum = np.concatenate([np.zeros(means.shape[:-1] + (1,)), filled.cumsum(axis=-1)], axis=-1)
+    ccount = np.concatenate([np.zeros(means.shape[:-1] + (1,)), valid.cumsum(axis=-1)], axis=-1)
+    start = np.maximum(np.arange(n_months) - window + 1, 0)
+    window_sum = csum[..., 1:] - csum[..., start]
+    window_count = ccount[..., 1:] - ccount[..., start]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rolling_mean = np.where(window_count > 0, window_sum / window_count, np.nan)
+    rolling_growth = np.full_like(means, np.nan)
+    rolling_growth[..., window:] = _percent_change(rolling_mean[..., window:], rolling_mean[..., :-window])
+
+    # 最小二乗法による傾き（1ヶ月あたりのスコア変化）
+    x = np.arange(n_months, dtype=float)
+    observed = valid.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = np.where(valid, x, 0.0).sum(axis=-1) / observed
+        y_mean = filled.sum(axis=-1) / observed
+        dx = np.where(valid, x - x_mean[..., None], 0.0)
+        dy = np.where(valid, means - y_mean[..., None], 0.0)
+        slope = (dx * dy).sum(axis=-1) / (dx * dx).sum(axis=-1)
+    slope = np.where(observed >= 2, slope, np.nan)
+
+    # 月次の指標（評価のある月のみ）
+    d_idx, m_idx, t_idx = np.nonzero(valid)
+    month_values = first_month + t_idx
+    monthly = pd.DataFrame({
+        'manager_id': manager_ids[m_idx],
+        'dimension': np.array(GROWTH_DIMENSIONS)[d_idx],
+        'month': pd.to_datetime({'year': month_values // 12, 'month': month_values % 12 + 1, 'day': 1}),
+        'mean_score': means[d_idx, m_idx, t_idx],
+        'mom_growth': mom_growth[d_idx, m_idx, t_idx],
+        'rolling_mean': rolling_mean[d_idx, m_idx, t_idx],
+        'rolling_growth': rolling_growth[d_idx, m_idx, t_idx]
+    })
+
+    # マネージャー × 項目ごとの最新値と傾き
+    last_pos = np.where(valid, np.arange(n_months), -1).max(axis=-1)
+    d_all, m_all = np.nonzero(last_pos >= 0)
+    t_last = last_pos[d_all, m_all]
+    last_values = first_month + t_last
+    summary = pd.DataFrame({
+        'manager_id': manager_ids[m_all],
+        'dimension': np.array(GROWTH_DIMENSIONS)[d_all],
+        'latest_month': pd.to_datetime({'year': last_values // 12, 'month': last_values % 12 + 1, 'day': 1}),
+        'latest_score': means[d_all, m_all, t_last],
+        'mom_growth': mom_growth[d_all, m_all, t_last],
+        'rolling_growth': rolling_growth[d_all, m_all, t_last],
+        'slope': slope[d_all, m_all],
+        'months_observed': observed[d_all, m_all]
+    })
+
+    # 項目ごとの順位（1が最上位）とパーセンタイル（0〜100）
+    grouped = summary.groupby('dimension')
+    for metric in GROWTH_METRICS:
+        summary[f'{metric}_rank'] = grouped[metric].rank(ascending=False, method='min')
+        summary[f'{metric}_percentile'] = grouped[metric].rank(pct=True) * 100
+    return monthly, summary
+
+
+@instrument_methods
+class GrowthAnalytics:
+    def __init__(self, engine, snapshot=None):
+        self.engine = engine
+        # 分析用スナップショット（SnapshotStore）を指定した場合はデータベースの代わりに参照する
+        self.snapshot = snapshot
+
+    @property
+    def cache_scope(self):
+        return self.snapshot.cache_scope if self.snapshot is not None else None
+
+    def load_rollups(self, months: int = DEFAULT_MONTHS) -> pd.DataFrame:
+        """直近 months ヶ月（当月を含む）の月次ロールアップを取得"""
+        if self.snapshot is not None:
+            return self.snapshot.manager_rollups(months)
+        columns = ', '.join(f"r.{dim}_sum, r.{dim}_count" for dim in SCORE_DIMENSIONS)
+        query = f"""
+            SELECT r.manager_id, r.month, {columns}
+            FROM manager_score_rollups r
+            WHERE r.month >= DATE_TRUNC('month', CURRENT_DATE) - make_interval(months => :months - 1)
+            ORDER BY r.manager_id, r.month;
+        """
+        return pd.read_sql_query(text(query), self.engine, params={'months': months})
+
+    def _load_managers(self) -> pd.DataFrame:
+        if self.snapshot is not None:
+            return self.snapshot.managers()
+        return pd.read_sql_query(text("SELECT id as manager_id, name, department FROM managers;"), self.engine)
+
+    @cached_query(tags=['managers', 'evaluations', 'evaluation_metrics'])
+    def growth_summary(self, months: int = DEFAULT_MONTHS, window: int = DEFAULT_WINDOW) -> pd.DataFrame:
+        """全マネージャー × 評価項目の最新スコア・前月比・移動平均の成長率・傾き・順位"""
+        weights = ScoringEngine(self.engine).weights()
+        _, summary = compute_growth(self.load_rollups(months), window, weights)
+        if summary.empty:
+            return summary
+        return summary.merge(self._load_managers(), on='manager_id', how='inner')
+
+    @cached_query(tags=['managers', 'evaluations', 'evaluation_metrics'])
+    def monthly_growth(self, months: int = DEFAULT_MONTHS, window: int = DEFAULT_WINDOW) -> pd.DataFrame:
+        """全マネージャー × 評価項目 × 月の平均スコアと成長率"""
+        weights = ScoringEngine(self.engine).weights()
+        monthly, _ = compute_growth(self.load_rollups(months), window, weights)
+        return monthly
+
+    def leaderboard(
+        self,
+        dimension: str = 'overall',
+        metric: str = 'slope',
+        top: int = 10,
+        department: Optional[str] = None,
+        months: int = DEFAULT_MONTHS,
+        window: int = DEFAULT_WINDOW
+    ) -> pd.DataFrame:
+        """指定した項目・指標で成長の大きいマネージャーの上位を取得"""
+        if dimension not in GROWTH_DIMENSIONS:
+            raise ValueError(f"無効な評価項目です: {dimension}")
+        if metric not in GROWTH_METRICS:
+            raise ValueError(f"無効な指標です: {metric}")
+
+        summary = self.growth_summary(months, window)
+        if summary.empty:
+            return summary
+        rows = summary[summary['dimension'] == dimension]
+        if department is not None:
+            rows = rows[rows['department'] == department]
+        return rows.dropna(subset=[metric]).nlargest(top, metric).reset_index(drop=True)
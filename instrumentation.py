@@ -0,0 +1,377 @@
+"""クエリとAI呼び出しの計測
+
+SQLAlchemy のエンジンイベントから全クエリの実行時間と行数を、OpenAI クライアントの
+chat.completions.create のラップから応答時間とトークン使用量を記録し、プロセス内のヒストグラムに集計する。
+閾値を超えたクエリは構造化（JSON 1行）のスロークエリログに出力する。
+
+集計結果は get_metrics_snapshot() で取得でき、Prometheus のテキスト形式（render_prometheus）でも出力できる。
+METRICS_PORT を設定した場合は、そのポートの /metrics で Prometheus 形式の値を返す。
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import event
+
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '500'))
+SLOW_QUERY_LOG_FILE = os.getenv('SLOW_QUERY_LOG_FILE')
+METRICS_PORT = os.getenv('METRICS_PORT')
+
+# ヒストグラムのバケット（上限値）
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+# スロークエリログに出力するSQLの最大文字数と、管理画面用に保持する件数
+SLOW_QUERY_STATEMENT_CHARS = 2000
+RECENT_SLOW_QUERIES = 100
+
+slow_query_logger = logging.getLogger('managerscore.slow_query')
+if SLOW_QUERY_LOG_FILE:
+    _handler = logging.FileHandler(SLOW_QUERY_LOG_FILE, encoding='utf-8')
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    slow_query_logger.addHandler(_handler)
+
+# 実行中の処理名（DatabaseManager.get_manager_details など）。クエリのラベルに使用する
+current_operation = contextvars.ContextVar('current_operation', default='other')
+
+
+class Histogram:
+    """累積バケット・合計・件数・最大値を保持するヒストグラム（Prometheus の histogram と同じ形式）"""
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """バケット内の線形補間による分位点の推定値（histogram_quantile と同じ方法）"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for i, upper in enumerate(self.buckets):
+            if cumulative + self.counts[i] >= rank:
+                if self.counts[i] == 0:
+                    return upper
+                return min(lower + (upper - lower) * (rank - cumulative) / self.counts[i], self.max)
+            cumulative += self.counts[i]
+            lower = upper
+        return self.max
+
+
+class MetricsRegistry:
+    """名前とラベルごとのヒストグラムとカウンター（スレッドセーフ）"""
+
+    def __init__(self):
+        self.histograms: Dict[tuple, Histogram] = {}
+        self.counters: Dict[tuple, float] = {}
+        self.descriptions: Dict[str, str] = {}
+        self.slow_queries = deque(maxlen=RECENT_SLOW_QUERIES)
+        self.lock = threading.Lock()
+
+    def describe(self, name: str, description: str):
+        self.descriptions[name] = description
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = SECONDS_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.slow_queries.clear()
+
+
+metrics = MetricsRegistry()
+metrics.describe('db_query_duration_seconds', 'SQLクエリの実行時間')
+metrics.describe('db_query_rows', 'SQLクエリの取得・更新行数')
+metrics.describe('db_query_errors_total', 'エラーになったSQLクエリの件数')
+metrics.describe('db_slow_queries_total', 'スロークエリの件数')
+metrics.describe('db_pool_wait_seconds', '接続プールのチェックアウト待ち時間')
+metrics.describe('operation_duration_seconds', 'DatabaseManager などのメソッドの実行時間')
+metrics.describe('openai_request_duration_seconds', 'OpenAI API の応答時間（ストリーミングは完了まで）')
+metrics.describe('openai_time_to_first_token_seconds', 'ストリーミング応答の最初のトークンまでの時間')
+metrics.describe('openai_request_errors_total', 'エラーになった OpenAI API 呼び出しの件数')
+metrics.describe('openai_tokens_total', 'OpenAI API のトークン使用量')
+metrics.describe('app_startup_seconds', 'トップページの読み込み時間（インポート・初回描画・全体）')
+
+
+def _statement_verb(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else 'UNKNOWN'
+
+
+def _log_slow_query(elapsed: float, rows: int, statement: str, operation: str):
+    entry = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'operation': operation,
+        'duration_ms': round(elapsed * 1000, 1),
+        'rows': rows,
+        'statement': ' '.join(statement.split())[:SLOW_QUERY_STATEMENT_CHARS]
+    }
+    metrics.inc('db_slow_queries_total', operation=operation)
+    with metrics.lock:
+        metrics.slow_queries.append(entry)
+    slow_query_logger.warning(json.dumps(entry, ensure_ascii=False))
+
+
+def instrument_engine(engine):
+    """エンジンの全クエリの実行時間・行数を記録し、閾値を超えたクエリをスロークエリログに出力"""
+    if not INSTRUMENTATION_ENABLED:
+        return engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+        operation = current_operation.get()
+        rows = max(cursor.rowcount, 0)
+        metrics.observe('db_query_duration_seconds', elapsed, operation=operation, verb=_statement_verb(statement))
+        metrics.observe('db_query_rows', rows, ROWS_BUCKETS, operation=operation)
+        if elapsed * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+            _log_slow_query(elapsed, rows, statement, operation)
+
+    @event.listens_for(engine, 'handle_error')
+    def _handle_error(context):
+        starts = context.connection.info.get('query_start_time') if context.connection is not None else None
+        if starts:
+            starts.pop()
+        metrics.inc('db_query_errors_total', operation=current_operation.get())
+
+    return engine
+
+
+def timed(name: str):
+    """メソッドの実行時間を記録し、実行中のクエリに処理名のラベルを付けるデコレーター"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = current_operation.set(name)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe('operation_duration_seconds', time.perf_counter() - started, operation=name)
+                current_operation.reset(token)
+        return wrapper
+    return decorator
+
+
+def instrument_methods(cls):
+    """クラスの公開メソッド（ジェネレーターを除く）に timed を適用するクラスデコレーター"""
+    if not INSTRUMENTATION_ENABLED:
+        return cls
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith('_') or not inspect.isfunction(value) or inspect.isgeneratorfunction(value):
+            continue
+        setattr(cls, attr, timed(f"{cls.__name__}.{attr}")(value))
+    return cls
+
+
+def _record_usage(model: str, usage):
+    if usage is None:
+        return
+    metrics.inc('openai_tokens_total', usage.prompt_tokens or 0, model=model, type='prompt')
+    metrics.inc('openai_tokens_total', usage.completion_tokens or 0, model=model, type='completion')
+
+
+def _timed_stream(stream, model: str, started: float):
+    """ストリーミング応答を順に返しながら、最初のトークンまでの時間・完了までの時間・使用量を記録"""
+    first_token = True
+    try:
+        for chunk in stream:
+            if first_token and chunk.choices and chunk.choices[0].delta.content:
+                metrics.observe('openai_time_to_first_token_seconds', time.perf_counter() - started, model=model)
+                first_token = False
+            # stream_options={'include_usage': True} の場合、最後のチャンクに使用量が含まれる
+            _record_usage(model, getattr(chunk, 'usage', None))
+            yield chunk
+    except Exception:
+        metrics.inc('openai_request_errors_total', model=model)
+        raise
+    finally:
+        metrics.observe('openai_request_duration_seconds', time.perf_counter() - started, model=model, stream='true')
+
+
+def instrument_openai(client):
+    """OpenAI クライアントの chat.completions.create を応答時間・トークン使用量を記録する関数に置き換える
+
+    with_options で作成したクライアントには引き継がれないため、作成したクライアントごとに呼び出す。
+    """
+    if not INSTRUMENTATION_ENABLED:
+        return client
+    completions = client.chat.completions
+    create = completions.create
+
+    @functools.wraps(create)
+    def timed_create(*args, **kwargs):
+        model = kwargs.get('model', 'unknown')
+        started = time.perf_counter()
+        try:
+            response = create(*args, **kwargs)
+        except Exception:
+            metrics.inc('openai_request_errors_total', model=model)
+            metrics.observe(
+                'openai_request_duration_seconds', time.perf_counter() - started,
+                model=model, stream=str(bool(kwargs.get('stream'))).lower()
+            )
+            raise
+        if kwargs.get('stream'):
+            return _timed_stream(response, model, started)
+        metrics.observe('openai_request_duration_seconds', time.perf_counter() - started, model=model, stream='false')
+        _record_usage(model, getattr(response, 'usage', None))
+        return response
+
+    completions.create = timed_create
+    return client
+
+
+def record_startup(imports_seconds: float, first_paint_seconds: Optional[float], total_seconds: float, new_session: bool):
+    """トップページの読み込み時間を記録（新しいセッションの最初の実行はログにも出力）
+
+    インポートの時間はプロセスで最初の実行のみ意味を持つ（以降はモジュールが読み込み済みのため）。
+    """
+    session = 'new' if new_session else 'rerun'
+    phases = {'imports': imports_seconds, 'first_paint': first_paint_seconds, 'total': total_seconds}
+    for phase, seconds in phases.items():
+        if seconds is not None:
+            metrics.observe('app_startup_seconds', seconds, phase=phase, session=session)
+    if new_session:
+        first_paint = '-' if first_paint_seconds is None else f"{first_paint_seconds:.2f}"
+        logging.info(
+            f"起動時間: インポート {imports_seconds:.2f}秒 / 初回描画 {first_paint}秒 / 全体 {total_seconds:.2f}秒"
+        )
+
+
+def get_metrics_snapshot() -> dict:
+    """ヒストグラム（件数・合計・平均・p50/p95/p99・最大）とカウンターの一覧と直近のスロークエリ"""
+    with metrics.lock:
+        histograms = [
+            {
+                'name': name,
+                **dict(labels),
+                'count': h.count,
+                'sum': h.sum,
+                'avg': h.sum / h.count if h.count else 0.0,
+                'p50': h.quantile(0.5),
+                'p95': h.quantile(0.95),
+                'p99': h.quantile(0.99),
+                'max': h.max
+            }
+            for (name, labels), h in metrics.histograms.items()
+        ]
+        counters = [
+            {'name': name, **dict(labels), 'value': value}
+            for (name, labels), value in metrics.counters.items()
+        ]
+        slow_queries = list(metrics.slow_queries)
+    return {'histograms': histograms, 'counters': counters, 'slow_queries': slow_queries[::-1]}
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in pairs) + '}'
+
+
+def render_prometheus() -> str:
+    """Prometheus のテキスト形式で全メトリクスを出力"""
+    lines = []
+    with metrics.lock:
+        histograms = sorted(metrics.histograms.items())
+        counters = sorted(metrics.counters.items())
+        for kind, items in (('histogram', histograms), ('counter', counters)):
+            seen = set()
+            for (name, labels), value in items:
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {metrics.descriptions.get(name, name)}")
+                    lines.append(f"# TYPE {name} {kind}")
+                if kind == 'counter':
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for upper, count in zip(value.buckets, value.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', repr(float(upper))))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {value.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server_lock = threading.Lock()
+_server = None
+
+
+def start_metrics_server(port: Optional[int] = None):
+    """/metrics を返すHTTPサーバーをデーモンスレッドで起動（プロセスにつき1回）"""
+    global _server
+    port = port if port is not None else (int(METRICS_PORT) if METRICS_PORT else None)
+    if port is None:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(('0.0.0.0', port), _MetricsHandler)
+            except OSError as e:
+                logging.error(f"メトリクスサーバーの起動に失敗: {str(e)}")
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            logging.info(f"メトリクスを http://0.0.0.0:{port}/metrics で公開しました")
+    return _server
@@ -1,12 +1,17 @@
+import time
+# 起動時間の計測（インポート・初回描画・スクリプト全体）
+_script_started = time.perf_counter()
 import os
 from datetime import datetime, timedelta
 import streamlit as st
 import pandas as pd
 from database import DatabaseManager
 from visualization import create_radar_chart, create_department_comparison_chart
-from components import display_manager_list
+from components import display_paginated_manager_list
 from ai_advisor import AIAdvisor
-from utils import calculate_company_average
+from instrumentation import record_startup
+from utils import summarize_scores
+_imports_seconds = time.perf_counter() - _script_started
 
 # Page configuration
 st.set_page_config(
@@ -51,7 +56,12 @@ try:
     else:
         # 全体平均の表示
         st.subheader("📊 企業全体の評価サマリー")
-        company_avg = calculate_company_average(managers_df)
+        # 企業全体・部門別の統計（評価のないマネージャーを除いて一括集計）
+        score_summary = summarize_scores(managers_df, db.scoring.weights())
+        company_avg = score_summary.company()
+        st.caption(
+            f"評価のあるマネージャー {score_summary.evaluated_count()}名 / 全{score_summary.manager_count()}名の平均"
+        )
         
         col1, col2 = st.columns([2, 1])
         
@@ -65,7 +75,8 @@ try:
         
         with col2:
             for metric, score in company_avg.items():
-                st.metric(label=metric.title(), value=f"{score:.1f}/5.0")
+                st.metric(label=metric.title(), value="-" if pd.isna(score) else f"{score:.1f}/5.0")
+        st.session_state.first_paint_seconds = time.perf_counter() - _script_started
         
         # AI提案と履歴
         if st.session_state.ai_advisor:
@@ -78,42 +89,34 @@ try:
                 with col1:
                     st.markdown("### 🤖 AI改善提案")
                     if st.button("✨ 新しい提案を生成", type="primary"):
-                        with st.spinner("AI提案を生成中..."):
-                            ai_suggestions = st.session_state.ai_advisor.generate_improvement_suggestions(company_avg)
-                            if ai_suggestions:
-                                st.markdown("### 最新の提案")
-                                st.write(ai_suggestions)
-                                # 提案を保存
-                                if ai_suggestions and isinstance(ai_suggestions, str):
-                                    try:
-                                        suggestion_id = st.session_state.ai_advisor.save_suggestion(
-                                            manager_id=None,  # 企業全体の提案
-                                            suggestion_text=ai_suggestions
-                                        )
-                                        if suggestion_id:
-                                            st.success("新しい提案が生成され、履歴に保存されました")
-                                        else:
-                                            st.warning("提案は生成されましたが、保存に失敗しました")
-                                    except ValueError as ve:
-                                        st.error(f"提案の保存中にエラーが発生しました: {str(ve)}")
-                                    except Exception as e:
-                                        st.error(f"予期せぬエラーが発生しました: {str(e)}")
-                                else:
-                                    st.error("有効な提案が生成されませんでした")
+                        st.markdown("### 最新の提案")
+                        # 受信したトークンから順に表示し、全文を受け取った後に保存する
+                        ai_suggestions = st.write_stream(
+                            st.session_state.ai_advisor.stream_improvement_suggestions(company_avg)
+                        )
+                        if ai_suggestions:
+                            # 提案の全文を受信できた場合のみ保存（エラー・制限のメッセージや途中までの応答は保存しない）
+                            if st.session_state.ai_advisor.last_stream_completed and isinstance(ai_suggestions, str):
+                                try:
+                                    suggestion_id = st.session_state.ai_advisor.save_suggestion(
+                                        manager_id=None,  # 企業全体の提案
+                                        suggestion_text=ai_suggestions
+                                    )
+                                    if suggestion_id:
+                                        st.success("新しい提案が生成され、履歴に保存されました")
+                                    else:
+                                        st.warning("提案は生成されましたが、保存に失敗しました")
+                                except ValueError as ve:
+                                    st.error(f"提案の保存中にエラーが発生しました: {str(ve)}")
+                                except Exception as e:
+                                    st.error(f"予期せぬエラーが発生しました: {str(e)}")
+                            else:
+                                st.error("有効な提案が生成されませんでした")
                 
                 with col2:
                     # AI提案の実装状況の統計
                     try:
-                        stats_query = """
-                            SELECT 
-                                COUNT(*) as total_suggestions,
-                                SUM(CASE WHEN is_implemented THEN 1 ELSE 0 END) as implemented_count,
-                                ROUND(AVG(CASE WHEN effectiveness_rating IS NOT NULL 
-                                    THEN effectiveness_rating ELSE NULL END), 1) as avg_effectiveness
-                            FROM ai_suggestion_history
-                            WHERE manager_id IS NULL;
-                        """
-                        suggestion_stats = db.execute_query(stats_query)
+                        suggestion_stats = db.get_suggestion_statistics()
                         if suggestion_stats and len(suggestion_stats) > 0:
                             stats = suggestion_stats[0]
                             st.metric("総提案数", stats['total_suggestions'])
@@ -128,20 +131,7 @@ try:
                 # AI提案履歴の表示
                 try:
                     st.markdown("### 📋 最近の提案履歴")
-                    recent_suggestions = db.execute_query("""
-                        SELECT 
-                            sh.id,
-                            COALESCE(m.name, '企業全体') as manager_name,
-                            COALESCE(m.department, '-') as department,
-                            sh.suggestion_text,
-                            sh.created_at AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Tokyo' as created_at,
-                            sh.is_implemented,
-                            sh.effectiveness_rating
-                        FROM ai_suggestion_history sh
-                        LEFT JOIN managers m ON sh.manager_id = m.id
-                        ORDER BY sh.created_at DESC
-                        LIMIT 5;
-                    """)
+                    recent_suggestions = db.get_recent_suggestions(limit=5)
                     
                     if recent_suggestions:
                         for suggestion in recent_suggestions:
@@ -156,6 +146,33 @@ try:
                 except Exception as e:
                     st.error(f"AI提案履歴の表示中にエラーが発生しました: {str(e)}")
 
+                # 部門単位の一括提案生成
+                with st.expander("📦 部門単位で提案を一括生成"):
+                    batch_department = st.selectbox(
+                        "対象部門",
+                        options=["全て"] + sorted(managers_df["department"].unique().tolist()),
+                        key="batch_department"
+                    )
+                    if st.button("一括生成を開始", key="batch_generate"):
+                        progress_bar = st.progress(0.0, text="AI提案を一括生成中...")
+                        batch_results = st.session_state.ai_advisor.generate_batch_suggestions(
+                            department=None if batch_department == "全て" else batch_department,
+                            progress_callback=lambda done, total: progress_bar.progress(
+                                done / total, text=f"AI提案を一括生成中... ({done}/{total})"
+                            )
+                        )
+                        progress_bar.empty()
+                        if batch_results.empty:
+                            st.info("評価データのあるマネージャーが見つかりません")
+                        else:
+                            status_counts = batch_results['status'].value_counts()
+                            st.success(
+                                f"{len(batch_results) - status_counts.get('error', 0)}件の提案を保存しました"
+                                f"（新規生成: {status_counts.get('generated', 0)}件, キャッシュ: {status_counts.get('cached', 0)}件）"
+                            )
+                            if status_counts.get('error', 0):
+                                st.warning(f"{status_counts['error']}件の提案生成に失敗しました")
+
             except Exception as e:
                 st.warning("AI提案の生成中にエラーが発生しました")
 
@@ -163,16 +180,78 @@ try:
         
         # 部門別分析
         st.subheader("📈 部門別分析")
-        dept_data = db.get_department_statistics()
+        dept_data = score_summary.department_frame()
         if not dept_data.empty:
             dept_fig = create_department_comparison_chart(dept_data)
             st.plotly_chart(dept_fig, use_container_width=True)
 
         st.markdown("---")
+
+        # 成長ランキング
+        st.subheader("🚀 成長ランキング")
+        growth_dimensions = {
+            'overall': '総合',
+            'communication': 'コミュニケーション',
+            'support': 'サポート',
+            'goal_management': '目標管理',
+            'leadership': 'リーダーシップ',
+            'problem_solving': '問題解決力',
+            'strategy': '戦略'
+        }
+        growth_metrics = {
+            'slope': '傾き（直近12ヶ月の1ヶ月あたりの変化）',
+            'rolling_growth': '3ヶ月平均の成長率（前四半期比）',
+            'mom_growth': '前月比'
+        }
+        rank_col1, rank_col2 = st.columns(2)
+        with rank_col1:
+            growth_dimension = st.selectbox(
+                "評価項目",
+                options=list(growth_dimensions),
+                format_func=growth_dimensions.get,
+                key="growth_dimension"
+            )
+        with rank_col2:
+            growth_metric = st.selectbox(
+                "指標",
+                options=list(growth_metrics),
+                format_func=growth_metrics.get,
+                key="growth_metric"
+            )
+        leaderboard = db.growth_analytics().leaderboard(growth_dimension, growth_metric, top=10)
+        if leaderboard.empty:
+            st.info("成長分析に必要な評価データがありません")
+        else:
+            st.dataframe(
+                leaderboard[['name', 'department', 'latest_score', growth_metric, f'{growth_metric}_percentile']],
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'name': '名前',
+                    'department': '部門',
+                    'latest_score': st.column_config.NumberColumn('最新スコア', format="%.2f"),
+                    growth_metric: st.column_config.NumberColumn(
+                        growth_metrics[growth_metric],
+                        format="%.3f" if growth_metric == 'slope' else "%.1f%%"
+                    ),
+                    f'{growth_metric}_percentile': st.column_config.NumberColumn('パーセンタイル', format="%.0f")
+                }
+            )
+
+        st.markdown("---")
         
         # マネージャー一覧の表示
         st.subheader("👥 マネージャー一覧")
-        display_manager_list(managers_df)
+        display_paginated_manager_list(db)
 
 except Exception as e:
     st.error(f"データの表示中にエラーが発生しました: {str(e)}")
+
+# 新しいセッションの最初の実行か、同じセッションの再実行かを分けて記録する
+record_startup(
+    imports_seconds=_imports_seconds,
+    first_paint_seconds=st.session_state.pop('first_paint_seconds', None),
+    total_seconds=time.perf_counter() - _script_started,
+    new_session='startup_recorded' not in st.session_state
+)
+st.session_state.startup_recorded = True
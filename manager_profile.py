@@ -0,0 +1,147 @@
+"""マネージャー詳細ページ・評価レポート用のデータ一式
+
+最新の評価・月次の成長率・AI提案履歴・プロンプトテンプレートを1つのSQL文でまとめて取得する。
+各データセットはサーバー側で JSON 配列に集約し、1回の往復で受け取った後に DataFrame に戻す。
+1つの文で読むため、全データセットが同じ時点のスナップショットから読み取られる。
+"""
+from typing import Dict, List
+import pandas as pd
+
+# 成長率（月平均と前月比）の列
+GROWTH_COLUMNS = ['month', 'avg_score', 'growth_rate']
+
+# AI提案履歴の列（get_suggestion_history と同じ）
+SUGGESTION_COLUMNS = [
+    'id', 'suggestion_text', 'created_at', 'is_implemented',
+    'implementation_date', 'effectiveness_rating', 'feedback_text'
+]
+
+# プロンプトテンプレートの列（get_prompt_templates と同じ）
+PROMPT_TEMPLATE_COLUMNS = ['id', 'name', 'description', 'template_text']
+
+
+def manager_growth_sql(weighted_average: str, source: str = 'evaluations') -> str:
+    """:manager_id のマネージャーの月平均スコアと前月比の成長率（新しい月から順）を返すSQL
+
+    source は manager_id, evaluation_date と6項目のスコア列を持つテーブルまたはCTE、
+    weighted_average はその別名 e の列による重み付き平均の式。
+    """
+    return f"""
+            WITH monthly_scores AS (
+                SELECT
+                    DATE_TRUNC('month', e.evaluation_date) as month,
+                    AVG({weighted_average}) as avg_score
+                FROM {source} e
+                WHERE e.manager_id = :manager_id
+                GROUP BY DATE_TRUNC('month', e.evaluation_date)
+                ORDER BY month
+            ),
+            score_changes AS (
+                SELECT
+                    month,
+                    avg_score,
+                    LAG(avg_score) OVER (ORDER BY month) as prev_score
+                FROM monthly_scores
+            )
+            SELECT
+                month,
+                avg_score,
+                CASE
+                    WHEN prev_score IS NOT NULL AND prev_score != 0
+                    THEN ((avg_score - prev_score) / prev_score * 100)
+                    ELSE 0
+                END as growth_rate
+            FROM score_changes
+            ORDER BY month DESC
+    """
+
+
+SUGGESTION_HISTORY_SQL = """
+                SELECT
+                    id,
+                    suggestion_text,
+                    created_at AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Tokyo' as created_at,
+                    is_implemented,
+                    CASE
+                        WHEN implementation_date IS NOT NULL
+                        THEN implementation_date AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Tokyo'
+                        ELSE NULL
+                    END as implementation_date,
+                    effectiveness_rating,
+                    feedback_text
+                FROM ai_suggestion_history
+                WHERE manager_id = :manager_id
+                ORDER BY created_at DESC
+"""
+
+PROMPT_TEMPLATES_SQL = """
+            SELECT id, name, description, template_text
+            FROM ai_prompt_templates
+            WHERE is_active = true
+            ORDER BY name
+"""
+
+
+def manager_profile_sql(manager_scores: str, weighted_average: str) -> str:
+    """マネージャー詳細のデータ一式を1行（details, growth, suggestions, prompt_templates の JSON）で返すSQL
+
+    manager_scores は ScoreStore.manager_scores_sql() の横持ちの評価。成長率もこの評価から集計し、
+    月単位でパーティション分割された evaluations を参照しない（全パーティションの計画に時間がかかるため）。
+    マネージャーが存在しない場合、details は NULL。
+    """
+    return f"""
+        WITH manager_scores AS (
+            {manager_scores}
+        ),
+        latest AS (
+            SELECT
+                m.id,
+                m.name,
+                m.department,
+                e.*
+            FROM managers m
+            LEFT JOIN manager_scores e ON m.id = e.manager_id
+            WHERE m.id = :manager_id
+            ORDER BY e.evaluation_date DESC, e.evaluation_id DESC
+            LIMIT 1
+        )
+        SELECT
+            (SELECT row_to_json(l) FROM latest l) AS details,
+            (
+                SELECT COALESCE(json_agg(g ORDER BY g.month DESC), '[]')
+                FROM ({manager_growth_sql(weighted_average, 'manager_scores')}) g
+            ) AS growth,
+            (
+                SELECT COALESCE(json_agg(h ORDER BY h.created_at DESC), '[]')
+                FROM ({SUGGESTION_HISTORY_SQL}) h
+            ) AS suggestions,
+            (
+                SELECT COALESCE(json_agg(t ORDER BY t.name), '[]')
+                FROM ({PROMPT_TEMPLATES_SQL}) t
+            ) AS prompt_templates;
+    """
+
+
+def _frame(rows: List[dict], columns: List[str]) -> pd.DataFrame:
+    # 行がない場合も列を持つ DataFrame にする
+    return pd.DataFrame(rows, columns=columns)
+
+
+def profile_frames(row) -> Dict[str, pd.DataFrame]:
+    """manager_profile_sql の結果の行を DataFrame に戻す（列と型は個別の取得メソッドに合わせる）"""
+    details = pd.DataFrame([row.details]).drop(columns=['evaluation_id', 'manager_id'])
+    details['evaluation_date'] = pd.to_datetime(details['evaluation_date']).dt.date
+
+    growth = _frame(row.growth, GROWTH_COLUMNS)
+    growth['month'] = pd.to_datetime(growth['month'], utc=True)
+
+    suggestions = _frame(row.suggestions, SUGGESTION_COLUMNS)
+    for column in ('created_at', 'implementation_date'):
+        suggestions[column] = pd.to_datetime(suggestions[column])
+
+    return {
+        'details': details,
+        'growth': growth,
+        'suggestions': suggestions,
+        'prompt_templates': _frame(row.prompt_templates, PROMPT_TEMPLATE_COLUMNS)
+    }
@@ -0,0 +1,45 @@
+"""Add manager search indexes
+
+Revision ID: add_manager_search_indexes
+Revises: create_ai_suggestion_cache
+Create Date: 2024-12-09
+
+"""
+import logging
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_manager_search_indexes'
+down_revision = 'create_ai_suggestion_cache'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # 名前の部分一致検索（ILIKE '%...%'）用のトライグラムインデックス
+    # pg_trgm が利用できない環境ではスキップする（検索は順次走査になる）
+    bind = op.get_bind()
+    trgm_available = bind.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm');"
+    )).scalar()
+    if trgm_available:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_managers_name_trgm
+        ON managers USING gin (name gin_trgm_ops);
+        """)
+    else:
+        logging.warning("pg_trgm 拡張が利用できないため、名前検索用のインデックスを作成しません")
+    # 部門での絞り込みと名前順の並び替え用
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS ix_managers_department_name
+    ON managers (department, name, id);
+    """)
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS ix_managers_name_id
+    ON managers (name, id);
+    """)
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_managers_name_id;")
+    op.execute("DROP INDEX IF EXISTS ix_managers_department_name;")
+    op.execute("DROP INDEX IF EXISTS ix_managers_name_trgm;")
@@ -0,0 +1,34 @@
+"""Create AI prompt templates table and move AI table DDL out of the app
+
+Revision ID: create_ai_prompt_templates
+Revises: create_evaluation_scores
+Create Date: 2024-12-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'create_ai_prompt_templates'
+down_revision = 'create_evaluation_scores'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # AIAdvisor の初期化時に参照・作成していたテーブルをマイグレーションで作成する
+    op.execute("""
+    CREATE TABLE IF NOT EXISTS ai_prompt_templates (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        description TEXT,
+        template_text TEXT NOT NULL,
+        is_active BOOLEAN NOT NULL DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    # 企業全体の提案（manager_id が NULL）を保存できるよう、アプリ側で NOT NULL 付きで
+    # 作成されていた ai_suggestion_history の制約を外す
+    op.execute("ALTER TABLE ai_suggestion_history ALTER COLUMN manager_id DROP NOT NULL;")
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS ai_prompt_templates;")
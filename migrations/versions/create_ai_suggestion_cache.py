@@ -0,0 +1,39 @@
+"""Create AI suggestion cache table
+
+Revision ID: create_ai_suggestion_cache
+Revises: partition_evaluations
+Create Date: 2024-12-06
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'create_ai_suggestion_cache'
+down_revision = 'partition_evaluations'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.execute("""
+    CREATE TABLE IF NOT EXISTS ai_suggestion_cache (
+        cache_key VARCHAR(64) PRIMARY KEY,
+        suggestion_text TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        hit_count INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        last_accessed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+    );
+    """)
+    # LRU方式の削除と期限切れの削除に使用
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS ix_ai_suggestion_cache_last_accessed
+    ON ai_suggestion_cache (last_accessed_at DESC);
+    """)
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS ix_ai_suggestion_cache_expires
+    ON ai_suggestion_cache (expires_at);
+    """)
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS ai_suggestion_cache;")
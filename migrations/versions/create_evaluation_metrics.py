@@ -14,6 +14,8 @@ branch_labels = None
 depends_on = None
 
 def upgrade() -> None:
+    # create_tables で作成される暫定の（空の）テーブルを制約付きのテーブルに置き換える
+    op.execute("DROP TABLE IF EXISTS evaluation_metrics;")
     op.create_table(
         'evaluation_metrics',
         sa.Column('id', sa.Integer, primary_key=True),
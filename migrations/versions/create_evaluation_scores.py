@@ -0,0 +1,104 @@
+"""Create long-format evaluation scores table
+
+Revision ID: create_evaluation_scores
+Revises: add_manager_search_indexes
+Create Date: 2024-12-12
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'create_evaluation_scores'
+down_revision = 'add_manager_search_indexes'
+branch_labels = None
+depends_on = None
+
+# evaluations のスコア列に対応する基本指標（評価項目, 指標名の候補, 追加時の説明）
+CORE_METRICS = [
+    ('communication', ['コミュニケーション', 'コミュニケーション・フィードバック'],
+     'チームメンバーとの効果的なコミュニケーション能力と、適切なフィードバックの提供'),
+    ('support', ['サポート', 'サポート・エンパワーメント'],
+     'メンバーの自律を促し、必要な支援を提供する能力'),
+    ('goal_management', ['目標管理', '目標管理・成果達成'],
+     '適切な目標を設定し、チームを成果の達成に導く能力'),
+    ('leadership', ['リーダーシップ', 'リーダーシップ・意思決定'],
+     'チームを導き、メンバーの成長を支援する能力'),
+    ('problem_solving', ['問題解決力'],
+     '課題の特定と効果的な解決策の実施能力'),
+    ('strategy', ['戦略', '戦略・成長支援'],
+     '中長期の方向性を示し、チームと個人の成長を支援する能力'),
+]
+
+
+def upgrade() -> None:
+    # 基本指標と evaluations のスコア列の対応（カスタム指標は NULL）
+    op.execute("ALTER TABLE evaluation_metrics ADD COLUMN IF NOT EXISTS dimension VARCHAR(50);")
+    op.execute("""
+    ALTER TABLE evaluation_metrics
+    ADD CONSTRAINT evaluation_metrics_dimension_key UNIQUE (dimension);
+    """)
+
+    # 既存の同名の指標を対応付け、ない項目は基本指標として追加する
+    bind = op.get_bind()
+    for dimension, names, description in CORE_METRICS:
+        bind.execute(sa.text("""
+            UPDATE evaluation_metrics SET dimension = :dimension
+            WHERE id = (SELECT MIN(id) FROM evaluation_metrics WHERE name = ANY(:names));
+        """), {'dimension': dimension, 'names': names})
+        bind.execute(sa.text("""
+            INSERT INTO evaluation_metrics (name, description, category, weight, dimension)
+            SELECT :name, :description, 'core', 1.0, :dimension
+            WHERE NOT EXISTS (SELECT 1 FROM evaluation_metrics WHERE dimension = :dimension);
+        """), {'name': names[0], 'description': description, 'dimension': dimension})
+
+    # 評価 × 指標ごとのスコア（縦持ち）
+    # evaluations は月次パーティションで行がパーティション間を移動するため外部キーは設けず、
+    # 集計で evaluations を結合しなくて済むよう manager_id と evaluation_date を複製して持つ
+    op.execute("""
+    CREATE TABLE IF NOT EXISTS evaluation_scores (
+        evaluation_id INTEGER NOT NULL,
+        metric_id INTEGER NOT NULL REFERENCES evaluation_metrics(id),
+        manager_id INTEGER NOT NULL,
+        evaluation_date DATE NOT NULL,
+        score NUMERIC(3,1) NOT NULL CHECK (score BETWEEN 1 AND 5),
+        PRIMARY KEY (evaluation_id, metric_id)
+    );
+    """)
+
+    # 既存の評価の6項目を移行（インデックスは移行後に作成する）
+    op.execute("""
+    INSERT INTO evaluation_scores (evaluation_id, metric_id, manager_id, evaluation_date, score)
+    SELECT e.id, m.id, e.manager_id, e.evaluation_date, v.score
+    FROM evaluations e
+    CROSS JOIN LATERAL (VALUES
+        ('communication', e.communication_score),
+        ('support', e.support_score),
+        ('goal_management', e.goal_management_score),
+        ('leadership', e.leadership_score),
+        ('problem_solving', e.problem_solving_score),
+        ('strategy', e.strategy_score)
+    ) AS v(dimension, score)
+    JOIN evaluation_metrics m ON m.dimension = v.dimension
+    WHERE e.manager_id IS NOT NULL AND v.score IS NOT NULL
+    ON CONFLICT DO NOTHING;
+    """)
+
+    # 指標別の期間集計（index-only scan で評価明細を読まずに集計できるようスコアを含める）
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS ix_evaluation_scores_metric_date
+    ON evaluation_scores (metric_id, evaluation_date)
+    INCLUDE (manager_id, score);
+    """)
+    # マネージャー別の横持ちへのピボット（評価日順）
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS ix_evaluation_scores_manager_date
+    ON evaluation_scores (manager_id, evaluation_date, evaluation_id)
+    INCLUDE (metric_id, score);
+    """)
+    op.execute("ANALYZE evaluation_scores;")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS evaluation_scores;")
+    op.execute("ALTER TABLE evaluation_metrics DROP CONSTRAINT IF EXISTS evaluation_metrics_dimension_key;")
+    op.execute("ALTER TABLE evaluation_metrics DROP COLUMN IF EXISTS dimension;")
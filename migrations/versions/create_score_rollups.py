@@ -0,0 +1,115 @@
+"""Create score rollup tables
+
+Revision ID: create_score_rollups
+Revises: create_settings_tables
+Create Date: 2024-12-02
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'create_score_rollups'
+down_revision = 'create_settings_tables'
+branch_labels = None
+depends_on = None
+
+ROLLUP_COLUMNS = """
+        communication_sum NUMERIC NOT NULL DEFAULT 0,
+        communication_count INTEGER NOT NULL DEFAULT 0,
+        support_sum NUMERIC NOT NULL DEFAULT 0,
+        support_count INTEGER NOT NULL DEFAULT 0,
+        goal_management_sum NUMERIC NOT NULL DEFAULT 0,
+        goal_management_count INTEGER NOT NULL DEFAULT 0,
+        leadership_sum NUMERIC NOT NULL DEFAULT 0,
+        leadership_count INTEGER NOT NULL DEFAULT 0,
+        problem_solving_sum NUMERIC NOT NULL DEFAULT 0,
+        problem_solving_count INTEGER NOT NULL DEFAULT 0,
+        strategy_sum NUMERIC NOT NULL DEFAULT 0,
+        strategy_count INTEGER NOT NULL DEFAULT 0,
+        evaluation_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+"""
+
+def upgrade() -> None:
+    # マネージャー別の月次集計テーブル
+    op.execute(f"""
+    CREATE TABLE IF NOT EXISTS manager_score_rollups (
+        manager_id INTEGER NOT NULL REFERENCES managers(id),
+        month DATE NOT NULL,
+        {ROLLUP_COLUMNS},
+        PRIMARY KEY (manager_id, month)
+    );
+    """)
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS ix_manager_score_rollups_month
+    ON manager_score_rollups (month, manager_id);
+    """)
+
+    # 部門別の月次集計テーブル
+    op.execute(f"""
+    CREATE TABLE IF NOT EXISTS department_score_rollups (
+        department VARCHAR(50) NOT NULL,
+        month DATE NOT NULL,
+        {ROLLUP_COLUMNS},
+        PRIMARY KEY (department, month)
+    );
+    """)
+
+    # 既存データのバックフィル
+    op.execute("""
+    INSERT INTO manager_score_rollups (
+        manager_id, month,
+        communication_sum, communication_count,
+        support_sum, support_count,
+        goal_management_sum, goal_management_count,
+        leadership_sum, leadership_count,
+        problem_solving_sum, problem_solving_count,
+        strategy_sum, strategy_count,
+        evaluation_count
+    )
+    SELECT
+        manager_id,
+        DATE_TRUNC('month', evaluation_date)::date,
+        COALESCE(SUM(communication_score), 0), COUNT(communication_score),
+        COALESCE(SUM(support_score), 0), COUNT(support_score),
+        COALESCE(SUM(goal_management_score), 0), COUNT(goal_management_score),
+        COALESCE(SUM(leadership_score), 0), COUNT(leadership_score),
+        COALESCE(SUM(problem_solving_score), 0), COUNT(problem_solving_score),
+        COALESCE(SUM(strategy_score), 0), COUNT(strategy_score),
+        COUNT(*)
+    FROM evaluations
+    WHERE manager_id IS NOT NULL
+    GROUP BY manager_id, DATE_TRUNC('month', evaluation_date)
+    ON CONFLICT DO NOTHING;
+    """)
+
+    op.execute("""
+    INSERT INTO department_score_rollups (
+        department, month,
+        communication_sum, communication_count,
+        support_sum, support_count,
+        goal_management_sum, goal_management_count,
+        leadership_sum, leadership_count,
+        problem_solving_sum, problem_solving_count,
+        strategy_sum, strategy_count,
+        evaluation_count
+    )
+    SELECT
+        m.department,
+        r.month,
+        SUM(r.communication_sum), SUM(r.communication_count),
+        SUM(r.support_sum), SUM(r.support_count),
+        SUM(r.goal_management_sum), SUM(r.goal_management_count),
+        SUM(r.leadership_sum), SUM(r.leadership_count),
+        SUM(r.problem_solving_sum), SUM(r.problem_solving_count),
+        SUM(r.strategy_sum), SUM(r.strategy_count),
+        SUM(r.evaluation_count)
+    FROM manager_score_rollups r
+    JOIN managers m ON m.id = r.manager_id
+    GROUP BY m.department, r.month
+    ON CONFLICT DO NOTHING;
+    """)
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS department_score_rollups;")
+    op.execute("DROP TABLE IF EXISTS manager_score_rollups;")
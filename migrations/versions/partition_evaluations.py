@@ -0,0 +1,174 @@
+"""Add composite indexes and partition evaluations by month
+
+Revision ID: partition_evaluations
+Revises: create_score_rollups
+Create Date: 2024-12-04
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'partition_evaluations'
+down_revision = 'create_score_rollups'
+branch_labels = None
+depends_on = None
+
+# 現在月から何ヶ月先までパーティションを事前作成するか
+MONTHS_AHEAD = 12
+
+EVALUATION_COLUMNS = """
+    id, manager_id, evaluation_date,
+    communication_score, support_score, goal_management_score,
+    leadership_score, problem_solving_score, strategy_score,
+    created_at
+"""
+
+
+def _add_months(d: date, months: int) -> date:
+    total = d.year * 12 + d.month - 1 + months
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _create_month_partition(month_start: date):
+    month_end = _add_months(month_start, 1)
+    op.execute(f"""
+    CREATE TABLE IF NOT EXISTS evaluations_p{month_start:%Y_%m}
+    PARTITION OF evaluations_partitioned
+    FOR VALUES FROM ('{month_start:%Y-%m-%d}') TO ('{month_end:%Y-%m-%d}');
+    """)
+
+
+def upgrade() -> None:
+    # ai_suggestion_history はアプリ側で作成されるため、ここでも存在を保証する
+    op.execute("""
+    CREATE TABLE IF NOT EXISTS ai_suggestion_history (
+        id SERIAL PRIMARY KEY,
+        manager_id INTEGER,
+        suggestion_text TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_implemented BOOLEAN DEFAULT FALSE,
+        implementation_date TIMESTAMP,
+        effectiveness_rating INTEGER CHECK (effectiveness_rating BETWEEN 1 AND 5),
+        feedback_text TEXT
+    );
+    """)
+    # get_suggestion_history（マネージャー別の新しい順）
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS ix_ai_suggestion_history_manager_created
+    ON ai_suggestion_history (manager_id, created_at DESC);
+    """)
+    # ダッシュボードの最近の提案履歴（全体の新しい順）
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS ix_ai_suggestion_history_created
+    ON ai_suggestion_history (created_at DESC);
+    """)
+
+    # 月次レンジパーティションの evaluations を作成
+    op.execute("""
+    CREATE TABLE evaluations_partitioned (
+        id INTEGER NOT NULL DEFAULT nextval('evaluations_id_seq'),
+        manager_id INTEGER REFERENCES managers(id),
+        evaluation_date DATE NOT NULL,
+        communication_score NUMERIC(3,1) CHECK (communication_score BETWEEN 1 AND 5),
+        support_score NUMERIC(3,1) CHECK (support_score BETWEEN 1 AND 5),
+        goal_management_score NUMERIC(3,1) CHECK (goal_management_score BETWEEN 1 AND 5),
+        leadership_score NUMERIC(3,1) CHECK (leadership_score BETWEEN 1 AND 5),
+        problem_solving_score NUMERIC(3,1) CHECK (problem_solving_score BETWEEN 1 AND 5),
+        strategy_score NUMERIC(3,1) CHECK (strategy_score BETWEEN 1 AND 5),
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, evaluation_date)
+    ) PARTITION BY RANGE (evaluation_date);
+    """)
+    op.execute("""
+    CREATE TABLE evaluations_default PARTITION OF evaluations_partitioned DEFAULT;
+    """)
+
+    # 既存データの範囲 + 今後の月のパーティションを作成
+    bind = op.get_bind()
+    min_date = bind.execute(sa.text("SELECT MIN(evaluation_date) FROM evaluations")).scalar()
+    current_month = date.today().replace(day=1)
+    month = (min_date or current_month).replace(day=1)
+    last_month = _add_months(current_month, MONTHS_AHEAD)
+    while month <= last_month:
+        _create_month_partition(month)
+        month = _add_months(month, 1)
+
+    # 時間窓クエリ用の複合インデックス（スコア列を含むカバリングインデックス）
+    op.execute("""
+    CREATE INDEX ix_evaluations_manager_date
+    ON evaluations_partitioned (manager_id, evaluation_date)
+    INCLUDE (communication_score, support_score, goal_management_score,
+             leadership_score, problem_solving_score, strategy_score);
+    """)
+    op.execute("""
+    CREATE INDEX ix_evaluations_date
+    ON evaluations_partitioned (evaluation_date, manager_id);
+    """)
+
+    # 既存行の移行：月ごとに自動コミットのバッチでコピーし、
+    # その間も旧テーブルへの書き込みを止めない
+    snapshot_id = bind.execute(sa.text("SELECT COALESCE(MAX(id), 0) FROM evaluations")).scalar()
+    months = [
+        row[0] for row in bind.execute(sa.text("""
+            SELECT DISTINCT DATE_TRUNC('month', evaluation_date)::date
+            FROM evaluations
+            WHERE id <= :snapshot_id
+            ORDER BY 1;
+        """), {'snapshot_id': snapshot_id})
+    ]
+    with op.get_context().autocommit_block():
+        for month_start in months:
+            op.get_bind().execute(sa.text(f"""
+                INSERT INTO evaluations_partitioned ({EVALUATION_COLUMNS})
+                SELECT {EVALUATION_COLUMNS}
+                FROM evaluations
+                WHERE evaluation_date >= :month_start
+                  AND evaluation_date < :month_end
+                  AND id <= :snapshot_id;
+            """), {
+                'month_start': month_start,
+                'month_end': _add_months(month_start, 1),
+                'snapshot_id': snapshot_id
+            })
+
+    # 最終切り替え：短時間だけ書き込みをロックし、コピー中に追加された行を移してから置き換える
+    # （evaluations は追記のみで更新・削除されない前提）
+    op.execute("LOCK TABLE evaluations IN EXCLUSIVE MODE;")
+    op.execute(f"""
+    INSERT INTO evaluations_partitioned ({EVALUATION_COLUMNS})
+    SELECT {EVALUATION_COLUMNS}
+    FROM evaluations
+    WHERE id > {int(snapshot_id)};
+    """)
+    op.execute("ALTER SEQUENCE evaluations_id_seq OWNED BY NONE;")
+    op.execute("DROP TABLE evaluations;")
+    op.execute("ALTER TABLE evaluations_partitioned RENAME TO evaluations;")
+    op.execute("ALTER SEQUENCE evaluations_id_seq OWNED BY evaluations.id;")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE evaluations RENAME TO evaluations_partitioned;")
+    op.execute("""
+    CREATE TABLE evaluations (
+        id INTEGER PRIMARY KEY DEFAULT nextval('evaluations_id_seq'),
+        manager_id INTEGER REFERENCES managers(id),
+        evaluation_date DATE NOT NULL,
+        communication_score NUMERIC(3,1) CHECK (communication_score BETWEEN 1 AND 5),
+        support_score NUMERIC(3,1) CHECK (support_score BETWEEN 1 AND 5),
+        goal_management_score NUMERIC(3,1) CHECK (goal_management_score BETWEEN 1 AND 5),
+        leadership_score NUMERIC(3,1) CHECK (leadership_score BETWEEN 1 AND 5),
+        problem_solving_score NUMERIC(3,1) CHECK (problem_solving_score BETWEEN 1 AND 5),
+        strategy_score NUMERIC(3,1) CHECK (strategy_score BETWEEN 1 AND 5),
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    op.execute(f"""
+    INSERT INTO evaluations ({EVALUATION_COLUMNS})
+    SELECT {EVALUATION_COLUMNS} FROM evaluations_partitioned;
+    """)
+    op.execute("ALTER SEQUENCE evaluations_id_seq OWNED BY NONE;")
+    op.execute("DROP TABLE evaluations_partitioned;")
+    op.execute("ALTER SEQUENCE evaluations_id_seq OWNED BY evaluations.id;")
+    op.execute("DROP INDEX IF EXISTS ix_ai_suggestion_history_created;")
+    op.execute("DROP INDEX IF EXISTS ix_ai_suggestion_history_manager_created;")
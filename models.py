@@ -1,37 +1,217 @@
-from dataclasses import dataclass
 from datetime import date, datetime
-from typing import List
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence
+import numpy as np
+import pandas as pd
 from sqlalchemy import Column, Integer, String, Float, Boolean, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from rollups import SCORE_DIMENSIONS
+from scoring import weighted_overall
 
 Base = declarative_base()
 
-@dataclass
+# ScoreMatrix の列（評価項目）の順序
+SCORE_METRICS = tuple(SCORE_DIMENSIONS)
+
+# get_all_managers の平均スコア列（SCORE_METRICS と同じ順）
+MANAGER_SCORE_COLUMNS = (
+    'avg_communication', 'avg_support', 'avg_goal',
+    'avg_leadership', 'avg_problem', 'avg_strategy'
+)
+
+
+def _columns_as_matrix(df: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """DataFrame の列を (行数, 列数) の読み取り専用の float64 配列として取得
+
+    列が同じ float64 の領域に等間隔で並んでいる場合（read_sql_query の結果など）は
+    コピーせずにその領域のビューを返し、それ以外は1回だけコピーする。
+    """
+    arrays = [df[column].to_numpy() for column in columns]
+    first = arrays[0]
+    if (
+        len(arrays) > 1
+        and len(first) > 0
+        and all(a.dtype == np.float64 and a.ndim == 1 and a.strides == first.strides for a in arrays)
+        and first.base is not None
+        and all(a.base is first.base for a in arrays)
+    ):
+        address = first.__array_interface__['data'][0]
+        step = arrays[1].__array_interface__['data'][0] - address
+        if step >= len(first) * first.itemsize and all(
+            a.__array_interface__['data'][0] == address + i * step for i, a in enumerate(arrays)
+        ):
+            return np.lib.stride_tricks.as_strided(
+                first, shape=(len(first), len(arrays)), strides=(first.strides[0], step), writeable=False
+            )
+
+    matrix = np.column_stack(arrays).astype(np.float64, copy=False)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def _score_property(index: int) -> property:
+    return property(lambda self: float(self.values[index]))
+
+
 class ManagerScore:
-    communication: float
-    support: float
-    goal_management: float
-    leadership: float
-    problem_solving: float
-    strategy: float
+    """1人分のスコア（ScoreMatrix の行のビュー、または6項目のスコアの配列）"""
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float64)
+
+    communication = _score_property(0)
+    support = _score_property(1)
+    goal_management = _score_property(2)
+    leadership = _score_property(3)
+    problem_solving = _score_property(4)
+    strategy = _score_property(5)
 
     def to_list(self) -> List[float]:
-        return [
-            self.communication,
-            self.support,
-            self.goal_management,
-            self.leadership,
-            self.problem_solving,
-            self.strategy
-        ]
-
-@dataclass
+        return self.values.tolist()
+
+    def to_dict(self) -> Dict[str, float]:
+        return dict(zip(SCORE_METRICS, self.values.tolist()))
+
+    def __eq__(self, other):
+        return isinstance(other, ManagerScore) and np.array_equal(self.values, other.values, equal_nan=True)
+
+    def __repr__(self):
+        return f"ManagerScore({', '.join(f'{k}={v}' for k, v in self.to_dict().items())})"
+
+
 class Manager:
-    id: int
-    name: str
-    department: str
-    scores: ManagerScore
+    """ScoreMatrix の1行（マネージャー1人分）のビュー"""
+    __slots__ = ('matrix', 'row')
+
+    def __init__(self, matrix: 'ScoreMatrix', row: int):
+        self.matrix = matrix
+        self.row = row
+
+    @property
+    def id(self) -> int:
+        return int(self.matrix.manager_ids[self.row])
+
+    @property
+    def name(self) -> str:
+        return self.matrix.names[self.row]
+
+    @property
+    def department(self) -> str:
+        return self.matrix.departments[self.matrix.department_codes[self.row]]
+
+    @property
+    def scores(self) -> ManagerScore:
+        return ManagerScore(self.matrix.scores[self.row])
+
+    def __repr__(self):
+        return f"Manager(id={self.id}, name={self.name!r}, department={self.department!r})"
+
+
+class ScoreMatrix:
+    """マネージャー × 評価項目のスコア行列
+
+    スコアは (マネージャー数, 6) の float64 配列で保持し（評価のない項目は NaN）、
+    マネージャーID・名前・部門は行と同じ順の配列で持つ。部門は部門名の配列へのコード。
+    """
+    __slots__ = ('scores', 'manager_ids', 'names', 'department_codes', 'departments')
+
+    def __init__(
+        self,
+        scores: np.ndarray,
+        manager_ids: np.ndarray,
+        names: np.ndarray,
+        department_codes: np.ndarray,
+        departments: np.ndarray
+    ):
+        self.scores = scores
+        self.manager_ids = manager_ids
+        self.names = names
+        self.department_codes = department_codes
+        self.departments = departments
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns: Sequence[str] = MANAGER_SCORE_COLUMNS) -> 'ScoreMatrix':
+        """get_all_managers の DataFrame（id, name, department と平均スコア列）から作成
+
+        スコアは可能な限り DataFrame と同じメモリを参照する（読み取り専用）。
+        """
+        codes, departments = pd.factorize(df['department'], use_na_sentinel=False)
+        return cls(
+            scores=_columns_as_matrix(df, columns),
+            manager_ids=df['id'].to_numpy(),
+            names=df['name'].to_numpy(),
+            department_codes=codes,
+            departments=np.asarray(departments, dtype=object)
+        )
+
+    def __len__(self) -> int:
+        return len(self.manager_ids)
+
+    def __getitem__(self, row: int) -> Manager:
+        if not -len(self) <= row < len(self):
+            raise IndexError(row)
+        return Manager(self, row % len(self))
+
+    def __iter__(self) -> Iterator[Manager]:
+        return (Manager(self, row) for row in range(len(self)))
+
+    def row_of(self, manager_id: int) -> int:
+        """マネージャーIDの行番号を取得"""
+        rows = np.flatnonzero(self.manager_ids == manager_id)
+        if len(rows) == 0:
+            raise KeyError(manager_id)
+        return int(rows[0])
+
+    def manager(self, manager_id: int) -> Manager:
+        return Manager(self, self.row_of(manager_id))
+
+    def company_average(self) -> Dict[str, float]:
+        """評価項目ごとの全体平均（NaN は除外）"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            valid = ~np.isnan(self.scores)
+            means = np.where(valid, self.scores, 0.0).sum(axis=0) / valid.sum(axis=0)
+        return dict(zip(SCORE_METRICS, means.tolist()))
+
+    def department_averages(self) -> pd.DataFrame:
+        """部門ごとの評価項目の平均とマネージャー数（index は部門名）"""
+        n_departments = len(self.departments)
+        valid = ~np.isnan(self.scores)
+        filled = np.where(valid, self.scores, 0.0)
+        sums = np.empty((n_departments, len(SCORE_METRICS)))
+        counts = np.empty_like(sums)
+        for j in range(len(SCORE_METRICS)):
+            sums[:, j] = np.bincount(self.department_codes, weights=filled[:, j], minlength=n_departments)
+            counts[:, j] = np.bincount(self.department_codes, weights=valid[:, j], minlength=n_departments)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+
+        result = pd.DataFrame(means, index=pd.Index(self.departments, name='department'), columns=list(SCORE_METRICS))
+        result['manager_count'] = np.bincount(self.department_codes, minlength=n_departments)
+        return result
+
+    def quantiles(self, q) -> np.ndarray:
+        """評価項目ごとの分位点（q は 0〜100、配列も可）"""
+        return np.nanpercentile(self.scores, q, axis=0)
+
+    def percentile_ranks(self) -> np.ndarray:
+        """各マネージャーの評価項目ごとのパーセンタイル順位（0〜100、同点は平均順位、NaN はそのまま）"""
+        ranks = np.full(self.scores.shape, np.nan)
+        for j in range(len(SCORE_METRICS)):
+            column = self.scores[:, j]
+            valid = ~np.isnan(column)
+            observed = np.sort(column[valid])
+            if len(observed) == 0:
+                continue
+            below = np.searchsorted(observed, column[valid], side='left')
+            not_above = np.searchsorted(observed, column[valid], side='right')
+            ranks[valid, j] = (below + not_above) / 2 / len(observed) * 100
+        return ranks
+
+    def overall(self, weights: Optional[Mapping[str, float]] = None) -> np.ndarray:
+        """マネージャーごとの総合スコア（評価指標の重みによる加重平均）"""
+        return weighted_overall(self.scores, weights)
+
 
 class AIModelConfig(Base):
     __tablename__ = 'ai_model_config'
@@ -10,6 +10,9 @@ try:
     
     # 現在の評価指標を取得
     metrics_df = db.get_evaluation_metrics()
+    metric_stats = db.get_metric_statistics()
+    if not metric_stats.empty:
+        metric_stats = metric_stats.set_index('metric_id')
     
     # カテゴリー別に指標を整理
     st.subheader("現在の評価指標")
@@ -22,11 +25,18 @@ try:
                 st.markdown(f"### {metric['name']}")
                 st.markdown(f"**説明**: {metric['description']}")
                 st.markdown(f"**重み付け**: {metric['weight']:.1f}")
+                if metric['id'] in metric_stats.index and metric_stats.loc[metric['id'], 'score_count'] > 0:
+                    stats = metric_stats.loc[metric['id']]
+                    st.markdown(f"**平均スコア**: {stats['avg_score']:.2f}（{int(stats['score_count'])}件）")
                 st.markdown("---")
     
     # 新しい評価指標の追加フォーム
     st.markdown("## 新しい評価指標の追加")
     st.info("注意: 追加した評価指標は全てのマネージャーの評価に影響します。")
+    st.caption(
+        "評価項目（コミュニケーション、サポート、目標管理、リーダーシップ、問題解決力、戦略）と同じ名前の指標の重み付けが、"
+        "総合スコア・部門別統計・成長分析の加重平均に使用されます。対応する指標がない項目の重みは1.0です。"
+    )
     
     with st.form("new_metric_form", clear_on_submit=True):
         col1, col2 = st.columns(2)
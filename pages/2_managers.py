@@ -1,6 +1,8 @@
 import streamlit as st
 from database import DatabaseManager
-from components import display_manager_list
+from datetime import datetime
+from components import display_paginated_manager_list
+from batch_reports import BatchReportGenerator
 
 # ページ設定
 st.set_page_config(
@@ -28,14 +30,59 @@ try:
     # データベース初期化
     db = DatabaseManager()
     
-    # マネージャーデータの取得
-    managers_df = db.get_all_managers()
-    
-    # マネージャーリストの表示
-    if managers_df.empty:
+    # マネージャーリストの表示（絞り込み・並び替え・ページングはDB側で実行）
+    if not db.get_departments():
         st.warning("⚠️ マネージャーデータが見つかりません")
     else:
-        display_manager_list(managers_df)
+        display_paginated_manager_list(db)
+
+        # 全マネージャーのレポートを一括出力
+        st.markdown("---")
+        with st.expander("📦 評価レポートを一括出力（ZIP）"):
+            ai_advisor = st.session_state.get('ai_advisor')
+            report_department = st.selectbox(
+                "対象部門",
+                options=["全て"] + db.get_departments(),
+                key="report_department"
+            )
+            ai_options = {'none': 'AI提案を含めない', 'cached': 'キャッシュ済みのAI提案のみ含める'}
+            if ai_advisor:
+                ai_options['generate'] = 'AI提案を生成して含める（時間がかかります）'
+            report_ai_mode = st.radio(
+                "AI改善提案",
+                options=list(ai_options),
+                format_func=ai_options.get,
+                key="report_ai_mode"
+            )
+            if st.button("レポートを生成", key="build_reports"):
+                progress_bar = st.progress(0.0, text="レポートを生成中...")
+                generator = BatchReportGenerator(
+                    db.engine,
+                    ai_mode=report_ai_mode,
+                    ai_advisor=ai_advisor,
+                    model=st.session_state.get('ai_model'),
+                    progress_callback=lambda done, total: progress_bar.progress(
+                        done / total, text=f"レポートを生成中... ({done}/{total})"
+                    )
+                )
+                with generator.build_zip(
+                    department=None if report_department == "全て" else report_department
+                ) as archive:
+                    st.session_state.report_archive = archive.read()
+                progress_bar.empty()
+                if generator.failures:
+                    st.warning(
+                        f"{len(generator.failures)}件のレポートを生成できませんでした"
+                        "（ZIP内の errors.txt を参照してください）"
+                    )
+
+            if st.session_state.get('report_archive'):
+                st.download_button(
+                    label="📥 ZIPをダウンロード",
+                    data=st.session_state.report_archive,
+                    file_name=f"manager_reports_{datetime.now().strftime('%Y%m%d_%H%M')}.zip",
+                    mime="application/zip"
+                )
         
 except Exception as e:
     st.error(f"❌ マネージャー一覧の表示中にエラーが発生しました: {str(e)}")
@@ -3,11 +3,18 @@ from datetime import datetime, timedelta
 import streamlit as st
 import pandas as pd
 from database import DatabaseManager
-from visualization import create_radar_chart, create_trend_chart, create_growth_chart
+from visualization import create_radar_chart, create_score_trend_chart, create_growth_chart
 from components import display_score_details
 from utils import format_scores_for_ai
-from report_generator import generate_manager_report, export_report_to_markdown
+from report_generator import (
+    REPORT_FORMATS, export_report, generate_manager_report, get_report_archive, report_filename
+)
 from ai_advisor import AIAdvisor
+from trends import TREND_RESOLUTIONS
+
+# 評価推移の集計単位と表示期間（None は全期間）
+TREND_RESOLUTION_LABELS = dict(zip(TREND_RESOLUTIONS, ['週', '月', '四半期']))
+TREND_PERIODS = {'直近1年': 365, '直近3年': 365 * 3, '全期間': None}
 
 st.title("マネージャー詳細評価")
 
@@ -25,9 +32,10 @@ try:
         st.error("無効なマネージャーIDです。ダッシュボードに戻って、マネージャーを再選択してください。")
         st.stop()
 
-    manager_data = db.get_manager_details(st.session_state.selected_manager)
+    # 最新の評価・成長率・AI提案履歴・プロンプトテンプレートを1回のクエリでまとめて取得する
+    profile = db.get_manager_profile(st.session_state.selected_manager)
     
-    if manager_data.empty:
+    if not profile or profile['details'].empty:
         st.warning("🔍 マネージャーデータが見つかりません")
         st.info("以下を確認してください：\n"
                 "1. マネージャーが正しく選択されているか\n"
@@ -37,7 +45,9 @@ try:
             st.switch_page("main.py")
         st.stop()
         
-    latest_scores = manager_data.iloc[0]
+    latest_scores = profile['details'].iloc[0]
+    custom_metrics = profile['custom_metrics']
+    growth_data = profile['growth']
     
     # マネージャー情報を表示
     st.header(f"👤 {latest_scores['name']}")
@@ -65,17 +75,38 @@ try:
             st.plotly_chart(radar_fig, use_container_width=True)
         
         with col2:
-            display_score_details(latest_scores)
+            display_score_details(latest_scores, custom_metrics)
     
     with tab2:
         # トレンド分析
         st.subheader("評価推移")
-        trend_fig = create_trend_chart(manager_data)
-        st.plotly_chart(trend_fig, use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            resolution = st.radio(
+                "集計単位",
+                options=list(TREND_RESOLUTIONS),
+                index=list(TREND_RESOLUTIONS).index('month'),
+                format_func=TREND_RESOLUTION_LABELS.get,
+                horizontal=True
+            )
+        with col2:
+            period = st.radio("表示期間", options=list(TREND_PERIODS), index=1, horizontal=True)
+
+        # 表示する期間・集計単位のみを SQL で集計して取得（帯は期間内の最小・最大スコア）
+        days = TREND_PERIODS[period]
+        trend_data = db.get_manager_trend(
+            st.session_state.selected_manager,
+            resolution,
+            start_date=(datetime.now() - timedelta(days=days)).date() if days else None
+        )
+        if not trend_data.empty:
+            trend_fig = create_score_trend_chart(trend_data)
+            st.plotly_chart(trend_fig, use_container_width=True)
+        else:
+            st.info("表示期間内の評価がありません")
         
         # 成長分析
         st.subheader("成長分析")
-        growth_data = db.analyze_growth(st.session_state.selected_manager)
         if not growth_data.empty:
             growth_fig = create_growth_chart(growth_data)
             st.plotly_chart(growth_fig, use_container_width=True)
@@ -105,7 +136,7 @@ try:
                 st.markdown("## ✨ 新しい提案を生成")
                 with st.container():
                     # プロンプトテンプレートの管理
-                    templates_df = st.session_state.ai_advisor.get_prompt_templates()
+                    templates_df = profile['prompt_templates']
                     
                     col1, col2 = st.columns([3, 1])
                     with col1:
@@ -160,27 +191,29 @@ try:
                     
                     # 提案生成ボタン
                     if st.button("提案を生成", type="primary"):
-                        with st.spinner("AI提案を生成中..."):
-                            individual_scores = format_scores_for_ai(latest_scores)
-                            ai_suggestions = st.session_state.ai_advisor.generate_improvement_suggestions(
+                        individual_scores = format_scores_for_ai(latest_scores)
+                        # 受信したトークンから順に表示し、全文を受け取った後に保存する
+                        ai_suggestions = st.write_stream(
+                            st.session_state.ai_advisor.stream_improvement_suggestions(
                                 individual_scores,
                                 selected_template
                             )
-                            if ai_suggestions and "エラー" not in ai_suggestions:
-                                # 提案を保存
-                                st.session_state.ai_advisor.save_suggestion(
-                                    st.session_state.selected_manager,
-                                    ai_suggestions
-                                )
-                                st.success("新しい提案が生成され、履歴に保存されました")
-                            else:
-                                st.error("AI提案の生成中にエラーが発生しました")
+                        )
+                        if ai_suggestions and st.session_state.ai_advisor.last_stream_completed:
+                            # 提案の全文を受信できた場合のみ保存
+                            st.session_state.ai_advisor.save_suggestion(
+                                st.session_state.selected_manager,
+                                ai_suggestions
+                            )
+                            st.success("新しい提案が生成され、履歴に保存されました")
+                            # 保存した提案を履歴に含めるため取得し直す
+                            profile = db.get_manager_profile(st.session_state.selected_manager)
+                        else:
+                            st.error("AI提案の生成中にエラーが発生しました")
                 
                 # 提案履歴の表示
                 st.markdown("## 📝 提案履歴")
-                suggestion_history = st.session_state.ai_advisor.get_suggestion_history(
-                    st.session_state.selected_manager
-                )
+                suggestion_history = profile['suggestions']
                 
                 if not suggestion_history.empty:
                     for _, suggestion in suggestion_history.iterrows():
@@ -266,24 +299,35 @@ try:
     if st.button("レポートを生成"):
         with st.spinner("レポートを生成中..."):
             report_content = generate_manager_report(
-                manager_data,
-                growth_data,
+                profile,
                 st.session_state.get('ai_advisor')
             )
             
             if report_content:
                 st.markdown(report_content)
                 
-                # レポートのダウンロード機能
-                filename = f"manager_report_{latest_scores['name']}_{datetime.now().strftime('%Y%m%d_%H%M')}.md"
-                if export_report_to_markdown(report_content, filename):
-                    with open(filename, 'r', encoding='utf-8') as f:
+                # レポートのダウンロード機能（ディスクを経由せずメモリ上で変換）
+                growth_rates = growth_data['growth_rate'].tolist() if not growth_data.empty else []
+                # CSV の総合スコアもレポート本文と同じ評価指標の重みで計算する
+                weights = db.scoring.weights()
+                download_cols = st.columns(len(REPORT_FORMATS))
+                for col, (fmt, (extension, mime)) in zip(download_cols, REPORT_FORMATS.items()):
+                    with col:
                         st.download_button(
-                            label="レポートをダウンロード",
-                            data=f.read(),
-                            file_name=filename,
-                            mime="text/markdown"
+                            label=f"{extension.upper()}でダウンロード",
+                            data=export_report(report_content, fmt, latest_scores, growth_rates, weights),
+                            file_name=report_filename(latest_scores['name'], fmt),
+                            mime=mime,
+                            key=f"download_report_{fmt}"
                         )
+
+                # 保管先が設定されている場合のみサーバーにも保存
+                report_archive = get_report_archive()
+                if report_archive:
+                    try:
+                        report_archive.save(latest_scores['name'], export_report(report_content))
+                    except Exception as e:
+                        st.warning(f"レポートの保管中にエラーが発生しました: {str(e)}")
             else:
                 st.error("レポートの生成中にエラーが発生しました")
 
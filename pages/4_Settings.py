@@ -1,6 +1,8 @@
 import streamlit as st
 from database import DatabaseManager
 from models import AIModelConfig, CacheConfig
+from ai_cache import SuggestionCache, invalidate_config
+from visualization import get_figure_cache_stats
 import logging
 
 def init_settings():
@@ -56,6 +58,8 @@ def save_settings(settings_type, settings_data):
                 config.max_size_mb = settings_data['max_size_mb']
             
             session.commit()
+            if settings_type == "cache":
+                invalidate_config()
             st.success(f"{settings_type}の設定が保存されました。")
     except Exception as e:
         logging.error(f"設定の保存中にエラーが発生しました: {str(e)}")
@@ -123,6 +127,33 @@ def render_cache_settings():
         }
         save_settings("cache", settings_data)
 
+    render_cache_stats()
+
+def render_cache_stats():
+    st.subheader("キャッシュ統計")
+    try:
+        stats = SuggestionCache(DatabaseManager().engine).stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("ヒット率", f"{stats['hit_rate'] * 100:.1f}%")
+        col2.metric("ヒット / ミス", f"{stats['hits']} / {stats['misses']}")
+        col3.metric("有効エントリ数", stats['valid_entries'])
+        col4.metric("使用サイズ", f"{stats['size_bytes'] / (1024 * 1024):.2f} MB")
+        st.caption(f"削除されたエントリ数: {stats['evictions']}（ヒット・ミス数はこのサーバープロセスの起動以降の値）")
+
+        query_stats = DatabaseManager().get_query_cache_stats()
+        st.caption(
+            f"クエリ結果キャッシュ: ヒット率 {query_stats['hit_rate'] * 100:.1f}% "
+            f"（ヒット {query_stats['hits']} / ミス {query_stats['misses']}, エントリ数 {query_stats['entries']}）"
+        )
+        figure_stats = get_figure_cache_stats()
+        st.caption(
+            f"グラフのキャッシュ: ヒット率 {figure_stats['hit_rate'] * 100:.1f}% "
+            f"（ヒット {figure_stats['hits']} / ミス {figure_stats['misses']}, エントリ数 {figure_stats['entries']}）"
+        )
+    except Exception as e:
+        logging.error(f"キャッシュ統計の取得中にエラーが発生しました: {str(e)}")
+        st.warning("キャッシュ統計を取得できませんでした")
+
 def main():
     st.title("システム設定")
     
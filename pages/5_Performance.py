@@ -0,0 +1,118 @@
+import streamlit as st
+import pandas as pd
+from db_engine import get_pool_stats
+from instrumentation import SLOW_QUERY_THRESHOLD_MS, get_metrics_snapshot, metrics, render_prometheus
+
+st.title("パフォーマンス")
+st.caption("このサーバープロセスの起動以降の値です（時間は秒）")
+
+
+def histogram_frame(histograms: list, name: str, labels: list) -> pd.DataFrame:
+    """指定したヒストグラムの件数・平均・分位点の表（合計時間の多い順）"""
+    rows = [h for h in histograms if h['name'] == name]
+    if not rows:
+        return pd.DataFrame()
+    frame = pd.DataFrame(rows)
+    return (
+        frame[labels + ['count', 'sum', 'avg', 'p50', 'p95', 'p99', 'max']]
+        .sort_values('sum', ascending=False)
+        .reset_index(drop=True)
+    )
+
+
+snapshot = get_metrics_snapshot()
+histograms = snapshot['histograms']
+counters = pd.DataFrame(snapshot['counters'])
+
+tab1, tab2, tab3, tab4 = st.tabs(["処理別", "クエリ", "OpenAI", "スロークエリ"])
+
+with tab1:
+    st.subheader("処理別の実行時間")
+    operations = histogram_frame(histograms, 'operation_duration_seconds', ['operation'])
+    if operations.empty:
+        st.info("まだ計測データがありません")
+    else:
+        st.dataframe(operations, use_container_width=True, hide_index=True)
+
+    startup = histogram_frame(histograms, 'app_startup_seconds', ['phase', 'session'])
+    if not startup.empty:
+        st.markdown("#### トップページの読み込み")
+        st.caption("session=new は新しいセッションの最初の表示、rerun は操作による再実行")
+        st.dataframe(
+            startup.sort_values(['session', 'phase']).drop(columns='sum'),
+            use_container_width=True,
+            hide_index=True
+        )
+
+with tab2:
+    st.subheader("SQLクエリ")
+    queries = histogram_frame(histograms, 'db_query_duration_seconds', ['operation', 'verb'])
+    if queries.empty:
+        st.info("まだ計測データがありません")
+    else:
+        st.dataframe(queries, use_container_width=True, hide_index=True)
+
+    rows = histogram_frame(histograms, 'db_query_rows', ['operation'])
+    if not rows.empty:
+        st.markdown("#### 行数")
+        st.dataframe(rows.drop(columns='sum'), use_container_width=True, hide_index=True)
+
+    st.markdown("#### 接続プール")
+    pool_wait = histogram_frame(histograms, 'db_pool_wait_seconds', [])
+    if not pool_wait.empty:
+        wait = pool_wait.iloc[0]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("チェックアウト数", int(wait['count']))
+        col2.metric("待ち時間 p95", f"{wait['p95'] * 1000:.1f} ms")
+        col3.metric("待ち時間 最大", f"{wait['max'] * 1000:.1f} ms")
+    for url, stats in get_pool_stats().items():
+        st.caption(
+            f"{url}: 使用中 {stats['checked_out']} / プール {stats['pool_size']}"
+            f"（オーバーフロー {stats['overflow']} / {stats['max_overflow']}）"
+        )
+
+with tab3:
+    st.subheader("OpenAI API")
+    requests = histogram_frame(histograms, 'openai_request_duration_seconds', ['model', 'stream'])
+    if requests.empty:
+        st.info("まだ計測データがありません")
+    else:
+        st.dataframe(requests, use_container_width=True, hide_index=True)
+        ttft = histogram_frame(histograms, 'openai_time_to_first_token_seconds', ['model'])
+        if not ttft.empty:
+            st.markdown("#### 最初のトークンまでの時間")
+            st.dataframe(ttft, use_container_width=True, hide_index=True)
+    if not counters.empty:
+        tokens = counters[counters['name'] == 'openai_tokens_total']
+        if not tokens.empty:
+            st.markdown("#### トークン使用量")
+            st.dataframe(
+                tokens.pivot_table(index='model', columns='type', values='value', aggfunc='sum').reset_index(),
+                use_container_width=True,
+                hide_index=True
+            )
+        errors = counters[counters['name'].str.endswith('_errors_total')]
+        if not errors.empty:
+            st.markdown("#### エラー件数")
+            st.dataframe(errors, use_container_width=True, hide_index=True)
+
+with tab4:
+    st.subheader(f"スロークエリ（{SLOW_QUERY_THRESHOLD_MS:.0f} ms 以上、新しい順）")
+    if snapshot['slow_queries']:
+        st.dataframe(pd.DataFrame(snapshot['slow_queries']), use_container_width=True, hide_index=True)
+    else:
+        st.info("スロークエリはありません")
+
+st.markdown("---")
+col1, col2 = st.columns(2)
+with col1:
+    st.download_button(
+        "Prometheus形式でダウンロード",
+        data=render_prometheus(),
+        file_name="metrics.txt",
+        mime="text/plain"
+    )
+with col2:
+    if st.button("計測データをリセット"):
+        metrics.clear()
+        st.rerun()
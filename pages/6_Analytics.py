@@ -0,0 +1,130 @@
+import streamlit as st
+from analytics_snapshot import ANALYTICS_BACKEND, ANALYTICS_SNAPSHOT_UI_EXPORT, SCORE_PERCENTILES, duckdb_available
+from database import DatabaseManager
+from growth_analytics import GROWTH_DIMENSIONS
+from visualization import create_department_heatmap, create_score_distribution_chart
+
+DIMENSION_LABELS = {
+    'communication': 'コミュニケーション',
+    'support': 'サポート',
+    'goal_management': '目標管理',
+    'leadership': 'リーダーシップ',
+    'problem_solving': '問題解決力',
+    'strategy': '戦略',
+    'overall': '総合'
+}
+
+BACKEND_LABELS = {
+    'live': 'データベース（最新）',
+    'snapshot': 'スナップショット（DuckDB）'
+}
+
+st.title("組織分析")
+
+if 'analytics_backend' not in st.session_state:
+    st.session_state.analytics_backend = ANALYTICS_BACKEND
+
+try:
+    backend = st.radio(
+        "集計の参照先",
+        options=list(BACKEND_LABELS),
+        format_func=BACKEND_LABELS.get,
+        horizontal=True,
+        key='analytics_backend'
+    )
+    db = DatabaseManager(analytics_backend=backend)
+
+    info = db.get_snapshot_info()
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        if not duckdb_available():
+            st.caption("duckdb がインストールされていないため、スナップショットは使用できません")
+        elif info is None:
+            st.caption("スナップショットはまだ作成されていません")
+        else:
+            st.caption(
+                f"スナップショット: {info['created_at']} 時点"
+                f"（マネージャー {info['managers']}人、評価 {info['evaluations']}件）"
+            )
+        if backend == 'snapshot' and (info is None or not duckdb_available()):
+            st.warning("スナップショットが利用できないため、データベースで集計しています")
+    with col2:
+        # スナップショットの作成は重い処理のため、ANALYTICS_SNAPSHOT_UI_EXPORT で許可した場合のみ表示する
+        if ANALYTICS_SNAPSHOT_UI_EXPORT and duckdb_available() and st.button("スナップショットを作成"):
+            with st.spinner("スナップショットを作成中..."):
+                manifest = db.export_analytics_snapshot()
+            st.success(f"評価 {manifest['evaluations']}件のスナップショットを作成しました")
+            st.rerun()
+
+    months = st.select_slider("集計期間（月）", options=[3, 6, 12, 24, 36], value=12)
+
+    st.subheader("部門 × 月の平均スコア")
+    cube = db.get_department_metric_cube(months)
+    if cube.empty:
+        st.info("集計期間に評価データがありません")
+    else:
+        dimension = st.selectbox(
+            "評価項目",
+            options=[dim for dim in GROWTH_DIMENSIONS if dim != 'overall'],
+            format_func=DIMENSION_LABELS.get
+        )
+        st.plotly_chart(create_department_heatmap(cube, dimension), use_container_width=True)
+
+    st.subheader("総合スコアの分布")
+    percentiles = db.get_score_percentiles(months)
+    if percentiles.empty:
+        st.info("集計期間に評価データがありません")
+    else:
+        st.plotly_chart(create_score_distribution_chart(percentiles), use_container_width=True)
+        st.dataframe(
+            percentiles,
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                'department': '部門',
+                'manager_count': 'マネージャー数',
+                'mean_score': st.column_config.NumberColumn('平均', format="%.2f"),
+                **{
+                    f'p{p}': st.column_config.NumberColumn(f'{p}%', format="%.2f")
+                    for p in SCORE_PERCENTILES
+                }
+            }
+        )
+
+    st.subheader("部門別の成長")
+    summary = db.growth_analytics().growth_summary(months)
+    if summary.empty:
+        st.info("成長分析に必要な評価データがありません")
+    else:
+        growth_dimension = st.selectbox(
+            "評価項目",
+            options=GROWTH_DIMENSIONS[::-1],
+            format_func=DIMENSION_LABELS.get,
+            key='analytics_growth_dimension'
+        )
+        rows = summary[summary['dimension'] == growth_dimension]
+        by_department = (
+            rows.groupby('department')
+            .agg(
+                manager_count=('manager_id', 'count'),
+                latest_score=('latest_score', 'mean'),
+                median_slope=('slope', 'median'),
+                improving_share=('slope', lambda slope: (slope > 0).sum() / slope.notna().sum() * 100)
+            )
+            .sort_values('median_slope', ascending=False)
+            .reset_index()
+        )
+        st.dataframe(
+            by_department,
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                'department': '部門',
+                'manager_count': 'マネージャー数',
+                'latest_score': st.column_config.NumberColumn('最新スコアの平均', format="%.2f"),
+                'median_slope': st.column_config.NumberColumn('傾きの中央値（1ヶ月あたり）', format="%.3f"),
+                'improving_share': st.column_config.NumberColumn('改善傾向の割合', format="%.0f%%")
+            }
+        )
+except Exception as e:
+    st.error(f"データの表示中にエラーが発生しました: {str(e)}")
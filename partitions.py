@@ -0,0 +1,110 @@
+"""evaluations テーブルの月次パーティションの保守
+
+パーティションは partition_evaluations マイグレーションで作成される。
+今後の月のパーティションを事前に作成し、DEFAULT パーティションに入った行を
+該当する月のパーティションへ移す。
+"""
+import logging
+import sys
+from datetime import date
+from sqlalchemy import text
+
+# 現在月から何ヶ月先までパーティションを用意するか
+MONTHS_AHEAD = 12
+
+
+def _add_months(d: date, months: int) -> date:
+    total = d.year * 12 + d.month - 1 + months
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _existing_partitions(conn) -> set:
+    result = conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'evaluations';
+    """))
+    return {row[0] for row in result}
+
+
+def create_month_partition(conn, month_start: date):
+    """指定月のパーティションを作成（DEFAULT にある該当行も移動）"""
+    month_end = _add_months(month_start, 1)
+    name = f"evaluations_p{month_start:%Y_%m}"
+    params = {'month_start': month_start, 'month_end': month_end}
+
+    pending = conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM evaluations_default
+            WHERE evaluation_date >= :month_start AND evaluation_date < :month_end
+        );
+    """), params).scalar()
+
+    if pending:
+        conn.execute(text("ALTER TABLE evaluations DETACH PARTITION evaluations_default;"))
+
+    conn.execute(text(f"""
+        CREATE TABLE {name} PARTITION OF evaluations
+        FOR VALUES FROM ('{month_start:%Y-%m-%d}') TO ('{month_end:%Y-%m-%d}');
+    """))
+
+    if pending:
+        conn.execute(text("""
+            WITH moved AS (
+                DELETE FROM evaluations_default
+                WHERE evaluation_date >= :month_start AND evaluation_date < :month_end
+                RETURNING *
+            )
+            INSERT INTO evaluations SELECT * FROM moved;
+        """), params)
+        conn.execute(text("ALTER TABLE evaluations ATTACH PARTITION evaluations_default DEFAULT;"))
+        logging.info(f"DEFAULTパーティションの行を {name} に移動しました")
+
+
+def ensure_month_partitions(conn, first_month: date, last_month: date) -> list:
+    """first_month から last_month までの各月のパーティションを作成（過去データの投入用）"""
+    existing = _existing_partitions(conn)
+    created = []
+    month_start = first_month.replace(day=1)
+    while month_start <= last_month:
+        if f"evaluations_p{month_start:%Y_%m}" not in existing:
+            create_month_partition(conn, month_start)
+            created.append(month_start)
+        month_start = _add_months(month_start, 1)
+    return created
+
+
+def ensure_partitions(conn, months_ahead: int = MONTHS_AHEAD) -> list:
+    """今後の月のパーティションと、DEFAULT に行がある月のパーティションを作成"""
+    existing = _existing_partitions(conn)
+    current_month = date.today().replace(day=1)
+    months = {_add_months(current_month, i) for i in range(months_ahead + 1)}
+    months.update(
+        row[0] for row in conn.execute(text("""
+            SELECT DISTINCT DATE_TRUNC('month', evaluation_date)::date
+            FROM evaluations_default;
+        """))
+    )
+
+    created = []
+    for month_start in sorted(months):
+        if f"evaluations_p{month_start:%Y_%m}" not in existing:
+            create_month_partition(conn, month_start)
+            created.append(month_start)
+    return created
+
+
+if __name__ == '__main__':
+    # 使い方: python partitions.py ensure
+    from db_engine import get_engine
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != 'ensure':
+        print("使い方: python partitions.py ensure")
+        sys.exit(1)
+
+    with get_engine().begin() as conn:
+        created = ensure_partitions(conn)
+    logging.info(f"{len(created)}件のパーティションを作成しました")
@@ -0,0 +1,153 @@
+"""DatabaseManager の読み取りクエリ結果のプロセス内キャッシュ
+
+Streamlit の再実行やセッションをまたいで同じクエリ結果を共有する。
+各エントリにはタグを付け、書き込み側のメソッドが影響するタグだけを無効化する。
+キャッシュはプロセス単位のため、他プロセスからの書き込みは有効期限（TTL）で反映される。
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Union
+import pandas as pd
+
+DEFAULT_TTL_SECONDS = float(os.getenv('QUERY_CACHE_TTL_SECONDS', '300'))
+MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '512'))
+ENABLED = os.getenv('QUERY_CACHE_ENABLED', 'true').lower() == 'true'
+
+
+class QueryCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self.tag_index = {}  # tag -> set(key)
+        self.counters = {}  # method -> {'hits': n, 'misses': n}
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def _count(self, method: str, name: str):
+        counter = self.counters.setdefault(method, {'hits': 0, 'misses': 0})
+        counter[name] += 1
+
+    def _remove(self, key):
+        _, _, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_index[tag]
+
+    def get(self, key, method: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self._count(method, 'hits')
+                return True, entry[1]
+            if entry is not None:
+                self._remove(key)
+            self._count(method, 'misses')
+            return False, None
+
+    def set(self, key, value, tags: Iterable[str], ttl: float):
+        tags = frozenset(tags)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self.tag_index.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, *tags: str) -> int:
+        """指定したタグを持つエントリを削除し、削除件数を返す"""
+        with self.lock:
+            keys = set()
+            for tag in tags:
+                keys |= self.tag_index.get(tag, set())
+            for key in keys:
+                if key in self.entries:
+                    self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tag_index.clear()
+
+    def stats(self) -> dict:
+        """メソッド別のヒット率などの統計情報を取得"""
+        with self.lock:
+            methods = {
+                method: {
+                    **counter,
+                    'hit_rate': counter['hits'] / (counter['hits'] + counter['misses'])
+                    if counter['hits'] + counter['misses'] else 0.0
+                }
+                for method, counter in self.counters.items()
+            }
+            hits = sum(c['hits'] for c in self.counters.values())
+            misses = sum(c['misses'] for c in self.counters.values())
+            return {
+                'entries': len(self.entries),
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+                'invalidations': self.invalidations,
+                'methods': methods
+            }
+
+
+query_cache = QueryCache()
+
+
+def _share(value):
+    # 呼び出し元での列の追加・削除がキャッシュに影響しないよう浅いコピーを返す
+    # （値の書き換えは行わないこと）
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=False)
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return {k: _share(v) for k, v in value.items()}
+    return value
+
+
+def cached_query(tags: Union[Iterable[str], Callable[..., Iterable[str]]], ttl: float = None):
+    """DatabaseManager の読み取りメソッドをキャッシュするデコレーター
+
+    tags にはタグのリスト、またはメソッドと同じ引数を受け取りタグを返す関数を指定する。
+    キーは self.cache_scope（ない場合は self.engine の接続先）、メソッド名と引数。
+    空の結果（エラー時を含む）はキャッシュしない。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not ENABLED:
+                return func(self, *args, **kwargs)
+
+            method = func.__name__
+            # cache_scope を持つオブジェクト（分析用スナップショットなど）はその値でエントリを分ける
+            scope = getattr(self, 'cache_scope', None) or str(self.engine.url)
+            key = (scope, method, args, tuple(sorted(kwargs.items())))
+            hit, value = query_cache.get(key, method)
+            if hit:
+                return _share(value)
+
+            value = func(self, *args, **kwargs)
+            is_empty = value.empty if isinstance(value, pd.DataFrame) else not value
+            if not is_empty:
+                entry_tags = tags(*args, **kwargs) if callable(tags) else tags
+                query_cache.set(key, value, entry_tags, DEFAULT_TTL_SECONDS if ttl is None else ttl)
+            return _share(value)
+        return wrapper
+    return decorator
+
+
+def invalidate(*tags: str) -> int:
+    """指定したタグのキャッシュを無効化"""
+    return query_cache.invalidate(*tags)
@@ -1,11 +1,53 @@
+import csv
+import html
+import io
+import os
+import re
+import tempfile
+import time
+import uuid
 import pandas as pd
 from datetime import datetime
 import streamlit as st
 from ai_advisor import AIAdvisor
 from utils import format_scores_for_ai
+from db_engine import get_engine
+from scoring import ScoringEngine, overall_score
+
+AI_SUGGESTION_ERROR = "AI提案の生成中にエラーが発生しました。"
+
+# 出力形式ごとの拡張子とMIMEタイプ
+REPORT_FORMATS = {
+    'markdown': ('md', 'text/markdown'),
+    'html': ('html', 'text/html'),
+    'csv': ('csv', 'text/csv')
+}
+
+# レポートの評価項目（表示名, スコア列）
+REPORT_SCORE_ITEMS = [
+    ('コミュニケーション', 'communication_score'),
+    ('サポート', 'support_score'),
+    ('目標管理', 'goal_management_score'),
+    ('リーダーシップ', 'leadership_score'),
+    ('問題解決力', 'problem_solving_score'),
+    ('戦略', 'strategy_score')
+]
+
+# レポートの保管先（未設定の場合はディスクに保存しない）と保持日数
+REPORT_ARCHIVE_DIR = os.getenv('REPORT_ARCHIVE_DIR')
+REPORT_ARCHIVE_RETENTION_DAYS = int(os.getenv('REPORT_ARCHIVE_RETENTION_DAYS', '90'))
+
+def _is_missing(score):
+    return score is None or score != score
+
+def format_score(score, suffix=""):
+    """スコアを小数点1桁の文字列にする（未入力・算出不能の場合は "-"）"""
+    return "-" if _is_missing(score) else f"{score:.1f}{suffix}"
 
 def get_score_emoji(score):
-    """スコアに応じた絵文字を返す"""
+    """スコアに応じた絵文字を返す（未入力の場合は "-"）"""
+    if _is_missing(score):
+        return "-"
     if score >= 4.0:
         return "🟢"  # 緑（優秀）
     elif score >= 3.0:
@@ -15,17 +57,45 @@ def get_score_emoji(score):
     else:
         return "🔴"  # 赤（要注意）
 
-def generate_manager_report(manager_data, growth_data, ai_advisor):
-    """マネージャーの評価レポートを生成"""
-    if manager_data.empty:
+def generate_manager_report(profile, ai_advisor):
+    """マネージャーの評価レポートを生成（profile は DatabaseManager.get_manager_profile の結果）"""
+    if not profile or profile['details'].empty:
         return None
         
-    latest_scores = manager_data.iloc[0]
-    
+    latest_scores = profile['details'].iloc[0]
+    growth_data = profile['growth']
+    growth_rates = growth_data['growth_rate'].tolist() if not growth_data.empty else []
+
+    # AI提案セクション
+    ai_suggestions = None
+    if ai_advisor:
+        try:
+            individual_scores = format_scores_for_ai(latest_scores)
+            ai_suggestions = ai_advisor.generate_improvement_suggestions(individual_scores)
+        except Exception as e:
+            ai_suggestions = AI_SUGGESTION_ERROR
+
+    weights = ScoringEngine(get_engine()).weights()
+    return render_manager_report(latest_scores, growth_rates, ai_suggestions, weights=weights)
+
+def render_manager_report(latest_scores, growth_rates, ai_suggestions=None, generated_at=None, weights=None):
+    """最新スコア・成長率（新しい月から順）・AI提案からレポート本文を組み立てる
+
+    DBやAPIにアクセスしないため、別プロセスでの一括生成にも使用できる。
+    weights は評価項目ごとの重み（省略時は均等）。
+    """
+    generated_at = generated_at or datetime.now()
+    # 未入力の項目は "-" と表示し、総合スコアの計算からも除外される
+    overall = calculate_overall_score(latest_scores, weights)
+    score_rows = '\n'.join(
+        f"| {label} | {format_score(latest_scores[column], '/5.0')} | {get_score_emoji(latest_scores[column])} |"
+        for label, column in REPORT_SCORE_ITEMS
+    )
+
     # 基本情報セクション
     report = f"""
 # マネージャー評価レポート
-生成日時: {datetime.now().strftime('%Y年%m月%d日 %H:%M')}
+生成日時: {generated_at.strftime('%Y年%m月%d日 %H:%M')}
 
 ## 基本情報
 - 名前: {latest_scores['name']}
@@ -34,21 +104,16 @@ def generate_manager_report(manager_data, growth_data, ai_advisor):
 ## 現在の評価スコア
 | 評価項目 | スコア | 評価 |
 |----------|--------|------|
-| コミュニケーション | {latest_scores['communication_score']:.1f}/5.0 | {get_score_emoji(latest_scores['communication_score'])} |
-| サポート | {latest_scores['support_score']:.1f}/5.0 | {get_score_emoji(latest_scores['support_score'])} |
-| 目標管理 | {latest_scores['goal_management_score']:.1f}/5.0 | {get_score_emoji(latest_scores['goal_management_score'])} |
-| リーダーシップ | {latest_scores['leadership_score']:.1f}/5.0 | {get_score_emoji(latest_scores['leadership_score'])} |
-| 問題解決力 | {latest_scores['problem_solving_score']:.1f}/5.0 | {get_score_emoji(latest_scores['problem_solving_score'])} |
-| 戦略 | {latest_scores['strategy_score']:.1f}/5.0 | {get_score_emoji(latest_scores['strategy_score'])} |
+{score_rows}
 
 ## 総合評価
-総合スコア: {calculate_overall_score(latest_scores):.1f}/5.0 {get_score_emoji(calculate_overall_score(latest_scores))}
+総合スコア: {format_score(overall, '/5.0')} {get_score_emoji(overall)}
 """
 
     # 成長分析セクション
-    if not growth_data.empty:
-        latest_growth = growth_data.iloc[0]['growth_rate']
-        avg_growth = growth_data['growth_rate'].mean()
+    if growth_rates:
+        latest_growth = growth_rates[0]
+        avg_growth = sum(growth_rates) / len(growth_rates)
         
         report += f"""
 ## 成長分析
@@ -57,37 +122,173 @@ def generate_manager_report(manager_data, growth_data, ai_advisor):
 """
 
     # AI提案セクション
-    if ai_advisor:
-        try:
-            individual_scores = format_scores_for_ai(latest_scores)
-            ai_suggestions = ai_advisor.generate_improvement_suggestions(individual_scores)
-            report += f"""
+    if ai_suggestions == AI_SUGGESTION_ERROR:
+        report += "\n## AI改善提案\n" + AI_SUGGESTION_ERROR
+    elif ai_suggestions:
+        report += f"""
 ## AI改善提案
 {ai_suggestions}
 """
-        except Exception as e:
-            report += "\n## AI改善提案\nAI提案の生成中にエラーが発生しました。"
 
     return report
 
-def calculate_overall_score(scores):
-    """総合評価スコアを計算"""
-    eval_scores = [
-        scores['communication_score'],
-        scores['support_score'],
-        scores['goal_management_score'],
-        scores['leadership_score'],
-        scores['problem_solving_score'],
-        scores['strategy_score']
-    ]
-    return sum(eval_scores) / len(eval_scores)
-
-def export_report_to_markdown(report_content, filename):
-    """レポートをMarkdownファイルとして保存"""
-    try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(report_content)
-        return True
-    except Exception as e:
-        st.error(f"レポートの保存中にエラーが発生しました: {str(e)}")
-        return False
+def calculate_overall_score(scores, weights=None):
+    """総合評価スコアを計算（評価指標の重みによる加重平均、省略時は均等）"""
+    return overall_score(scores, weights)
+
+def _inline_html(text):
+    """Markdownの強調（**太字**）をHTMLに変換"""
+    return re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', html.escape(text))
+
+def _markdown_to_html(report_content):
+    """レポートのMarkdown（見出し・箇条書き・表・段落）をHTMLに変換"""
+    body = []
+    list_tag = None
+    table_rows = []
+
+    def close_blocks():
+        nonlocal list_tag
+        if list_tag:
+            body.append(f"</{list_tag}>")
+            list_tag = None
+        if table_rows:
+            header, *rows = table_rows
+            body.append("<table>")
+            body.append("<tr>" + "".join(f"<th>{_inline_html(c)}</th>" for c in header) + "</tr>")
+            for row in rows:
+                body.append("<tr>" + "".join(f"<td>{_inline_html(c)}</td>" for c in row) + "</tr>")
+            body.append("</table>")
+            table_rows.clear()
+
+    for line in report_content.splitlines():
+        stripped = line.strip()
+        heading = re.match(r'^(#{1,6})\s+(.*)$', stripped)
+        item = re.match(r'^(?:([-*])|\d+\.)\s+(.*)$', stripped)
+        if stripped.startswith('|'):
+            cells = [c.strip() for c in stripped.strip('|').split('|')]
+            # 見出し行と本文の区切り（|---|---|）は出力しない
+            if not all(re.fullmatch(r':?-+:?', c) for c in cells):
+                table_rows.append(cells)
+            continue
+        if item:
+            tag = 'ul' if item.group(1) else 'ol'
+            if list_tag != tag:
+                close_blocks()
+                body.append(f"<{tag}>")
+                list_tag = tag
+            body.append(f"<li>{_inline_html(item.group(2))}</li>")
+            continue
+        close_blocks()
+        if heading:
+            level = len(heading.group(1))
+            body.append(f"<h{level}>{_inline_html(heading.group(2))}</h{level}>")
+        elif stripped:
+            body.append(f"<p>{_inline_html(stripped)}</p>")
+    close_blocks()
+
+    return f"""<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>マネージャー評価レポート</title>
+<style>
+body {{ font-family: sans-serif; max-width: 860px; margin: 2rem auto; line-height: 1.6; }}
+table {{ border-collapse: collapse; }}
+th, td {{ border: 1px solid #e6e6e6; padding: 0.3rem 0.8rem; }}
+th {{ background-color: #f0f2f6; }}
+</style>
+</head>
+<body>
+{chr(10).join(body)}
+</body>
+</html>
+"""
+
+def _scores_to_csv(latest_scores, growth_rates, weights):
+    """評価スコアと成長率を「項目,値,評価」形式のCSVに変換"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['項目', '値', '評価'])
+    writer.writerow(['名前', latest_scores['name'], ''])
+    writer.writerow(['部門', latest_scores['department'], ''])
+    for label, column in REPORT_SCORE_ITEMS:
+        score = latest_scores[column]
+        writer.writerow([label, format_score(score), get_score_emoji(score)])
+    overall = calculate_overall_score(latest_scores, weights)
+    writer.writerow(['総合スコア', format_score(overall), get_score_emoji(overall)])
+    if growth_rates:
+        writer.writerow(['直近の成長率(%)', f"{growth_rates[0]:.1f}", ''])
+        writer.writerow(['平均成長率(%)', f"{sum(growth_rates) / len(growth_rates):.1f}", ''])
+    return buffer.getvalue()
+
+def export_report(report_content, fmt='markdown', latest_scores=None, growth_rates=None, weights=None):
+    """レポートを指定形式（markdown / html / csv）のバイト列に変換
+
+    csv は評価スコアの表のみを出力するため latest_scores が必要。
+    """
+    if fmt == 'markdown':
+        return report_content.encode('utf-8')
+    if fmt == 'html':
+        return _markdown_to_html(report_content).encode('utf-8')
+    if fmt == 'csv':
+        if latest_scores is None:
+            raise ValueError("CSV形式の出力には latest_scores が必要です")
+        # Excelで文字化けしないようBOM付きで出力
+        return _scores_to_csv(latest_scores, growth_rates or [], weights).encode('utf-8-sig')
+    raise ValueError(f"未対応のレポート形式です: {fmt}")
+
+def sanitize_filename(name):
+    """ファイル名として扱えない文字を置き換える"""
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', str(name)).strip('_') or 'manager'
+
+def report_filename(name, fmt='markdown', generated_at=None):
+    """ダウンロード用のレポートファイル名を返す"""
+    generated_at = generated_at or datetime.now()
+    extension = REPORT_FORMATS[fmt][0]
+    return f"manager_report_{sanitize_filename(name)}_{generated_at.strftime('%Y%m%d_%H%M')}.{extension}"
+
+class ReportArchive:
+    """生成したレポートをディレクトリに保管し、保持期間を過ぎたものを削除"""
+
+    def __init__(self, directory, retention_days=REPORT_ARCHIVE_RETENTION_DAYS):
+        self.directory = directory
+        self.retention_days = retention_days
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, name, data, fmt='markdown'):
+        """レポートを保存し、保存先のパスを返す（同時に保存しても上書きしない一意の名前）"""
+        extension = REPORT_FORMATS[fmt][0]
+        filename = f"manager_report_{sanitize_filename(name)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{extension}"
+        path = os.path.join(self.directory, filename)
+
+        # 書き込み途中のファイルが見えないよう、一時ファイルに書いてから置き換える
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp_')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+        self.prune()
+        return path
+
+    def prune(self):
+        """保持期間を過ぎたレポートを削除し、削除件数を返す"""
+        cutoff = time.time() - self.retention_days * 86400
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.startswith('manager_report_') and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+def get_report_archive():
+    """REPORT_ARCHIVE_DIR が設定されている場合のみ保管先を返す"""
+    if not REPORT_ARCHIVE_DIR:
+        return None
+    return ReportArchive(REPORT_ARCHIVE_DIR)
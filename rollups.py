@@ -0,0 +1,113 @@
+"""マネージャー・部門別の月次スコア集計（ロールアップ）の管理
+
+evaluations への書き込みと同じトランザクション内で月次バケット（合計値と件数）を
+更新し、ダッシュボードの集計クエリを評価明細の全件走査なしで返せるようにする。
+"""
+import logging
+import sys
+from sqlalchemy import text
+
+# ロールアップ列の接頭辞と evaluations の列名の対応
+SCORE_DIMENSIONS = {
+    'communication': 'communication_score',
+    'support': 'support_score',
+    'goal_management': 'goal_management_score',
+    'leadership': 'leadership_score',
+    'problem_solving': 'problem_solving_score',
+    'strategy': 'strategy_score',
+}
+
+# 単一の評価行をロールアップ更新のソースとして扱うためのサブクエリ
+SINGLE_EVALUATION_SOURCE = """
+    SELECT
+        CAST(:manager_id AS INTEGER) AS manager_id,
+        CAST(:evaluation_date AS DATE) AS evaluation_date,
+        CAST(:communication AS NUMERIC(3,1)) AS communication_score,
+        CAST(:support AS NUMERIC(3,1)) AS support_score,
+        CAST(:goal_management AS NUMERIC(3,1)) AS goal_management_score,
+        CAST(:leadership AS NUMERIC(3,1)) AS leadership_score,
+        CAST(:problem_solving AS NUMERIC(3,1)) AS problem_solving_score,
+        CAST(:strategy AS NUMERIC(3,1)) AS strategy_score
+"""
+
+
+def _rollup_columns() -> list:
+    columns = []
+    for dim in SCORE_DIMENSIONS:
+        columns += [f"{dim}_sum", f"{dim}_count"]
+    return columns + ['evaluation_count']
+
+
+def _aggregate_expressions(alias: str) -> list:
+    expressions = []
+    for score_column in SCORE_DIMENSIONS.values():
+        expressions += [
+            f"COALESCE(SUM({alias}.{score_column}), 0)",
+            f"COUNT({alias}.{score_column})"
+        ]
+    return expressions + ["COUNT(*)"]
+
+
+def _upsert_sql(table: str, key_column: str, key_expression: str, source: str, join: str = "") -> str:
+    columns = _rollup_columns()
+    updates = ",\n            ".join(
+        f"{col} = {table}.{col} + EXCLUDED.{col}" for col in columns
+    )
+    return f"""
+        INSERT INTO {table} ({key_column}, month, {', '.join(columns)})
+        SELECT
+            {key_expression},
+            DATE_TRUNC('month', s.evaluation_date)::date,
+            {', '.join(_aggregate_expressions('s'))}
+        FROM ({source}) s
+        {join}
+        GROUP BY {key_expression}, DATE_TRUNC('month', s.evaluation_date)
+        ON CONFLICT ({key_column}, month) DO UPDATE SET
+            {updates},
+            updated_at = CURRENT_TIMESTAMP;
+    """
+
+
+def apply_rollups(conn, source: str, params: dict = None):
+    """評価行のソース（サブクエリまたはテーブル）をロールアップに加算
+
+    呼び出し元のトランザクション内で実行され、コミットは呼び出し元が行う。
+    """
+    params = params or {}
+    conn.execute(
+        text(_upsert_sql('manager_score_rollups', 'manager_id', 's.manager_id', source)),
+        params
+    )
+    conn.execute(
+        text(_upsert_sql(
+            'department_score_rollups', 'department', 'm.department', source,
+            join="JOIN managers m ON m.id = s.manager_id"
+        )),
+        params
+    )
+
+
+def apply_evaluation_rollups(conn, params: dict):
+    """add_evaluation と同じパラメータで単一評価をロールアップに加算"""
+    apply_rollups(conn, SINGLE_EVALUATION_SOURCE, params)
+
+
+def rebuild_rollups(conn):
+    """evaluations からロールアップを再構築（バックフィル用）"""
+    conn.execute(text("LOCK TABLE evaluations IN SHARE MODE;"))
+    conn.execute(text("TRUNCATE manager_score_rollups, department_score_rollups;"))
+    apply_rollups(conn, "SELECT * FROM evaluations WHERE manager_id IS NOT NULL")
+
+
+if __name__ == '__main__':
+    # 使い方: python rollups.py rebuild
+    from db_engine import get_engine
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("使い方: python rollups.py rebuild")
+        sys.exit(1)
+
+    with get_engine().begin() as conn:
+        rebuild_rollups(conn)
+    logging.info("スコアロールアップを再構築しました")
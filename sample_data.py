@@ -0,0 +1,194 @@
+"""NumPy による大量のサンプルデータの生成
+
+シードと分布の設定（部門構成、マネージャーごとの基準値・傾向・ばらつき、評価の間隔、評価の欠落）から
+マネージャーと評価を一括で生成する。生成したデータは COPY 経由でデータベースに読み込むか、
+Parquet ファイルとして書き出せる（負荷試験や性能問題の再現用）。
+"""
+import argparse
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from rollups import SCORE_DIMENSIONS
+
+# 評価の間隔（日数、または月単位の間隔）
+CADENCES = {
+    'weekly': ('D', 7),
+    'biweekly': ('D', 14),
+    'monthly': ('M', 1),
+    'quarterly': ('M', 3),
+}
+
+DEFAULT_DEPARTMENTS = {
+    '営業': 1.0,
+    '開発': 1.0,
+    '人事': 1.0,
+    '経営企画': 1.0,
+    'カスタマーサクセス': 1.0,
+    'マーケティング': 1.0,
+}
+
+
+@dataclass
+class SampleDataConfig:
+    """サンプルデータの規模と分布
+
+    スコアは マネージャーの基準値 + 項目ごとの差 + 傾き × 経過月数 + 評価ごとのばらつき を
+    1〜5の範囲で小数点1桁に丸めた値。seed が None の場合は毎回異なるデータになる。
+    """
+    n_managers: int = 50
+    months: int = 6
+    cadence: str = 'monthly'
+    seed: Optional[int] = None
+    # 部門名 → 構成比（合計は1でなくてもよい）
+    departments: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_DEPARTMENTS))
+    base_mean: float = 3.6
+    base_std: float = 0.4
+    dimension_std: float = 0.3
+    # 1ヶ月あたりのスコアの変化
+    trend_mean: float = 0.0
+    trend_std: float = 0.02
+    noise_std: float = 0.3
+    # 予定された評価が行われない確率と、評価内の各項目が未入力になる確率
+    missing_rate: float = 0.0
+    missing_score_rate: float = 0.0
+    # 評価期間の最終日（既定は今日）
+    end_date: Optional[date] = None
+    name_prefix: str = "サンプルマネージャー"
+
+
+def _period_starts(config: SampleDataConfig) -> Tuple[np.ndarray, np.ndarray]:
+    """評価期間（end_date までの months ヶ月）を cadence で区切った各期間の開始日と日数"""
+    if config.cadence not in CADENCES:
+        raise ValueError(f"無効な評価間隔です: {config.cadence}")
+    unit, step = CADENCES[config.cadence]
+    end = np.datetime64(config.end_date or date.today(), 'D')
+    start = (end.astype('datetime64[M]') - config.months + 1).astype('datetime64[D]')
+
+    if unit == 'M':
+        months = np.arange(start.astype('datetime64[M]'), end.astype('datetime64[M]') + 1, step)
+        starts = months.astype('datetime64[D]')
+        ends = (months + step).astype('datetime64[D]')
+    else:
+        starts = np.arange(start, end + 1, step)
+        ends = starts + step
+    # 最後の期間は end_date までに収める
+    ends = np.minimum(ends, end + 1)
+    return starts, (ends - starts).astype(np.int64)
+
+
+def generate_managers(config: SampleDataConfig, rng: np.random.Generator) -> pd.DataFrame:
+    """マネージャー（id は 1 からの連番、部門は構成比に従って抽選）"""
+    names = np.array(list(config.departments), dtype=object)
+    weights = np.array(list(config.departments.values()), dtype=float)
+    ids = np.arange(1, config.n_managers + 1)
+    width = len(str(config.n_managers))
+    return pd.DataFrame({
+        'id': ids,
+        'name': [f"{config.name_prefix}{i:0{width}d}" for i in ids],
+        'department': names[rng.choice(len(names), config.n_managers, p=weights / weights.sum())]
+    })
+
+
+def generate_evaluations(config: SampleDataConfig, rng: np.random.Generator) -> pd.DataFrame:
+    """マネージャー × 評価期間の評価（manager_id は generate_managers の id）
+
+    戻り値の列: manager_id, evaluation_date と6項目のスコア列（未入力の項目は NaN）
+    """
+    starts, lengths = _period_starts(config)
+    n_managers, n_periods = config.n_managers, len(starts)
+    n_dims = len(SCORE_DIMENSIONS)
+
+    present = rng.random((n_managers, n_periods)) >= config.missing_rate
+    manager_pos, period_pos = np.nonzero(present)
+    n_evaluations = len(manager_pos)
+
+    # 期間内の日付はランダム
+    evaluation_dates = starts[period_pos] + (rng.random(n_evaluations) * lengths[period_pos]).astype(np.int64)
+    elapsed_months = (evaluation_dates - starts[0]).astype(np.float64) / 30.44
+
+    base = rng.normal(config.base_mean, config.base_std, n_managers)
+    trend = rng.normal(config.trend_mean, config.trend_std, n_managers)
+    offsets = rng.normal(0.0, config.dimension_std, (n_managers, n_dims))
+    scores = (
+        (base[manager_pos] + trend[manager_pos] * elapsed_months)[:, None]
+        + offsets[manager_pos]
+        + rng.normal(0.0, config.noise_std, (n_evaluations, n_dims))
+    )
+    scores = np.round(np.clip(scores, 1.0, 5.0), 1)
+    if config.missing_score_rate > 0:
+        scores[rng.random(scores.shape) < config.missing_score_rate] = np.nan
+
+    evaluations = pd.DataFrame(scores, columns=list(SCORE_DIMENSIONS.values()))
+    evaluations.insert(0, 'manager_id', manager_pos + 1)
+    evaluations.insert(1, 'evaluation_date', evaluation_dates)
+    return evaluations
+
+
+def generate_sample_dataset(config: SampleDataConfig) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """設定に従ってマネージャーと評価を生成（同じ seed からは同じデータ）"""
+    rng = np.random.default_rng(config.seed)
+    managers = generate_managers(config, rng)
+    evaluations = generate_evaluations(config, rng)
+    return managers, evaluations
+
+
+def write_parquet(config: SampleDataConfig, directory: str) -> Tuple[str, str]:
+    """マネージャーと評価を directory に managers.parquet / evaluations.parquet として書き出す"""
+    managers, evaluations = generate_sample_dataset(config)
+    os.makedirs(directory, exist_ok=True)
+    paths = (os.path.join(directory, 'managers.parquet'), os.path.join(directory, 'evaluations.parquet'))
+    managers.to_parquet(paths[0], index=False)
+    evaluations.to_parquet(paths[1], index=False)
+    return paths
+
+
+def _parse_departments(value: str) -> Dict[str, float]:
+    """「営業=2,開発=3」形式の部門構成"""
+    departments = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        departments[name.strip()] = float(weight) if weight else 1.0
+    return departments
+
+
+if __name__ == '__main__':
+    # 使い方: python sample_data.py {db|parquet} [--output DIR] [--managers N] [--months N] ...
+    parser = argparse.ArgumentParser(description="サンプルデータの生成")
+    parser.add_argument('target', choices=['db', 'parquet'], help="DATABASE_URL のデータベースに追加するか、Parquet に書き出すか")
+    parser.add_argument('--output', default='sample_output', help="Parquet の出力先ディレクトリ")
+    parser.add_argument('--managers', type=int, default=SampleDataConfig.n_managers)
+    parser.add_argument('--months', type=int, default=SampleDataConfig.months)
+    parser.add_argument('--cadence', choices=list(CADENCES), default=SampleDataConfig.cadence)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--departments', type=_parse_departments, help="部門構成（例: 営業=2,開発=3）")
+    parser.add_argument('--trend-std', type=float, default=SampleDataConfig.trend_std)
+    parser.add_argument('--noise-std', type=float, default=SampleDataConfig.noise_std)
+    parser.add_argument('--missing-rate', type=float, default=SampleDataConfig.missing_rate)
+    parser.add_argument('--missing-score-rate', type=float, default=SampleDataConfig.missing_score_rate)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = SampleDataConfig(
+        n_managers=args.managers,
+        months=args.months,
+        cadence=args.cadence,
+        seed=args.seed,
+        trend_std=args.trend_std,
+        noise_std=args.noise_std,
+        missing_rate=args.missing_rate,
+        missing_score_rate=args.missing_score_rate
+    )
+    if args.departments:
+        config.departments = args.departments
+
+    if args.target == 'parquet':
+        for path in write_parquet(config, args.output):
+            logging.info(f"{path} を書き出しました")
+    else:
+        from database import DatabaseManager
+        if not DatabaseManager().generate_sample_data(config):
+            raise SystemExit(1)
@@ -0,0 +1,203 @@
+"""評価スコアの縦持ち保存（evaluation_scores）と横持ちへのピボット
+
+全ての評価指標のスコアを (評価, 指標, スコア) の行として保存し、カスタム指標も採点できるようにする。
+基本6項目は evaluations のスコア列にも同じトランザクションで書き込まれ、月次ロールアップはそちらから更新される。
+読み取り側は評価指標の一覧からピボット列を組み立て、既存と同じ横持ちの DataFrame を返す
+（基本6項目は communication_score などの列名、カスタム指標は metric_<id>_score）。
+"""
+import logging
+from datetime import date
+from typing import Dict, List, Mapping, Optional
+import pandas as pd
+from sqlalchemy import text
+from query_cache import cached_query
+from rollups import SCORE_DIMENSIONS
+
+# evaluations のスコア列を (評価項目, スコア) の行に展開する式
+_CORE_SCORE_VALUES = ',\n        '.join(
+    f"('{dim}', s.{column})" for dim, column in SCORE_DIMENSIONS.items()
+)
+
+
+def metric_column(metric_id: int, dimension: Optional[str] = None) -> str:
+    """指標に対応する横持ちの列名"""
+    if dimension in SCORE_DIMENSIONS:
+        return SCORE_DIMENSIONS[dimension]
+    return f"metric_{int(metric_id)}_score"
+
+
+def core_scores_insert_sql(source: str) -> str:
+    """評価行のソース（id, manager_id, evaluation_date と6項目のスコア列）の基本6項目を
+    evaluation_scores に追加するSQL
+    """
+    return f"""
+        INSERT INTO evaluation_scores (evaluation_id, metric_id, manager_id, evaluation_date, score)
+        SELECT s.id, m.id, s.manager_id, s.evaluation_date, v.score
+        FROM ({source}) s
+        CROSS JOIN LATERAL (VALUES
+        {_CORE_SCORE_VALUES}
+        ) AS v(dimension, score)
+        JOIN evaluation_metrics m ON m.dimension = v.dimension
+        WHERE s.manager_id IS NOT NULL AND v.score IS NOT NULL
+    """
+
+
+def insert_metric_scores(
+    conn,
+    evaluation_id: int,
+    manager_id: int,
+    evaluation_date,
+    metric_scores: Mapping[int, float]
+):
+    """1件の評価にカスタム指標のスコア（指標ID → スコア）を追加
+
+    呼び出し元のトランザクション内で実行され、コミットは呼び出し元が行う。
+    """
+    rows = [
+        {
+            'evaluation_id': evaluation_id,
+            'metric_id': int(metric_id),
+            'manager_id': manager_id,
+            'evaluation_date': evaluation_date,
+            'score': score
+        }
+        for metric_id, score in metric_scores.items()
+        if score is not None
+    ]
+    if not rows:
+        return
+    conn.execute(
+        text("""
+            INSERT INTO evaluation_scores (evaluation_id, metric_id, manager_id, evaluation_date, score)
+            VALUES (:evaluation_id, :metric_id, :manager_id, :evaluation_date, :score);
+        """),
+        rows
+    )
+
+
+def pivot_sql(metrics: pd.DataFrame, where: str = "") -> str:
+    """evaluation_scores を評価ごとの横持ちに変換するSQL
+
+    metrics は ScoreStore.metrics() の結果。基本6項目の列は指標がない場合も NULL として含める。
+    """
+    columns = []
+    core_ids = {
+        row.dimension: int(row.id)
+        for row in metrics.itertuples()
+        if row.dimension in SCORE_DIMENSIONS
+    }
+    for dim, column in SCORE_DIMENSIONS.items():
+        if dim in core_ids:
+            columns.append(f"MAX(s.score) FILTER (WHERE s.metric_id = {core_ids[dim]}) AS {column}")
+        else:
+            columns.append(f"CAST(NULL AS NUMERIC) AS {column}")
+    for row in metrics.itertuples():
+        if row.dimension not in SCORE_DIMENSIONS:
+            columns.append(
+                f"MAX(s.score) FILTER (WHERE s.metric_id = {int(row.id)}) AS {row.column}"
+            )
+
+    select_columns = ',\n            '.join(columns)
+    return f"""
+        SELECT
+            s.evaluation_id,
+            s.manager_id,
+            s.evaluation_date,
+            {select_columns}
+        FROM evaluation_scores s
+        {where}
+        GROUP BY s.evaluation_id, s.manager_id, s.evaluation_date
+    """
+
+
+class ScoreStore:
+    def __init__(self, engine):
+        self.engine = engine
+
+    @cached_query(tags=['evaluation_metrics'])
+    def metrics(self) -> pd.DataFrame:
+        """評価指標と横持ちの列名の対応（基本6項目の順、続いてカスタム指標の追加順）"""
+        try:
+            metrics = pd.read_sql_query(
+                text("SELECT id, name, category, weight, dimension FROM evaluation_metrics ORDER BY id;"),
+                self.engine
+            )
+        except Exception as e:
+            logging.error(f"評価指標の取得中にエラーが発生: {str(e)}")
+            return pd.DataFrame()
+
+        order = {dim: i for i, dim in enumerate(SCORE_DIMENSIONS)}
+        metrics['column'] = [
+            metric_column(row.id, row.dimension) for row in metrics.itertuples()
+        ]
+        metrics['sort_key'] = metrics['dimension'].map(order).fillna(len(order))
+        return (
+            metrics.sort_values(['sort_key', 'id'], kind='stable')
+            .drop(columns='sort_key')
+            .reset_index(drop=True)
+        )
+
+    def custom_metric_columns(self) -> Dict[str, str]:
+        """カスタム指標の列名 → 指標名"""
+        metrics = self.metrics()
+        if metrics.empty:
+            return {}
+        custom = metrics[~metrics['dimension'].isin(list(SCORE_DIMENSIONS))]
+        return dict(zip(custom['column'], custom['name']))
+
+    def manager_scores_sql(self) -> str:
+        """:manager_id のマネージャーの評価を横持ちで返すSQL（get_manager_details で使用）"""
+        return pivot_sql(self.metrics(), "WHERE s.manager_id = :manager_id")
+
+    def wide_scores(
+        self,
+        manager_ids: Optional[List[int]] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+    ) -> pd.DataFrame:
+        """評価ごとの全指標のスコアを横持ちで取得（評価日の新しい順）"""
+        conditions = []
+        params = {}
+        if manager_ids is not None:
+            conditions.append("s.manager_id = ANY(:manager_ids)")
+            params['manager_ids'] = [int(manager_id) for manager_id in manager_ids]
+        if start_date is not None:
+            conditions.append("s.evaluation_date >= :start_date")
+            params['start_date'] = start_date
+        if end_date is not None:
+            conditions.append("s.evaluation_date < :end_date")
+            params['end_date'] = end_date
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        try:
+            query = pivot_sql(self.metrics(), where) + "ORDER BY s.evaluation_date DESC, s.evaluation_id DESC;"
+            return pd.read_sql_query(text(query), self.engine, params=params)
+        except Exception as e:
+            logging.error(f"評価スコアの取得中にエラーが発生: {str(e)}")
+            return pd.DataFrame()
+
+    @cached_query(tags=['evaluations', 'evaluation_metrics'])
+    def metric_statistics(self, start_date: Optional[date] = None) -> pd.DataFrame:
+        """評価指標ごとの評価件数・平均・最小・最大スコア"""
+        # 期間の条件は ix_evaluation_scores_metric_date の範囲検索になるよう結合条件に含める
+        date_condition = "AND s.evaluation_date >= :start_date" if start_date is not None else ""
+        try:
+            query = f"""
+                SELECT
+                    m.id as metric_id,
+                    m.name,
+                    COUNT(s.score) as score_count,
+                    AVG(s.score) as avg_score,
+                    MIN(s.score) as min_score,
+                    MAX(s.score) as max_score
+                FROM evaluation_metrics m
+                LEFT JOIN evaluation_scores s
+                    ON s.metric_id = m.id
+                    {date_condition}
+                GROUP BY m.id, m.name
+                ORDER BY m.id;
+            """
+            return pd.read_sql_query(text(query), self.engine, params={'start_date': start_date})
+        except Exception as e:
+            logging.error(f"評価指標別の統計の取得中にエラーが発生: {str(e)}")
+            return pd.DataFrame()
@@ -0,0 +1,120 @@
+"""評価指標の重みによる総合スコアの計算
+
+evaluation_metrics の重みを評価項目（スコア列）に対応付け、Python・NumPy・SQL の
+いずれでも同じ重み付き平均を計算する。スコアが欠けている項目は分母からも除外する。
+重みはクエリキャッシュに保持し、評価指標の追加時に無効化される。
+"""
+import logging
+from decimal import Decimal
+from typing import Dict, Mapping, Optional
+import numpy as np
+from sqlalchemy import text
+from query_cache import cached_query
+from rollups import SCORE_DIMENSIONS
+
+# 評価指標名と評価項目の対応（名前が一致する指標の重みを使用する）
+METRIC_DIMENSIONS = {
+    'コミュニケーション': 'communication',
+    'コミュニケーション・フィードバック': 'communication',
+    'サポート': 'support',
+    'サポート・エンパワーメント': 'support',
+    '目標管理': 'goal_management',
+    '目標管理・成果達成': 'goal_management',
+    'リーダーシップ': 'leadership',
+    'リーダーシップ・意思決定': 'leadership',
+    '問題解決力': 'problem_solving',
+    '戦略': 'strategy',
+    '戦略・成長支援': 'strategy',
+}
+
+# 対応する評価指標がない項目の重み
+DEFAULT_WEIGHTS = {dim: 1.0 for dim in SCORE_DIMENSIONS}
+
+
+def weights_from_metrics(metrics) -> Dict[str, float]:
+    """評価指標の一覧（name, weight, 任意で is_active）から項目ごとの重みを求める
+
+    同じ項目に対応する指標が複数ある場合は後から追加されたものを優先する。
+    """
+    weights = dict(DEFAULT_WEIGHTS)
+    for metric in metrics:
+        if not metric.get('is_active', True):
+            continue
+        # evaluation_scores の導入後は基本指標に評価項目（dimension）が設定されている
+        dim = metric.get('dimension') or METRIC_DIMENSIONS.get(str(metric['name']).strip())
+        if dim is not None and metric['weight'] is not None:
+            weights[dim] = float(metric['weight'])
+    return weights
+
+
+def overall_score(scores: Mapping, weights: Optional[Mapping[str, float]] = None):
+    """1件分のスコア（communication_score などの列名をキーに持つ）の重み付き平均
+
+    スコアが Decimal の場合は Decimal のまま計算する。
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    total = 0
+    weight_sum = 0
+    for dim, column in SCORE_DIMENSIONS.items():
+        score = scores[column]
+        if score is None or score != score:
+            continue
+        weight = Decimal(str(weights[dim])) if isinstance(score, Decimal) else weights[dim]
+        total += score * weight
+        weight_sum += weight
+    return total / weight_sum if weight_sum else float('nan')
+
+
+def weighted_overall(scores: np.ndarray, weights: Optional[Mapping[str, float]] = None) -> np.ndarray:
+    """スコア行列（最後の軸が SCORE_DIMENSIONS の順の6項目）の重み付き平均を一括計算"""
+    weights = weights or DEFAULT_WEIGHTS
+    w = np.array([weights[dim] for dim in SCORE_DIMENSIONS], dtype=float)
+    scores = np.asarray(scores, dtype=float)
+    valid = ~np.isnan(scores)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(valid, scores, 0.0) @ w / (valid @ w)
+
+
+def weighted_average_sql(expressions: Mapping[str, str], weights: Optional[Mapping[str, float]] = None) -> str:
+    """項目ごとのSQL式（項目名 → 式）から重み付き平均のSQL式を組み立てる"""
+    weights = weights or DEFAULT_WEIGHTS
+    numerator = []
+    denominator = []
+    for dim in SCORE_DIMENSIONS:
+        # 重みはDBから読み込んだ数値のため、float に変換してリテラルとして埋め込む
+        weight = f"{float(weights[dim])!r}"
+        expression = expressions[dim]
+        numerator.append(f"COALESCE({expression} * {weight}, 0)")
+        denominator.append(f"CASE WHEN {expression} IS NOT NULL THEN {weight} ELSE 0 END")
+    return f"(({' + '.join(numerator)}) / NULLIF({' + '.join(denominator)}, 0))"
+
+
+def score_columns_sql(alias: str) -> Dict[str, str]:
+    """evaluations のスコア列を weighted_average_sql に渡す形式で返す"""
+    return {dim: f"{alias}.{column}" for dim, column in SCORE_DIMENSIONS.items()}
+
+
+class ScoringEngine:
+    def __init__(self, engine):
+        self.engine = engine
+
+    @cached_query(tags=['evaluation_metrics'])
+    def weights(self) -> Dict[str, float]:
+        """評価指標の重みを項目ごとに取得（読み込めない場合は空の辞書 = 均等な重みとして扱われる）"""
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execute(text("SELECT * FROM evaluation_metrics ORDER BY id;"))
+                metrics = [dict(row._mapping) for row in result]
+            return weights_from_metrics(metrics)
+        except Exception as e:
+            logging.error(f"評価指標の重みの取得中にエラーが発生: {str(e)}")
+            return {}
+
+    def overall_score(self, scores: Mapping):
+        return overall_score(scores, self.weights())
+
+    def weighted_overall(self, scores: np.ndarray) -> np.ndarray:
+        return weighted_overall(scores, self.weights())
+
+    def weighted_average_sql(self, expressions: Mapping[str, str]) -> str:
+        return weighted_average_sql(expressions, self.weights())
@@ -0,0 +1,146 @@
+"""マネージャーの評価推移（トレンド）データ
+
+evaluation_scores を週・月・四半期の期間ごとに SQL で集計し（平均と最小・最大の帯）、
+指定した期間の範囲のみを取得する。期間数が多い系列は LTTB（Largest-Triangle-Three-Buckets）で
+形状を保ったまま描画する点数まで間引く。
+"""
+import logging
+from datetime import date
+from typing import Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from query_cache import cached_query
+
+# 集計の単位（DATE_TRUNC の単位）
+TREND_RESOLUTIONS = ('week', 'month', 'quarter')
+DEFAULT_RESOLUTION = 'month'
+
+# 1つの評価指標の系列あたりの最大点数（これを超える系列は LTTB で間引く）
+TREND_MAX_POINTS = 500
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """LTTB で残す点の位置（x は昇順）
+
+    先頭と末尾の点を残し、間の点を n_out - 2 個のバケットに分け、
+    各バケットから前に選んだ点と次のバケットの平均点とで作る三角形の面積が最大の点を選ぶ。
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # バケットの境界（先頭と末尾の点を除いた区間を等分）
+    edges = np.floor(np.linspace(1, n - 1, n_out - 1)).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # 次のバケットの平均点（最後のバケットでは末尾の点）
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def downsample_trend(trend: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """評価指標ごとの系列を平均スコアの形状で max_points 点まで間引く（帯は残した期間の最小・最大）"""
+    if trend.empty or max_points is None:
+        return trend
+
+    keep = []
+    for _, series in trend.groupby('metric', sort=False):
+        positions = series.index.to_numpy()
+        if len(series) <= max_points:
+            keep.append(positions)
+            continue
+        # 期間の開始日を日数に変換して x とする
+        x = series['period'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+        keep.append(positions[lttb_indices(x, series['mean_score'].to_numpy(dtype=float), max_points)])
+    return trend.loc[np.concatenate(keep)].reset_index(drop=True)
+
+
+class TrendStore:
+    def __init__(self, engine, scores):
+        self.engine = engine
+        # 評価指標と横持ちの列名の対応（ScoreStore）
+        self.scores = scores
+
+    @cached_query(tags=lambda manager_id, *args, **kwargs: [f'manager:{manager_id}', 'evaluation_metrics'])
+    def manager_trend(
+        self,
+        manager_id: int,
+        resolution: str = DEFAULT_RESOLUTION,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        max_points: Optional[int] = TREND_MAX_POINTS
+    ) -> pd.DataFrame:
+        """マネージャーの評価指標ごと・期間ごとの平均・最小・最大スコアと評価件数
+
+        戻り値の列: metric（横持ちの列名）, metric_name, period（期間の開始日）,
+        mean_score, min_score, max_score, evaluation_count。評価指標の順、期間の古い順に並ぶ。
+        start_date は含み、end_date は含まない。
+        """
+        if resolution not in TREND_RESOLUTIONS:
+            raise ValueError(f"無効な集計単位です: {resolution}")
+
+        # ix_evaluation_scores_manager_date の範囲検索（index-only scan）で集計する
+        conditions = ["s.manager_id = :manager_id"]
+        params = {'manager_id': manager_id, 'resolution': resolution}
+        if start_date is not None:
+            conditions.append("s.evaluation_date >= :start_date")
+            params['start_date'] = start_date
+        if end_date is not None:
+            conditions.append("s.evaluation_date < :end_date")
+            params['end_date'] = end_date
+
+        try:
+            query = f"""
+                SELECT
+                    s.metric_id,
+                    DATE_TRUNC(:resolution, s.evaluation_date)::date as period,
+                    AVG(s.score)::float as mean_score,
+                    MIN(s.score)::float as min_score,
+                    MAX(s.score)::float as max_score,
+                    COUNT(*) as evaluation_count
+                FROM evaluation_scores s
+                WHERE {' AND '.join(conditions)}
+                GROUP BY s.metric_id, DATE_TRUNC(:resolution, s.evaluation_date)
+                ORDER BY s.metric_id, period;
+            """
+            trend = pd.read_sql_query(text(query), self.engine, params=params)
+        except Exception as e:
+            logging.error(f"評価推移の取得中にエラーが発生: {str(e)}")
+            return pd.DataFrame()
+
+        metrics = self.scores.metrics()
+        if trend.empty or metrics.empty:
+            return pd.DataFrame()
+
+        # 評価指標の表示順（基本6項目、カスタム指標の順）に並べ替える
+        metric_info = metrics[['id', 'column', 'name']].rename(
+            columns={'id': 'metric_id', 'column': 'metric', 'name': 'metric_name'}
+        )
+        metric_info['metric_order'] = np.arange(len(metric_info))
+        trend = (
+            trend.merge(metric_info, on='metric_id', how='inner')
+            .sort_values(['metric_order', 'period'], kind='stable')
+            .reset_index(drop=True)
+        )
+        trend['period'] = pd.to_datetime(trend['period'])
+        trend = trend[[
+            'metric', 'metric_name', 'period', 'mean_score', 'min_score', 'max_score', 'evaluation_count'
+        ]]
+        return downsample_trend(trend, max_points)
@@ -1,13 +1,151 @@
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional, Tuple
+import numpy as np
+import pandas as pd
+from models import MANAGER_SCORE_COLUMNS, SCORE_METRICS, ScoreMatrix
+from scoring import weighted_overall
+
+# 集計する統計量（p25/p75 と p10/p90 はパーセンタイル帯）
+SUMMARY_STATISTICS = ('mean', 'median', 'std', 'p10', 'p25', 'p75', 'p90')
+SUMMARY_PERCENTILES = np.array([50, 10, 25, 75, 90], dtype=float)
+
+# 集計対象の列（6項目と総合）
+SUMMARY_METRICS = SCORE_METRICS + ('overall',)
+
+
+@dataclass(frozen=True)
+class ScoreSummary:
+    """企業全体と部門別のスコア統計
+
+    values は (グループ, 統計量, 項目) の配列で、グループの先頭が企業全体、以降は departments の順。
+    評価のないマネージャー（get_all_managers で0に置き換えられた項目）は集計から除外している。
+    """
+    departments: Tuple[str, ...]
+    values: np.ndarray
+    manager_counts: np.ndarray
+    evaluated_counts: np.ndarray
+
+    def _group(self, department: Optional[str]) -> int:
+        return 0 if department is None else self.departments.index(department) + 1
+
+    def get(self, statistic: str = 'mean', metric: str = 'overall', department: Optional[str] = None) -> float:
+        """統計量を1つ取得（department が None の場合は企業全体）"""
+        return float(self.values[
+            self._group(department), SUMMARY_STATISTICS.index(statistic), SUMMARY_METRICS.index(metric)
+        ])
+
+    def company(self, statistic: str = 'mean') -> Dict[str, float]:
+        """企業全体の6項目の統計量（communication などをキーとする辞書）"""
+        row = self.values[0, SUMMARY_STATISTICS.index(statistic), :len(SCORE_METRICS)]
+        return dict(zip(SCORE_METRICS, row.tolist()))
+
+    def evaluated_count(self, department: Optional[str] = None) -> int:
+        """評価のあるマネージャー数"""
+        return int(self.evaluated_counts[self._group(department)])
+
+    def manager_count(self, department: Optional[str] = None) -> int:
+        return int(self.manager_counts[self._group(department)])
+
+    def department_frame(self, include_unevaluated: bool = False) -> pd.DataFrame:
+        """部門別の平均（get_department_statistics と同じ列名）と総合スコアの分布
+
+        manager_count は評価のあるマネージャー数、total_managers は全マネージャー数。
+        評価のあるマネージャーがいない部門は include_unevaluated=True の場合のみ含め、
+        総合スコアの平均の高い順に並べる。
+        """
+        means = self.values[1:, SUMMARY_STATISTICS.index('mean')]
+        frame = pd.DataFrame(means[:, :len(SCORE_METRICS)], columns=list(MANAGER_SCORE_COLUMNS))
+        frame.insert(0, 'department', list(self.departments))
+        for statistic in SUMMARY_STATISTICS:
+            frame[f'overall_{"avg" if statistic == "mean" else statistic}'] = (
+                self.values[1:, SUMMARY_STATISTICS.index(statistic), -1]
+            )
+        frame['manager_count'] = self.evaluated_counts[1:]
+        frame['total_managers'] = self.manager_counts[1:]
+        if not include_unevaluated:
+            frame = frame[frame['manager_count'] > 0]
+        return (
+            frame
+            .sort_values('overall_avg', ascending=False, kind='stable')
+            .reset_index(drop=True)
+        )
+
+
+def _grouped_statistics(values: np.ndarray, codes: np.ndarray, n_groups: int) -> np.ndarray:
+    """グループ × 統計量 × 列の統計を計算（NaN は除外、std は不偏標準偏差）"""
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    n_columns = values.shape[1]
+    counts = np.empty((n_groups, n_columns))
+    sums = np.empty_like(counts)
+    squares = np.empty_like(counts)
+    for j in range(n_columns):
+        counts[:, j] = np.bincount(codes, weights=valid[:, j], minlength=n_groups)
+        sums[:, j] = np.bincount(codes, weights=filled[:, j], minlength=n_groups)
+        squares[:, j] = np.bincount(codes, weights=filled[:, j] ** 2, minlength=n_groups)
+
+    result = np.full((n_groups, len(SUMMARY_STATISTICS), n_columns), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result[:, 0] = sums / counts
+        variance = (squares - sums * result[:, 0]) / (counts - 1)
+        result[:, 2] = np.where(counts > 1, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+
+    # 中央値とパーセンタイル：列ごとに (グループ, 値) の順に並べ、各グループの区間で線形補間する
+    # （グループ番号 × 値の幅 + 値 を1つのキーとして並べ替える）
+    positions = SUMMARY_PERCENTILES / 100
+    for j in range(n_columns):
+        column_valid = valid[:, j]
+        column = values[column_valid, j]
+        if len(column) == 0:
+            continue
+        low = column.min()
+        key = codes[column_valid] * (column.max() - low + 1) + (column - low)
+        ordered = column[np.argsort(key)]
+        group_counts = counts[:, j].astype(int)
+        starts = np.concatenate([[0], np.cumsum(group_counts)[:-1]])
+        position = starts[:, None] + np.maximum(group_counts[:, None] - 1, 0) * positions[None, :]
+        lower = np.clip(np.floor(position).astype(int), 0, len(ordered) - 1)
+        upper = np.clip(np.ceil(position).astype(int), 0, len(ordered) - 1)
+        interpolated = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - np.floor(position))
+        interpolated[group_counts == 0] = np.nan
+        result[:, 1, j] = interpolated[:, 0]
+        result[:, 3:, j] = interpolated[:, 1:]
+    return result
+
+
+def summarize_scores(managers_df: pd.DataFrame, weights: Optional[Mapping[str, float]] = None) -> ScoreSummary:
+    """get_all_managers の DataFrame から企業全体・部門別の統計を一括計算
+
+    スコアは1〜5のため、0の項目は評価なしとして除外する。総合は評価指標の重みによる加重平均。
+    """
+    matrix = ScoreMatrix.from_frame(managers_df)
+    scores = np.where(matrix.scores > 0, matrix.scores, np.nan)
+    evaluated = ~np.isnan(scores).all(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        overall = weighted_overall(scores, weights)
+    values = np.column_stack([scores, overall])
+
+    n_departments = len(matrix.departments)
+    # 企業全体をグループ0、部門をグループ1以降とする
+    statistics = np.concatenate([
+        _grouped_statistics(values, np.zeros(len(matrix), dtype=np.int64), 1),
+        _grouped_statistics(values, matrix.department_codes, n_departments)
+    ])
+
+    evaluated_by_department = np.bincount(matrix.department_codes, weights=evaluated, minlength=n_departments)
+    managers_by_department = np.bincount(matrix.department_codes, minlength=n_departments)
+    return ScoreSummary(
+        departments=tuple(matrix.departments.tolist()),
+        values=statistics,
+        manager_counts=np.concatenate([[len(matrix)], managers_by_department]).astype(int),
+        evaluated_counts=np.concatenate([[evaluated.sum()], evaluated_by_department]).astype(int)
+    )
+
+
 def calculate_company_average(managers_df):
-    avg_scores = {
-        'communication': managers_df['avg_communication'].mean(),
-        'support': managers_df['avg_support'].mean(),
-        'goal_management': managers_df['avg_goal'].mean(),
-        'leadership': managers_df['avg_leadership'].mean(),
-        'problem_solving': managers_df['avg_problem'].mean(),
-        'strategy': managers_df['avg_strategy'].mean()
-    }
-    return avg_scores
+    """評価のあるマネージャーの6項目の全体平均"""
+    return summarize_scores(managers_df).company()
+
 
 def format_scores_for_ai(scores):
     return {
@@ -1,6 +1,94 @@
+"""Plotly の図の作成
+
+作成した図は入力データと引数の内容のハッシュをキーに、シリアライズ済みのJSONとしてプロセス内にキャッシュし、
+同じデータでの再実行時は検証を省略して復元する。
+"""
+import functools
+import hashlib
+import json
+import os
+import numpy as np
+import plotly.colors
 import plotly.graph_objects as go
 import pandas as pd
+from query_cache import QueryCache
+
+FIGURE_CACHE_ENABLED = os.getenv('FIGURE_CACHE_ENABLED', 'true').lower() == 'true'
+FIGURE_CACHE_MAX_ENTRIES = int(os.getenv('FIGURE_CACHE_MAX_ENTRIES', '256'))
+
+# これを超える点数の折れ線は WebGL（Scattergl）で描画する
+WEBGL_POINT_THRESHOLD = int(os.getenv('PLOTLY_WEBGL_POINT_THRESHOLD', '1000'))
+
+# キーは入力の内容から作るため古い図が返ることはなく、件数の上限でのみ削除する
+figure_cache = QueryCache(max_entries=FIGURE_CACHE_MAX_ENTRIES)
+
+
+def _update_hash(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        columns = list(value.columns) if isinstance(value, pd.DataFrame) else [value.name]
+        dtypes = value.dtypes.astype(str).tolist() if isinstance(value, pd.DataFrame) else [str(value.dtype)]
+        digest.update(repr((type(value).__name__, columns, dtypes)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}:{len(value)}".encode())
+        for item in value:
+            _update_hash(digest, item)
+    elif isinstance(value, dict):
+        digest.update(f"dict:{len(value)}".encode())
+        for key, item in value.items():
+            _update_hash(digest, key)
+            _update_hash(digest, item)
+    else:
+        digest.update(repr(value).encode())
+    digest.update(b"\x00")
+
+
+def content_hash(*values) -> str:
+    """DataFrame・配列・リストなどの内容のハッシュ"""
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        _update_hash(digest, value)
+    return digest.hexdigest()
+
+
+def cached_figure(func):
+    """図を作成する関数の結果を、引数の内容のハッシュをキーにJSONとしてキャッシュするデコレーター"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not FIGURE_CACHE_ENABLED:
+            return func(*args, **kwargs)
+        try:
+            key = (func.__name__, content_hash(args, sorted(kwargs.items())))
+        except TypeError:
+            # ハッシュできない入力はキャッシュしない
+            return func(*args, **kwargs)
+
+        hit, spec = figure_cache.get(key, func.__name__)
+        if hit:
+            # 作成時に検証済みのJSONのため、再検証せずに復元する
+            return go.Figure(json.loads(spec), _validate=False)
+        fig = func(*args, **kwargs)
+        figure_cache.set(key, fig.to_json(validate=False), (), float('inf'))
+        return fig
+    return wrapper
+
+
+def get_figure_cache_stats() -> dict:
+    """図のキャッシュのヒット率などを取得"""
+    return figure_cache.stats()
+
+
+def _scatter_trace(n_points: int, use_webgl=None):
+    """点数に応じて Scatter / Scattergl を選択（use_webgl で明示的に指定も可能）"""
+    if use_webgl is None:
+        use_webgl = n_points > WEBGL_POINT_THRESHOLD
+    return go.Scattergl if use_webgl else go.Scatter
+
 
+@cached_figure
 def create_radar_chart(scores, title="マネージャースキル評価"):
     categories = ['コミュニケーション・\nフィードバック',
                  'サポート・\nエンパワーメント',
@@ -30,18 +118,27 @@ def create_radar_chart(scores, title="マネージャースキル評価"):
 
     return fig
 
-def create_trend_chart(history_df):
+@cached_figure
+def create_trend_chart(history_df, custom_metrics=None, use_webgl=None):
     fig = go.Figure()
     
     metrics = ['communication_score', 'support_score', 'goal_management_score',
                'leadership_score', 'problem_solving_score', 'strategy_score']
+    names = {metric: metric.replace('_score', '').title() for metric in metrics}
+    # カスタム指標はスコアのある評価のみ表示
+    for column, name in (custom_metrics or {}).items():
+        if column in history_df.columns and history_df[column].notna().any():
+            metrics.append(column)
+            names[column] = name
     
+    scatter = _scatter_trace(len(history_df), use_webgl)
     for metric in metrics:
-        fig.add_trace(go.Scatter(
+        fig.add_trace(scatter(
             x=history_df['evaluation_date'],
             y=history_df[metric],
-            name=metric.replace('_score', '').title(),
-            mode='lines+markers'
+            name=names[metric],
+            mode='lines+markers',
+            connectgaps=True
         ))
     
     fig.update_layout(
@@ -54,12 +151,67 @@ def create_trend_chart(history_df):
     return fig
 
 
-def create_growth_chart(history_df):
+def _band_color(color: str, alpha: float) -> str:
+    """#RRGGBB の色を透過色に変換"""
+    r, g, b = (int(color[i:i + 2], 16) for i in (1, 3, 5))
+    return f"rgba({r}, {g}, {b}, {alpha})"
+
+
+@cached_figure
+def create_score_trend_chart(trend_df, use_webgl=None):
+    """期間別の平均スコアの推移と最小・最大の帯（trend_df は get_manager_trend の結果）"""
+    fig = go.Figure()
+    palette = plotly.colors.qualitative.Plotly
+
+    groups = list(trend_df.groupby('metric', sort=False))
+    scatter = _scatter_trace(len(trend_df), use_webgl)
+    for i, (metric, series) in enumerate(groups):
+        color = palette[i % len(palette)]
+        name = series['metric_name'].iloc[0]
+        periods = series['period'].to_numpy()
+        # 最小・最大の帯（上端を往路、下端を復路とした閉じた領域）
+        fig.add_trace(scatter(
+            x=np.concatenate([periods, periods[::-1]]),
+            y=np.concatenate([series['max_score'].to_numpy(), series['min_score'].to_numpy()[::-1]]),
+            fill='toself',
+            fillcolor=_band_color(color, 0.15),
+            line=dict(width=0),
+            hoverinfo='skip',
+            legendgroup=metric,
+            showlegend=False,
+            name=f"{name}（範囲）"
+        ))
+        fig.add_trace(scatter(
+            x=periods,
+            y=series['mean_score'].to_numpy(),
+            customdata=series[['min_score', 'max_score', 'evaluation_count']].to_numpy(),
+            hovertemplate=(
+                "%{x|%Y-%m-%d}<br>平均 %{y:.2f}（最小 %{customdata[0]:.1f} / 最大 %{customdata[1]:.1f}）"
+                "<br>評価件数 %{customdata[2]}"
+            ),
+            name=name,
+            mode='lines+markers',
+            line=dict(color=color),
+            legendgroup=metric
+        ))
+
+    fig.update_layout(
+        title="スキル評価の推移",
+        xaxis_title="期間",
+        yaxis_title="スコア",
+        yaxis_range=[0, 5]
+    )
+
+    return fig
+
+
+@cached_figure
+def create_growth_chart(history_df, use_webgl=None):
     """成長率の推移を可視化"""
     fig = go.Figure()
     
-    fig.add_trace(go.Scatter(
-        x=history_df['evaluation_date'],
+    fig.add_trace(_scatter_trace(len(history_df), use_webgl)(
+        x=history_df['month'],
         y=history_df['growth_rate'],
         mode='lines+markers',
         name='成長率',
@@ -68,40 +220,35 @@ def create_growth_chart(history_df):
     
     fig.update_layout(
         title="成長率の推移",
-        xaxis_title="評価日",
+        xaxis_title="評価月",
         yaxis_title="成長率 (%)",
         showlegend=True
     )
     
     return fig
 
+@cached_figure
 def create_department_comparison_chart(dept_df):
-    """部門別のスキル比較レーダーチャート"""
+    """部門別のスキル比較レーダーチャート
+
+    dept_df は ScoreSummary.department_frame() または get_department_statistics() の結果。
+    """
     categories = ['コミュニケーション', 'サポート', '目標管理',
                  'リーダーシップ', '問題解決力', '戦略']
     
-    fig = go.Figure()
-    
-    for _, dept_data in dept_df.iterrows():
-        department = dept_data['department']
-        values = [
-            dept_data['avg_communication'],
-            dept_data['avg_support'],
-            dept_data['avg_goal'],
-            dept_data['avg_leadership'],
-            dept_data['avg_problem'],
-            dept_data['avg_strategy']
+    # レーダーチャートのデータポイントを閉じるため、最初の列を最後にも追加
+    columns = ['avg_communication', 'avg_support', 'avg_goal',
+               'avg_leadership', 'avg_problem', 'avg_strategy']
+    values = dept_df[columns + columns[:1]].to_numpy(dtype=float)
+    categories_closed = categories + [categories[0]]
+    names = dept_df['department'].astype(str) + " (n=" + dept_df['manager_count'].astype(int).astype(str) + ")"
+
+    fig = go.Figure(
+        data=[
+            go.Scatterpolar(r=row, theta=categories_closed, name=name, fill='toself')
+            for name, row in zip(names, values)
         ]
-        # レーダーチャートのデータポイントを閉じるため、最初の値を最後にも追加
-        values.append(values[0])
-        categories_closed = categories + [categories[0]]
-        
-        fig.add_trace(go.Scatterpolar(
-            r=values,
-            theta=categories_closed,
-            name=f"{department} (n={int(dept_data['manager_count'])})",
-            fill='toself'
-        ))
+    )
     
     fig.update_layout(
         polar=dict(
@@ -116,6 +263,7 @@ def create_department_comparison_chart(dept_df):
     
     return fig
 
+@cached_figure
 def create_department_metrics_chart(dept_df):
     """部門別の各指標の棒グラフ"""
     metrics = {
@@ -127,16 +275,19 @@ def create_department_metrics_chart(dept_df):
         'avg_strategy': '戦略'
     }
     
-    fig = go.Figure()
-    
-    for metric_key, metric_name in metrics.items():
-        fig.add_trace(go.Bar(
-            name=metric_name,
-            x=dept_df['department'],
-            y=dept_df[metric_key],
-            text=dept_df[metric_key].round(2),
-            textposition='auto',
-        ))
+    departments = dept_df['department'].to_numpy()
+    fig = go.Figure(
+        data=[
+            go.Bar(
+                name=metric_name,
+                x=departments,
+                y=dept_df[metric_key].to_numpy(dtype=float),
+                text=dept_df[metric_key].round(2).to_numpy(),
+                textposition='auto',
+            )
+            for metric_key, metric_name in metrics.items()
+        ]
+    )
     
     fig.update_layout(
         title="部門別評価指標の詳細比較",
@@ -146,4 +297,68 @@ def create_department_metrics_chart(dept_df):
         yaxis_range=[0, 5]
     )
     
-    return fig
\ No newline at end of file
+    return fig
+
+@cached_figure
+def create_department_heatmap(cube_df, dimension, title="部門別の月次平均スコア"):
+    """部門 × 月の平均スコアのヒートマップ
+
+    cube_df は get_department_metric_cube() の結果。dimension の行のみを描画する。
+    """
+    rows = cube_df[cube_df['dimension'] == dimension]
+    grid = rows.pivot(index='department', columns='month', values='mean_score').sort_index()
+    counts = rows.pivot(index='department', columns='month', values='evaluation_count').reindex_like(grid)
+
+    fig = go.Figure(
+        data=go.Heatmap(
+            z=grid.to_numpy(dtype=float),
+            x=grid.columns,
+            y=grid.index,
+            customdata=counts.to_numpy(dtype=float),
+            hovertemplate="%{y} %{x|%Y-%m}<br>平均: %{z:.2f}<br>評価件数: %{customdata:.0f}<extra></extra>",
+            colorscale='RdYlGn',
+            zmin=1,
+            zmax=5,
+            colorbar=dict(title="スコア")
+        )
+    )
+    fig.update_layout(
+        title=title,
+        xaxis_title="評価月",
+        yaxis_title="部門",
+        height=max(300, 40 * len(grid) + 150)
+    )
+    return fig
+
+
+@cached_figure
+def create_score_distribution_chart(percentiles_df):
+    """部門ごとの総合スコアの分布（箱は25〜75パーセンタイル、ひげは10〜90パーセンタイル）
+
+    percentiles_df は get_score_percentiles() の結果。
+    """
+    names = (
+        percentiles_df['department'].astype(str)
+        + " (n=" + percentiles_df['manager_count'].astype(int).astype(str) + ")"
+    )
+    fig = go.Figure(
+        data=go.Box(
+            x=names.to_numpy(),
+            lowerfence=percentiles_df['p10'].to_numpy(dtype=float),
+            q1=percentiles_df['p25'].to_numpy(dtype=float),
+            median=percentiles_df['p50'].to_numpy(dtype=float),
+            q3=percentiles_df['p75'].to_numpy(dtype=float),
+            upperfence=percentiles_df['p90'].to_numpy(dtype=float),
+            mean=percentiles_df['mean_score'].to_numpy(dtype=float),
+            name="総合スコア",
+            marker_color='#1f77b4'
+        )
+    )
+    fig.update_layout(
+        title="部門別の総合スコアの分布",
+        xaxis_title="部門",
+        yaxis_title="総合スコア",
+        yaxis_range=[1, 5],
+        showlegend=False
+    )
+    return fig